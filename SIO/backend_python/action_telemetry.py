@@ -0,0 +1,198 @@
+"""Télémétrie des actions : partitions journalières et agrégats par minute/heure
+
+Chaque action est écrite dans la partition de son jour (action_log_AAAAMMJJ)
+et comptée dans les agrégats action_rollup_minute et action_rollup_hour,
+dans la même transaction. Les statistiques ne lisent que les agrégats ; la
+rétention supprime des partitions entières (DROP TABLE) au lieu de lignes.
+"""
+import sqlite3
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+PARTITION_PREFIX = "action_log_"
+LEGACY_TABLE = "action_cache"
+LEGACY_ARCHIVE = "action_log_legacy"
+
+# Seaux des agrégats (préfixes d'horodatage ISO)
+MINUTE_BUCKET_LENGTH = 16  # AAAA-MM-JJTHH:MM
+HOUR_BUCKET_LENGTH = 13    # AAAA-MM-JJTHH
+
+# Utilisateur absent : '' dans la clé primaire des agrégats (NULL y serait distinct)
+NO_USER = ""
+
+
+def partition_name(timestamp: str) -> str:
+    """Partition journalière d'un horodatage ISO"""
+    return PARTITION_PREFIX + timestamp[:10].replace("-", "")
+
+
+def partition_day(name: str) -> Optional[str]:
+    """Jour (AAAAMMJJ) d'une partition, None pour une autre table"""
+    suffix = name[len(PARTITION_PREFIX):]
+    return suffix if name.startswith(PARTITION_PREFIX) and len(suffix) == 8 and suffix.isdigit() else None
+
+
+def _bucket(timestamp: str, length: int) -> str:
+    # CURRENT_TIMESTAMP de SQLite sépare la date et l'heure par une espace
+    return timestamp[:length].replace(" ", "T")
+
+
+def _ensure_partition(conn: sqlite3.Connection, name: str):
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            action_type TEXT NOT NULL,
+            user_name TEXT,
+            timestamp DATETIME NOT NULL,
+            metadata TEXT
+        )
+    ''')
+
+
+def _upsert_rollup(conn: sqlite3.Connection, table: str, counts: Counter):
+    conn.executemany(
+        f"""INSERT INTO {table} (bucket, action_type, user_name, count) VALUES (?, ?, ?, ?)
+            ON CONFLICT(bucket, action_type, user_name) DO UPDATE SET count = count + excluded.count""",
+        [(bucket, action_type, user, count) for (bucket, action_type, user), count in counts.items()]
+    )
+
+
+def write_actions(conn: sqlite3.Connection, actions: Iterable[Tuple[str, Optional[str], str, str]]):
+    """Écrire des actions (type, utilisateur, horodatage, métadonnées) et leurs agrégats"""
+    by_partition: Dict[str, List[tuple]] = {}
+    minutes: Counter = Counter()
+    hours: Counter = Counter()
+
+    for action_type, user, timestamp, metadata in actions:
+        by_partition.setdefault(partition_name(timestamp), []).append((action_type, user, timestamp, metadata))
+        user_key = user if user is not None else NO_USER
+        minutes[(_bucket(timestamp, MINUTE_BUCKET_LENGTH), action_type, user_key)] += 1
+        hours[(_bucket(timestamp, HOUR_BUCKET_LENGTH), action_type, user_key)] += 1
+
+    for name, rows in by_partition.items():
+        _ensure_partition(conn, name)
+        conn.executemany(
+            f"INSERT INTO {name} (action_type, user_name, timestamp, metadata) VALUES (?, ?, ?, ?)",
+            rows
+        )
+
+    _upsert_rollup(conn, "action_rollup_minute", minutes)
+    _upsert_rollup(conn, "action_rollup_hour", hours)
+
+
+def list_partitions(conn: sqlite3.Connection) -> List[str]:
+    """Partitions journalières existantes, de la plus ancienne à la plus récente"""
+    rows = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE ?",
+        (PARTITION_PREFIX + "%",)
+    ).fetchall()
+    return sorted(row[0] for row in rows if partition_day(row[0]))
+
+
+def expired_partitions(conn: sqlite3.Connection, cutoff: datetime) -> List[str]:
+    """Partitions dont le jour entier précède cutoff"""
+    cutoff_day = cutoff.strftime("%Y%m%d")
+    return [name for name in list_partitions(conn) if partition_day(name) < cutoff_day]
+
+
+def legacy_newest(conn: sqlite3.Connection) -> Optional[str]:
+    """Horodatage le plus récent de l'archive action_log_legacy, None si elle n'existe pas"""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (LEGACY_ARCHIVE,)
+    ).fetchone()
+    if not exists:
+        return None
+    newest = conn.execute(f"SELECT MAX(timestamp) FROM {LEGACY_ARCHIVE}").fetchone()[0]
+    return (newest or "").replace(" ", "T")
+
+
+def prune_rollups(conn: sqlite3.Connection, minute_cutoff: datetime, hour_cutoff: datetime) -> int:
+    """Supprimer les agrégats hors rétention (tables petites, index sur bucket)"""
+    deleted = conn.execute(
+        "DELETE FROM action_rollup_minute WHERE bucket < ?",
+        (minute_cutoff.isoformat()[:MINUTE_BUCKET_LENGTH],)
+    ).rowcount
+    deleted += conn.execute(
+        "DELETE FROM action_rollup_hour WHERE bucket < ?",
+        (hour_cutoff.isoformat()[:HOUR_BUCKET_LENGTH],)
+    ).rowcount
+    return deleted
+
+
+def rollup_counts(conn: sqlite3.Connection, start: datetime,
+                  minute_retention_start: datetime) -> List[Tuple[str, str, int]]:
+    """Compteurs (type, utilisateur, nombre) depuis start, lus dans les seuls agrégats
+
+    L'heure entamée au début de la période est lue à la minute près lorsque
+    les agrégats par minute la couvrent encore, le reste heure par heure.
+    """
+    next_hour = (start + timedelta(hours=1)).isoformat()[:HOUR_BUCKET_LENGTH]
+    if start >= minute_retention_start:
+        rows = conn.execute(
+            """SELECT action_type, user_name, SUM(count) FROM (
+                   SELECT action_type, user_name, count FROM action_rollup_minute
+                   WHERE bucket >= ? AND bucket < ?
+                   UNION ALL
+                   SELECT action_type, user_name, count FROM action_rollup_hour
+                   WHERE bucket >= ?
+               ) GROUP BY action_type, user_name""",
+            (start.isoformat()[:MINUTE_BUCKET_LENGTH], next_hour, next_hour)
+        ).fetchall()
+    else:
+        rows = conn.execute(
+            """SELECT action_type, user_name, SUM(count) FROM action_rollup_hour
+               WHERE bucket >= ? GROUP BY action_type, user_name""",
+            (start.isoformat()[:HOUR_BUCKET_LENGTH],)
+        ).fetchall()
+    return [(action_type, user, count) for action_type, user, count in rows]
+
+
+def summarize(rows: List[Tuple[str, str, int]], top_users: int = 10) -> Dict[str, Any]:
+    """Totaux par type et par utilisateur à partir des compteurs agrégés"""
+    by_type: Counter = Counter()
+    by_user: Counter = Counter()
+    for action_type, user, count in rows:
+        by_type[action_type] += count
+        if user != NO_USER:
+            by_user[user] += count
+
+    return {
+        "total_actions": sum(by_type.values()),
+        "actions_by_type": [
+            {"action_type": action_type, "count": count} for action_type, count in by_type.most_common()
+        ],
+        "actions_by_user": [
+            {"user_name": user, "count": count} for user, count in by_user.most_common(top_users)
+        ]
+    }
+
+
+def migrate_legacy_table(conn: sqlite3.Connection, minute_retention_start: datetime) -> bool:
+    """Reporter l'ancienne table action_cache dans les agrégats puis l'archiver
+
+    Les lignes restent consultables dans action_log_legacy, supprimée par la
+    rétention une fois entièrement expirée.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (LEGACY_TABLE,)
+    ).fetchone()
+    if not exists:
+        return False
+
+    for table, length, since in (
+        ("action_rollup_hour", HOUR_BUCKET_LENGTH, ""),
+        ("action_rollup_minute", MINUTE_BUCKET_LENGTH, minute_retention_start.isoformat()),
+    ):
+        conn.execute(
+            f"""INSERT INTO {table} (bucket, action_type, user_name, count)
+                SELECT replace(substr(timestamp, 1, {length}), ' ', 'T'), action_type,
+                       COALESCE(user_name, ''), COUNT(*)
+                FROM {LEGACY_TABLE}
+                WHERE replace(timestamp, ' ', 'T') >= ?
+                GROUP BY 1, 2, 3
+                ON CONFLICT(bucket, action_type, user_name) DO UPDATE SET count = count + excluded.count""",
+            (since,)
+        )
+    conn.execute(f"ALTER TABLE {LEGACY_TABLE} RENAME TO {LEGACY_ARCHIVE}")
+    return True
@@ -0,0 +1,224 @@
+"""Migrations de la collection d'audit MongoDB
+
+Usage :
+    python audit_migrations.py backfill-dates [--batch-size 1000] [--pause 0.05] [--follow 60]
+    python audit_migrations.py to-timeseries [--batch-size 1000] [--retention-days 180]
+"""
+import argparse
+import asyncio
+from datetime import datetime
+from typing import Dict, Any, Optional
+from pymongo.errors import CollectionInvalid
+from loguru import logger
+from config import settings
+from database import db_manager
+from audit_store import (
+    AUDIT_COLLECTION, EVENT_TIMESTAMP_FIELD, EVENT_DATE_FIELD,
+    TIMESERIES_META_FIELD, parse_timestamp, to_storage_document
+)
+
+MIGRATIONS_COLLECTION = "audit_migrations"
+
+
+async def backfill_event_dates(batch_size: int = 1000, pause: float = 0.05) -> Dict[str, Any]:
+    """Remplir le champ date natif à partir de l'horodatage texte, par lots
+
+    Chaque lot est sélectionné par _id croissant parmi les documents sans
+    champ date, puis converti côté serveur avec $dateFromString : la
+    collection reste disponible et la migration peut être relancée à tout
+    moment. Les horodatages illisibles reçoivent la valeur null.
+
+    Les filtres sur event_date ignorent les documents sans ce champ : avant
+    d'activer AUDIT_USE_NATIVE_DATES, l'ingestion doit écrire event_date,
+    ou la migration doit tourner en continu (--follow) pour les documents
+    insérés depuis.
+    """
+    collection = db_manager.get_mongodb_collection(AUDIT_COLLECTION)
+    pending_filter = {
+        EVENT_DATE_FIELD: {"$exists": False},
+        EVENT_TIMESTAMP_FIELD: {"$type": "string"}
+    }
+    conversion = [{
+        "$set": {
+            EVENT_DATE_FIELD: {
+                "$dateFromString": {
+                    "dateString": f"${EVENT_TIMESTAMP_FIELD}",
+                    "onError": None,
+                    "onNull": None
+                }
+            }
+        }
+    }]
+
+    stats = {"batches": 0, "matched": 0, "modified": 0}
+    last_id = None
+
+    while True:
+        batch_filter = dict(pending_filter)
+        if last_id is not None:
+            batch_filter["_id"] = {"$gt": last_id}
+
+        ids = [
+            doc["_id"]
+            async for doc in collection.find(batch_filter, {"_id": 1}).sort("_id", 1).limit(batch_size)
+        ]
+        if not ids:
+            break
+
+        result = await collection.update_many({"_id": {"$in": ids}}, conversion)
+        last_id = ids[-1]
+        stats["batches"] += 1
+        stats["matched"] += result.matched_count
+        stats["modified"] += result.modified_count
+
+        if stats["batches"] % 10 == 0:
+            logger.info(f"Migration {EVENT_DATE_FIELD}: {stats['modified']} documents convertis")
+
+        # Laisser respirer la base en production
+        if pause:
+            await asyncio.sleep(pause)
+
+    # Valeur null explicite : {champ: None} compterait aussi les documents sans le champ (parcours complet)
+    remaining = await collection.count_documents({EVENT_DATE_FIELD: {"$type": "null"}})
+    stats["unparsed"] = remaining
+    logger.info(
+        f"Migration {EVENT_DATE_FIELD} terminée: {stats['modified']} documents convertis "
+        f"en {stats['batches']} lots, {remaining} horodatages illisibles"
+    )
+    return stats
+
+
+async def create_timeseries_collection(name: str, retention_days: Optional[int] = None) -> bool:
+    """Créer la collection time-series d'audit (sans effet si elle existe déjà)"""
+    options: Dict[str, Any] = {
+        "timeseries": {
+            "timeField": EVENT_DATE_FIELD,
+            "metaField": TIMESERIES_META_FIELD,
+            "granularity": "minutes"
+        }
+    }
+    if retention_days:
+        options["expireAfterSeconds"] = int(retention_days * 86400)
+
+    try:
+        await db_manager.mongodb_db.create_collection(name, **options)
+    except CollectionInvalid:
+        logger.info(f"Collection time-series {name} déjà présente")
+        return False
+
+    logger.info(f"Collection time-series {name} créée")
+    return True
+
+
+async def copy_to_timeseries(target: str, batch_size: int = 1000, pause: float = 0.05) -> Dict[str, Any]:
+    """Copier actions_audit vers la collection time-series, par lots reprenables
+
+    La progression (dernier _id copié) est enregistrée dans audit_migrations :
+    une copie interrompue reprend là où elle s'est arrêtée, et une nouvelle
+    exécution ne copie que les documents insérés depuis. Les collections
+    time-series n'imposant pas l'unicité de _id, un arrêt brutal entre
+    l'insertion d'un lot et l'enregistrement de la progression peut dupliquer
+    ce seul lot.
+    """
+    source = db_manager.get_mongodb_collection(AUDIT_COLLECTION)
+    destination = db_manager.get_mongodb_collection(target)
+    progress = db_manager.get_mongodb_collection(MIGRATIONS_COLLECTION)
+    progress_id = f"to-timeseries:{target}"
+
+    state = await progress.find_one({"_id": progress_id}) or {}
+    last_id = state.get("last_id")
+    stats = {"batches": 0, "copied": 0, "skipped": 0}
+
+    while True:
+        batch_filter = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        docs = [doc async for doc in source.find(batch_filter).sort("_id", 1).limit(batch_size)]
+        if not docs:
+            break
+
+        converted = []
+        for doc in docs:
+            # Champ date natif déjà migré, sinon conversion à la volée
+            event_date = doc.get(EVENT_DATE_FIELD) or parse_timestamp(doc.get(EVENT_TIMESTAMP_FIELD))
+            if not isinstance(event_date, datetime):
+                stats["skipped"] += 1
+                continue
+            doc[EVENT_DATE_FIELD] = event_date
+            converted.append(to_storage_document(doc))
+
+        if converted:
+            await destination.insert_many(converted, ordered=False)
+            stats["copied"] += len(converted)
+
+        last_id = docs[-1]["_id"]
+        await progress.update_one(
+            {"_id": progress_id},
+            {"$set": {"last_id": last_id, "updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+        stats["batches"] += 1
+
+        if stats["batches"] % 10 == 0:
+            logger.info(f"Copie time-series: {stats['copied']} documents copiés")
+
+        if pause:
+            await asyncio.sleep(pause)
+
+    logger.info(
+        f"Copie vers {target} terminée: {stats['copied']} documents copiés, "
+        f"{stats['skipped']} ignorés (horodatage illisible)"
+    )
+    return stats
+
+
+async def _run(args: argparse.Namespace):
+    if not await db_manager.connect_mongodb():
+        raise SystemExit("Connexion MongoDB impossible")
+
+    try:
+        if args.command == "backfill-dates":
+            while True:
+                await backfill_event_dates(args.batch_size, args.pause)
+                if not args.follow:
+                    break
+                # Rattraper les documents insérés pendant et après la migration
+                await asyncio.sleep(args.follow)
+
+        elif args.command == "to-timeseries":
+            await create_timeseries_collection(args.target, args.retention_days)
+            await copy_to_timeseries(args.target, args.batch_size, args.pause)
+            logger.info(
+                f"Activez AUDIT_STORAGE_MODE=timeseries et AUDIT_TIMESERIES_COLLECTION={args.target} "
+                "pour interroger la collection time-series"
+            )
+    finally:
+        await db_manager.close_connections()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrations de la collection d'audit")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    backfill = subparsers.add_parser(
+        "backfill-dates",
+        help=f"Remplir {EVENT_DATE_FIELD} (date BSON) depuis {EVENT_TIMESTAMP_FIELD}"
+    )
+    backfill.add_argument("--batch-size", type=int, default=1000)
+    backfill.add_argument("--pause", type=float, default=0.05, help="Pause entre deux lots (secondes)")
+    backfill.add_argument("--follow", type=float, default=0,
+                          help="Relancer la migration toutes les N secondes (collection alimentée en continu)")
+
+    timeseries = subparsers.add_parser(
+        "to-timeseries",
+        help=f"Copier {AUDIT_COLLECTION} vers une collection time-series"
+    )
+    timeseries.add_argument("--target", default=settings.audit_timeseries_collection)
+    timeseries.add_argument("--batch-size", type=int, default=1000)
+    timeseries.add_argument("--pause", type=float, default=0.05, help="Pause entre deux lots (secondes)")
+    timeseries.add_argument("--retention-days", type=int, default=None,
+                            help="Expiration automatique des événements (expireAfterSeconds)")
+
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
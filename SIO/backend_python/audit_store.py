@@ -0,0 +1,107 @@
+"""Accès aux champs de la collection d'audit (dates natives BSON, mode time-series)"""
+from datetime import datetime
+from typing import Dict, Any, Optional, Union
+from config import settings
+
+
+AUDIT_COLLECTION = "actions_audit"
+
+# Champ texte historique (ISO 8601) et champ date natif rempli par la migration
+EVENT_TIMESTAMP_FIELD = "event_timestamp"
+EVENT_DATE_FIELD = "event_date"
+
+# Mode time-series : champs regroupés dans le metaField (clé des buckets)
+STORAGE_STANDARD = "standard"
+STORAGE_TIMESERIES = "timeseries"
+TIMESERIES_META_FIELD = "meta"
+TIMESERIES_META_KEYS = ("os_username", "dbusername", "client_host")
+
+
+def is_timeseries() -> bool:
+    """La collection d'audit est-elle une collection time-series"""
+    return settings.audit_storage_mode == STORAGE_TIMESERIES
+
+
+def audit_collection_name() -> str:
+    """Nom de la collection d'audit selon le mode de stockage"""
+    return settings.audit_timeseries_collection if is_timeseries() else AUDIT_COLLECTION
+
+
+def uses_native_dates() -> bool:
+    """Les filtres temporels portent-ils sur des dates BSON"""
+    return settings.audit_use_native_dates or is_timeseries()
+
+
+def time_field() -> str:
+    """Champ utilisé pour les filtres et agrégations temporels"""
+    return EVENT_DATE_FIELD if uses_native_dates() else EVENT_TIMESTAMP_FIELD
+
+
+def field(name: str) -> str:
+    """Chemin d'un champ d'audit dans le document stocké"""
+    if is_timeseries() and name in TIMESERIES_META_KEYS:
+        return f"{TIMESERIES_META_FIELD}.{name}"
+    return name
+
+
+def translate_filter(query_filter: Dict[str, Any]) -> Dict[str, Any]:
+    """Adapter un filtre exprimé sur les champs à plat au mode de stockage"""
+    if not is_timeseries():
+        return query_filter
+    return {field(key): value for key, value in query_filter.items()}
+
+
+def to_storage_document(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Convertir un document d'audit à plat au format time-series"""
+    stored = {key: value for key, value in doc.items() if key not in TIMESERIES_META_KEYS}
+    stored[TIMESERIES_META_FIELD] = {key: doc.get(key) for key in TIMESERIES_META_KEYS}
+    return stored
+
+
+def normalize_document(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Remettre à plat un document lu (metaField du mode time-series)"""
+    meta = doc.pop(TIMESERIES_META_FIELD, None)
+    if isinstance(meta, dict):
+        for key, value in meta.items():
+            doc.setdefault(key, value)
+    return doc
+
+
+def parse_timestamp(value: Union[str, datetime, None]) -> Optional[datetime]:
+    """Convertir un horodatage ISO (ou une date) en datetime naïf UTC"""
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = (parsed - parsed.utcoffset()).replace(tzinfo=None)
+    return parsed
+
+
+def _bound(value: Union[str, datetime]) -> Union[str, datetime]:
+    if uses_native_dates():
+        parsed = parse_timestamp(value)
+        if parsed is None:
+            raise ValueError(f"Horodatage invalide: {value}")
+        return parsed
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def time_range_filter(start: Union[str, datetime, None] = None,
+                      end: Union[str, datetime, None] = None) -> Dict[str, Any]:
+    """Construire le filtre MongoDB d'une plage temporelle"""
+    condition = {}
+    if start is not None:
+        condition["$gte"] = _bound(start)
+    if end is not None:
+        condition["$lte"] = _bound(end)
+    return {time_field(): condition} if condition else {}
+
+
+def hour_bucket_expression() -> Dict[str, Any]:
+    """Expression d'agrégation regroupant les événements par heure"""
+    if uses_native_dates():
+        return {"$dateTrunc": {"date": f"${EVENT_DATE_FIELD}", "unit": "hour"}}
+    return {"$substr": [f"${EVENT_TIMESTAMP_FIELD}", 0, 13]}
@@ -0,0 +1,186 @@
+"""Filigrane des données d'audit pour l'invalidation des réponses en cache
+
+Chaque réponse calculée sur les données d'audit est étiquetée avec le
+filigrane (horodatage maximal de la collection) et la fenêtre temporelle
+qu'elle couvre. Les nouveaux événements se situent après le filigrane
+étiqueté : une réponse n'est périmée que si sa fenêtre recouvre cette
+plage. Un événement inséré avec un horodatage antérieur au filigrane n'est
+pas détecté.
+
+La forme canonique d'une question relative (« hier », « dernières 3
+heures ») est la même chaque jour : l'étiquette garde aussi la période,
+résolue de nouveau à la lecture. Une période calendaire dont la fenêtre a
+changé (jour suivant) ou une fenêtre glissante qui a trop avancé périme la
+réponse, même sans nouvelles données.
+"""
+import time
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+from loguru import logger
+from config import settings
+from database import db_manager
+from audit_store import audit_collection_name, time_field, parse_timestamp
+from models import QueryAnalysis
+
+# Intentions dont la réponse dépend des données d'audit
+AUDIT_INTENTS = ("USER_ACTIVITY", "OBJECT_MODIFICATIONS", "SECURITY_ANALYSIS")
+
+# Périodes closes : leur borne de fin est passée, les nouveaux événements ne les concernent pas
+CLOSED_PERIODS = ("yesterday",)
+# Périodes calendaires : la fenêtre ne change qu'au jour, à la semaine ou au mois suivant
+CALENDAR_PERIODS = ("today", "yesterday", "this_week", "this_month")
+# detect_anomalies porte sur les dernières 24 heures (même notation que NLPService.resolve_timeframe)
+ANOMALY_PERIOD = "last_24_heures"
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+def resolve_period(period: str, now: Optional[datetime] = None) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """Bornes d'une période relative (today, last_3_heures...) à l'instant now"""
+    from nlp_service import NLPService
+
+    if period.startswith("last_"):
+        _, amount, unit = period.split("_", 2)
+        spec: Dict[str, Any] = {"duration": [int(amount), unit]}
+    else:
+        spec = {"period": period}
+    timeframe = NLPService.resolve_timeframe(spec, now)
+    return timeframe.get("start"), timeframe.get("end")
+
+
+def query_window(analysis: QueryAnalysis) -> Tuple[Optional[str], Optional[datetime], Optional[datetime]]:
+    """Période relative et fenêtre temporelle couvertes par la réponse (None : non bornée)"""
+    if analysis.intent == "SECURITY_ANALYSIS":
+        start, _ = resolve_period(ANOMALY_PERIOD)
+        return ANOMALY_PERIOD, start, None
+
+    timeframe = analysis.entities.get("timeframe") or {}
+    period = timeframe.get("period")
+    # Hors périodes closes, la fenêtre (aujourd'hui, dernières N heures...) reste ouverte
+    end = timeframe.get("end") if period in CLOSED_PERIODS else None
+    return period, timeframe.get("start"), end
+
+
+def _window_moved(tag: Dict[str, Any], now: Optional[datetime]) -> bool:
+    """La période de la réponse, résolue maintenant, couvre-t-elle une autre fenêtre"""
+    period = tag.get("period")
+    tagged_start = parse_timestamp(tag.get("window_start"))
+    if not period or tagged_start is None:
+        return False
+    if now is None:
+        now = datetime.utcnow()
+    start, _ = resolve_period(period, now)
+    if start is None:
+        return False
+    if period in CALENDAR_PERIODS:
+        return start != tagged_start
+    # Fenêtre glissante : dérive tolérée en fraction de sa longueur
+    drift = (start - tagged_start).total_seconds()
+    return drift > (now - start).total_seconds() * settings.audit_sliding_window_drift
+
+
+def freshness_tag(analysis: QueryAnalysis, watermark: Optional[datetime]) -> Optional[Dict[str, Any]]:
+    """Étiquette de fraîcheur d'une réponse (None si elle ne dépend pas des données)"""
+    if analysis.intent not in AUDIT_INTENTS:
+        return None
+    period, start, end = query_window(analysis)
+    return {
+        "watermark": _isoformat(watermark),
+        "period": period,
+        "window_start": _isoformat(start),
+        "window_end": _isoformat(end)
+    }
+
+
+def is_stale(tag: Optional[Dict[str, Any]], current: Optional[datetime], now: Optional[datetime] = None) -> bool:
+    """La fenêtre de la réponse a-t-elle changé, ou des données arrivées depuis le calcul
+    la recouvrent-elles"""
+    if not tag:
+        return False
+    if _window_moved(tag, now):
+        return True
+    if current is None:
+        return False
+
+    tagged = parse_timestamp(tag.get("watermark"))
+    if tagged is not None and current <= tagged:
+        return False
+
+    # Les nouvelles données se situent dans ]tagged, current]
+    start = parse_timestamp(tag.get("window_start"))
+    end = parse_timestamp(tag.get("window_end"))
+    if end is not None and tagged is not None and end <= tagged:
+        return False
+    if start is not None and start > current:
+        return False
+    return True
+
+
+class AuditWatermark:
+    """Horodatage maximal de la collection d'audit, relu au plus toutes les N secondes"""
+
+    def __init__(self, refresh_interval: Optional[float] = None):
+        self.refresh_interval = refresh_interval
+        self._value: Optional[datetime] = None
+        self._checked_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self.refreshes = 0
+        self.errors = 0
+
+    @property
+    def value(self) -> Optional[datetime]:
+        """Dernier filigrane connu, sans accès à MongoDB"""
+        return self._value
+
+    def _is_fresh(self, max_age: float) -> bool:
+        return self._checked_at is not None and time.monotonic() - self._checked_at < max_age
+
+    async def current(self, max_age: Optional[float] = None) -> Optional[datetime]:
+        """Filigrane courant, relu si la dernière lecture date de plus de max_age secondes"""
+        if max_age is None:
+            max_age = self.refresh_interval
+            if max_age is None:
+                max_age = settings.audit_watermark_refresh_interval
+
+        if self._is_fresh(max_age):
+            return self._value
+
+        async with self._lock:
+            # Une autre requête a pu relire le filigrane pendant l'attente
+            if not self._is_fresh(max_age):
+                await self.refresh()
+        return self._value
+
+    async def refresh(self) -> Optional[datetime]:
+        """Relire l'horodatage maximal (index sur le champ temporel)"""
+        try:
+            collection = db_manager.get_mongodb_collection(audit_collection_name())
+            timestamp_field = time_field()
+            doc = await collection.find_one(
+                {timestamp_field: {"$ne": None}},
+                {timestamp_field: 1},
+                sort=[(timestamp_field, -1)]
+            )
+            self._value = parse_timestamp(doc.get(timestamp_field)) if doc else None
+            self.refreshes += 1
+        except Exception as e:
+            # Filigrane inconnu : les réponses en cache restent servies
+            self.errors += 1
+            logger.warning(f"Lecture du filigrane d'audit impossible: {e}")
+        self._checked_at = time.monotonic()
+        return self._value
+
+    def stats(self) -> Dict[str, Any]:
+        """État du filigrane"""
+        return {
+            "watermark": _isoformat(self._value),
+            "refreshes": self.refreshes,
+            "errors": self.errors
+        }
+
+
+# Instance globale
+audit_watermark = AuditWatermark()
@@ -0,0 +1,175 @@
+"""Index d'autocomplétion des questions (trie compressé pondéré)
+
+Chaque question est indexée par son texte replié (minuscules, sans accents
+ni ponctuation), à partir de chaque début de mot : « drop » complète
+« Qui a fait un DROP sur CLIENTS ? ». Chaque nœud du trie garde les top_n
+questions les plus posées de son sous-arbre ; une complétion parcourt le
+préfixe puis lit cette liste, sans explorer le sous-arbre.
+
+Les poids ne font que croître entre deux reconstructions, ce qui permet de
+tenir les listes des nœuds à jour en ne visitant que les chemins de la
+question comptée.
+"""
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from text_normalizer import fold
+
+_NON_WORD = re.compile(r"[^\w]+")
+
+
+def index_key(text: str) -> str:
+    """Texte replié servant de clé dans le trie"""
+    return _NON_WORD.sub(" ", fold(text)).strip()
+
+
+class _Node:
+    __slots__ = ("children", "top")
+
+    def __init__(self, top: Optional[List[List[Any]]] = None):
+        # premier caractère de l'arête -> (étiquette, nœud)
+        self.children: Dict[str, Tuple[str, "_Node"]] = {}
+        # [poids, identifiant], par poids décroissant
+        self.top: List[List[Any]] = top or []
+
+
+class AutocompleteIndex:
+    """Trie compressé (radix) des questions, top-N par nœud"""
+
+    def __init__(self, top_n: int = 10, max_questions: int = 5000):
+        self.top_n = top_n
+        self.max_questions = max_questions
+        self._lock = threading.Lock()
+        self._root = _Node()
+        # forme canonique -> [poids, question affichée, clé indexée]
+        self._items: Dict[str, List[Any]] = {}
+        self._during_build: Optional[List[Tuple[str, str, int]]] = None
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    # ------------------------------------------------------------------
+    # Construction
+    # ------------------------------------------------------------------
+
+    def _offer(self, node: _Node, item_id: str, weight: int):
+        """Proposer un poids à la liste top-N d'un nœud"""
+        top = node.top
+        # Poids croissants : un poids sous le minimum d'une liste pleine n'y change rien
+        if len(top) >= self.top_n and weight <= top[-1][0]:
+            return
+        for entry in top:
+            if entry[1] == item_id:
+                entry[0] = weight
+                break
+        else:
+            top.append([weight, item_id])
+        top.sort(key=lambda entry: entry[0], reverse=True)
+        del top[self.top_n:]
+
+    def _insert(self, root: _Node, key: str, item_id: str, weight: int):
+        node = root
+        self._offer(node, item_id, weight)
+        while key:
+            edge = node.children.get(key[0])
+            if edge is None:
+                leaf = _Node()
+                self._offer(leaf, item_id, weight)
+                node.children[key[0]] = (key, leaf)
+                return
+
+            label, child = edge
+            common = 0
+            limit = min(len(label), len(key))
+            while common < limit and label[common] == key[common]:
+                common += 1
+
+            if common < len(label):
+                # Scinder l'arête : le nœud intermédiaire couvre le même sous-arbre
+                middle = _Node([list(entry) for entry in child.top])
+                middle.children[label[common]] = (label[common:], child)
+                node.children[key[0]] = (label[:common], middle)
+                child = middle
+
+            node = child
+            self._offer(node, item_id, weight)
+            key = key[common:]
+
+    def _index(self, root: _Node, item_id: str, key: str, weight: int):
+        # Une entrée par début de mot : complétion sur le préfixe de n'importe quel mot
+        for match in re.finditer(r"\S+", key):
+            self._insert(root, key[match.start():], item_id, weight)
+
+    def _add(self, root: _Node, items: Dict[str, List[Any]], normalized: str, question: str, count: int):
+        item = items.get(normalized)
+        if item is None:
+            if len(items) >= self.max_questions:
+                return
+            key = index_key(question)
+            if not key:
+                return
+            item = items[normalized] = [0, question, key]
+        item[0] += count
+        self._index(root, normalized, item[2], item[0])
+
+    def record(self, normalized: str, question: str, count: int = 1):
+        """Compter une question posée (ajoutée à l'index si nouvelle)"""
+        with self._lock:
+            if self._during_build is not None:
+                self._during_build.append((normalized, question, count))
+            self._add(self._root, self._items, normalized, question, count)
+
+    def begin_build(self):
+        """Marquer le début d'une reconstruction : les questions comptées d'ici à
+        build() seront réappliquées au nouvel index"""
+        with self._lock:
+            self._during_build = []
+
+    def build(self, questions: List[Tuple[str, str, int]]):
+        """Reconstruire l'index depuis (forme canonique, question affichée, nombre)
+
+        Le nouvel index est construit à part puis substitué à l'ancien.
+        """
+        root, items = _Node(), {}
+        for normalized, question, count in questions[:self.max_questions]:
+            self._add(root, items, normalized, question, count)
+
+        with self._lock:
+            for normalized, question, count in self._during_build or []:
+                self._add(root, items, normalized, question, count)
+            self._during_build = None
+            self._root, self._items = root, items
+
+    # ------------------------------------------------------------------
+    # Complétion
+    # ------------------------------------------------------------------
+
+    def complete(self, prefix: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Questions les plus posées commençant par prefix (ou dont un mot commence par prefix)"""
+        key = index_key(prefix)
+        if not key:
+            return []
+        if prefix[-1:].isspace():
+            # Dernier mot terminé : ne pas compléter « drop » en « dropped »
+            key += " "
+
+        node, items = self._root, self._items
+        while key:
+            edge = node.children.get(key[0])
+            if edge is None:
+                return []
+            label, child = edge
+            if key.startswith(label):
+                key = key[len(label):]
+            elif not label.startswith(key):
+                return []
+            else:
+                key = ""
+            node = child
+
+        results = []
+        for weight, item_id in node.top[:limit]:
+            item = items.get(item_id)
+            if item is not None:
+                results.append({"question": item[1], "normalized_question": item_id, "count": weight})
+        return results
@@ -0,0 +1,139 @@
+"""Banc d'essai des encodages du cache des requêtes
+
+Compare, pour chaque codec, la taille sur disque, les latences
+d'encodage/décodage et la latence d'un hit de cache SQLite (lecture et
+décodage, sans niveau mémoire).
+
+Usage :
+    python bench_cache_codec.py [--entries 2000] [--codecs json zlib msgpack-zstd]
+"""
+import os
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from statistics import median
+from typing import Any, Dict, List
+from config import settings
+from database import db_manager
+from write_behind import write_queue
+from cache_backends import SQLiteCacheBackend
+from cache_codec import CODECS, encode_result, decode_result
+from nlp_service import NLPService
+
+QUESTIONS = [
+    "Qui a fait un DROP sur la table CLIENTS hier ?",
+    "Activité de user ADMIN pendant 3 jours",
+    "Quelles modifications sur la table COMMANDES aujourd'hui ?",
+    "Montre les connexions suspectes cette semaine",
+    "Combien de SELECT sur le schéma VENTES ce mois ?",
+    "Qui a créé la table FACTURES ?",
+]
+
+RESPONSE = (
+    "D'après les journaux d'audit, l'utilisateur {user} a exécuté {count} actions {action} "
+    "sur l'objet {obj} entre {start} et {end}. Les opérations proviennent principalement "
+    "du poste {host} via {program}. Aucune anomalie de volume n'a été détectée sur la période, "
+    "mais deux connexions ont eu lieu en dehors des heures ouvrées. "
+)
+
+
+def sample_results(count: int) -> List[Dict[str, Any]]:
+    """Réponses de chatbot représentatives (analyse NLP complète et texte long)"""
+    nlp = NLPService()
+    rng = random.Random(42)
+    results = []
+    for i in range(count):
+        analysis = nlp.analyze_question(QUESTIONS[i % len(QUESTIONS)])
+        text = "".join(
+            RESPONSE.format(
+                user=rng.choice(["ADMIN", "BOB", "ALICE", "SYS"]), count=rng.randint(1, 500),
+                action=rng.choice(["DROP", "SELECT", "UPDATE"]), obj=f"TABLE_{rng.randint(1, 99)}",
+                start="2024-01-0%d" % rng.randint(1, 9), end="2024-01-1%d" % rng.randint(0, 9),
+                host=f"poste-{rng.randint(1, 300)}", program="sqlplus"
+            )
+            for _ in range(rng.randint(2, 6))
+        )
+        results.append({
+            "response": text,
+            "analysis": analysis.dict(),
+            "suggestions": QUESTIONS[:3],
+            "cached": False
+        })
+    return results
+
+
+def _micros(samples: List[float]) -> float:
+    return median(samples) * 1_000_000
+
+
+async def bench_hits(codec: str, results: List[Dict[str, Any]], workdir: str) -> Dict[str, float]:
+    """Taille du fichier SQLite et latence des hits pour un codec"""
+    settings.sqlite_db_path = os.path.join(workdir, codec, "bench.db")
+    settings.query_cache_codec = codec
+    settings.query_cache_max_bytes = 0
+    db_manager.connect_sqlite()
+    backend = SQLiteCacheBackend()
+
+    for i, result in enumerate(results):
+        await backend.set_query(f"h{i}", f"question {i}", result)
+        if write_queue.pending >= 500:
+            await write_queue.flush()
+    await write_queue.flush()
+    db_manager.sqlite_conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    file_size = os.path.getsize(settings.sqlite_db_path)
+
+    latencies = []
+    for i in range(len(results)):
+        start = time.perf_counter()
+        await backend.get_query(f"h{i}")
+        latencies.append(time.perf_counter() - start)
+
+    write_queue.discard_all_queries()
+    await write_queue.flush()
+    await db_manager.close_connections()
+    return {"file_bytes": file_size, "hit_us": _micros(latencies)}
+
+
+async def run(entries: int, codecs: List[str]):
+    results = sample_results(entries)
+    rows = []
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for codec in codecs:
+            encode_times, decode_times, sizes = [], [], []
+            for result in results:
+                start = time.perf_counter()
+                stored, _ = encode_result(result, codec)
+                encode_times.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                decode_result(stored)
+                decode_times.append(time.perf_counter() - start)
+                sizes.append(len(stored))
+
+            hits = await bench_hits(codec, results, workdir)
+            rows.append((
+                codec, sum(sizes) / len(sizes), hits["file_bytes"] / 1024,
+                _micros(encode_times), _micros(decode_times), hits["hit_us"]
+            ))
+
+    baseline = rows[0][1]
+    print(f"{entries} résultats\n")
+    print(f"{'codec':<14}{'octets/ligne':>14}{'ratio':>8}{'fichier Ko':>12}"
+          f"{'encode µs':>11}{'décode µs':>11}{'hit µs':>9}")
+    for codec, size, file_kb, encode_us, decode_us, hit_us in rows:
+        print(f"{codec:<14}{size:>14.0f}{baseline / size:>8.1f}{file_kb:>12.0f}"
+              f"{encode_us:>11.1f}{decode_us:>11.1f}{hit_us:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc d'essai des encodages du cache des requêtes")
+    parser.add_argument("--entries", type=int, default=2000)
+    parser.add_argument("--codecs", nargs="+", choices=CODECS, default=list(CODECS))
+    args = parser.parse_args()
+    asyncio.run(run(args.entries, args.codecs))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+"""Backends de stockage du cache des requêtes et des statistiques de questions"""
+import json
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any, Tuple
+from loguru import logger
+from config import settings
+from database import db_manager
+from write_behind import write_queue
+from cache_codec import encode_result, decode_result
+from cache_purge import cache_purger
+from question_store import top_questions
+
+# Lecture d'une entrée et comptage du hit, atomiques et en un seul aller-retour :
+# une entrée absente (ou expirée) n'est ni recréée par le comptage ni comptée
+_REDIS_HIT_SCRIPT = """
+local result = redis.call('HGET', KEYS[1], 'result')
+if not result then
+    return false
+end
+local hits = redis.call('HINCRBY', KEYS[1], 'hit_count', 1)
+redis.call('HSET', KEYS[1], 'last_accessed', ARGV[2])
+redis.call('ZINCRBY', KEYS[2], 1, ARGV[1])
+redis.call('ZADD', KEYS[3], ARGV[3], ARGV[1])
+return {result, hits}
+"""
+
+
+class CacheBackend(ABC):
+    """Interface d'un backend de cache partagé"""
+
+    name = "abstract"
+
+    async def start(self):
+        """Initialiser le backend"""
+
+    async def stop(self):
+        """Libérer les ressources du backend"""
+
+    @abstractmethod
+    async def get_query(self, query_hash: str) -> Optional[Dict[str, Any]]:
+        """Lire un résultat et comptabiliser le hit ({"result", "hit_count"})"""
+
+    @abstractmethod
+    async def record_hit(self, query_hash: str):
+        """Comptabiliser un hit servi par un niveau supérieur du cache"""
+
+    @abstractmethod
+    async def set_query(self, query_hash: str, normalized_query: str, result: Dict[str, Any]) -> int:
+        """Enregistrer (ou remplacer) le résultat d'une requête, retourne sa taille sérialisée"""
+
+    @abstractmethod
+    async def delete_query(self, query_hash: str) -> bool:
+        """Supprimer le résultat d'une requête"""
+
+    @abstractmethod
+    async def clear_queries(self) -> int:
+        """Supprimer tous les résultats"""
+
+    @abstractmethod
+    async def usage(self) -> Dict[str, Any]:
+        """Nombre d'entrées et taille stockée (None si inconnue), en O(1)"""
+
+    @abstractmethod
+    async def cleanup_queries(self, max_age_days: int) -> int:
+        """Supprimer les résultats plus anciens que max_age_days (nombre d'entrées supprimées)"""
+
+    @abstractmethod
+    async def record_question(self, normalized: str, question: str):
+        """Comptabiliser une question posée"""
+
+    @abstractmethod
+    async def frequent_questions(self, limit: int) -> List[Dict[str, Any]]:
+        """Questions les plus fréquentes"""
+
+    @abstractmethod
+    async def question_counts(self, limit: int) -> List[Tuple[str, str, int]]:
+        """(forme canonique, question affichée, nombre) des questions les plus posées, sans variations"""
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """Backend SQLite local (écritures différées et groupées)"""
+
+    name = "sqlite"
+
+    async def get_query(self, query_hash: str) -> Optional[Dict[str, Any]]:
+        # Résultat pas encore écrit sur disque (file d'écriture différée)
+        stored = write_queue.pending_query_result(query_hash)
+        hit_count = 1
+
+        if stored is None:
+            result = await db_manager.fetch_sqlite_query_async(
+                "SELECT result, hit_count FROM query_cache WHERE query_hash = ?",
+                (query_hash,)
+            )
+            if not result:
+                return None
+            stored = result[0]["result"]
+            hit_count = result[0]["hit_count"]
+
+        decoded, size = decode_result(stored)
+
+        # Le compteur et la date d'accès sont mis à jour en différé
+        write_queue.enqueue_hit(query_hash, datetime.utcnow().isoformat())
+        return {
+            "result": decoded,
+            "hit_count": hit_count + write_queue.pending_hits(query_hash),
+            "size": size
+        }
+
+    async def record_hit(self, query_hash: str):
+        write_queue.enqueue_hit(query_hash, datetime.utcnow().isoformat())
+
+    async def set_query(self, query_hash: str, normalized_query: str, result: Dict[str, Any]) -> int:
+        stored, size = encode_result(result, settings.query_cache_codec)
+        write_queue.enqueue_query_result(
+            query_hash, normalized_query, stored, datetime.utcnow().isoformat()
+        )
+        return size
+
+    async def delete_query(self, query_hash: str) -> bool:
+        write_queue.discard_query(query_hash)
+        deleted = await db_manager.execute_sqlite_query_async(
+            "DELETE FROM query_cache WHERE query_hash = ?",
+            (query_hash,)
+        )
+        return deleted > 0
+
+    async def clear_queries(self) -> int:
+        write_queue.discard_all_queries()
+        return await db_manager.execute_sqlite_query_async("DELETE FROM query_cache")
+
+    async def usage(self) -> Dict[str, Any]:
+        # Compteurs tenus à jour par triggers
+        usage = (await db_manager.fetch_sqlite_query_async(
+            "SELECT total_bytes, entries FROM query_cache_usage WHERE id = 1"
+        ))[0]
+        return {"entries": usage["entries"], "bytes": usage["total_bytes"]}
+
+    async def cleanup_queries(self, max_age_days: int) -> int:
+        # Par lots : les écritures concurrentes ne sont pas bloquées
+        cutoff_date = datetime.utcnow() - timedelta(days=max_age_days)
+        return await cache_purger.purge_table("query_cache", "created_at", cutoff_date)
+
+    async def record_question(self, normalized: str, question: str):
+        # Compteur et variations fusionnés puis écrits en différé (upsert, variations bornées)
+        write_queue.enqueue_question(normalized, question, datetime.utcnow().isoformat())
+
+    async def frequent_questions(self, limit: int) -> List[Dict[str, Any]]:
+        return await db_manager.run_sqlite_read(lambda conn: top_questions(conn, limit))
+
+    async def question_counts(self, limit: int) -> List[Tuple[str, str, int]]:
+        rows = await db_manager.fetch_sqlite_query_async(
+            """SELECT normalized_question, display_question, count
+               FROM question_stats
+               ORDER BY count DESC
+               LIMIT ?""",
+            (limit,)
+        )
+        return [
+            (row["normalized_question"], row["display_question"] or row["normalized_question"], row["count"])
+            for row in rows
+        ]
+
+
+class RedisCacheBackend(CacheBackend):
+    """Backend Redis partagé entre plusieurs instances de l'API
+
+    Disposition des clés (préfixe configurable) :
+    - query:<hash>            hash (result, normalized_query, hit_count, created_at, last_accessed), TTL natif
+    - queries:hits            sorted set hash -> nombre de hits
+    - queries:recent          sorted set hash -> dernier accès (timestamp)
+    - questions:count         sorted set question normalisée -> nombre d'occurrences
+    - question:<normalized>   hash (last_asked, display : première formulation)
+    - question_variations:<normalized> sorted set formulation -> occurrences, borné
+    """
+
+    name = "redis"
+
+    def __init__(self, client=None, url: Optional[str] = None, prefix: Optional[str] = None,
+                 ttl_seconds: Optional[int] = None):
+        self._client = client
+        self.url = url or settings.redis_url
+        self.prefix = prefix if prefix is not None else settings.redis_key_prefix
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.cache_ttl_seconds
+        self._hit_script = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            raise Exception("Redis non connecté")
+        return self._client
+
+    def _key(self, *parts: str) -> str:
+        return self.prefix + ":".join(parts)
+
+    async def start(self):
+        if self._client is None:
+            import redis.asyncio as redis
+            self._client = redis.from_url(self.url, decode_responses=True)
+        await self._client.ping()
+        logger.info(f"Connecté à Redis: {self.url}")
+
+    async def stop(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._hit_script = None
+            logger.info("Connexion Redis fermée")
+
+    async def _hit(self, query_hash: str) -> Optional[Tuple[str, int]]:
+        """(résultat, nombre de hits) d'une entrée présente, après comptage du hit"""
+        if self._hit_script is None:
+            self._hit_script = self.client.register_script(_REDIS_HIT_SCRIPT)
+        now = datetime.utcnow()
+        found = await self._hit_script(
+            keys=[
+                self._key("query", query_hash), self._key("queries", "hits"),
+                self._key("queries", "recent")
+            ],
+            args=[query_hash, now.isoformat(), now.timestamp()]
+        )
+        if not found:
+            return None
+        result_json, hit_count = found
+        return result_json, int(hit_count)
+
+    async def get_query(self, query_hash: str) -> Optional[Dict[str, Any]]:
+        found = await self._hit(query_hash)
+        if found is None:
+            return None
+        result_json, hit_count = found
+        return {"result": json.loads(result_json), "hit_count": hit_count, "size": len(result_json)}
+
+    async def record_hit(self, query_hash: str):
+        await self._hit(query_hash)
+
+    async def set_query(self, query_hash: str, normalized_query: str, result: Dict[str, Any]) -> int:
+        key = self._key("query", query_hash)
+        now = datetime.utcnow()
+        result_json = json.dumps(result, ensure_ascii=False)
+
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            pipe.hset(key, mapping={
+                "result": result_json,
+                "normalized_query": normalized_query,
+                "hit_count": 1,
+                "created_at": now.isoformat(),
+                "last_accessed": now.isoformat()
+            })
+            if self.ttl_seconds:
+                pipe.expire(key, self.ttl_seconds)
+            pipe.zadd(self._key("queries", "hits"), {query_hash: 1})
+            pipe.zadd(self._key("queries", "recent"), {query_hash: now.timestamp()})
+            await pipe.execute()
+
+        return len(result_json)
+
+    async def delete_query(self, query_hash: str) -> bool:
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.delete(self._key("query", query_hash))
+            pipe.zrem(self._key("queries", "hits"), query_hash)
+            pipe.zrem(self._key("queries", "recent"), query_hash)
+            deleted, *_ = await pipe.execute()
+        return deleted > 0
+
+    async def clear_queries(self) -> int:
+        deleted = 0
+        async for key in self.client.scan_iter(match=self._key("query", "*"), count=500):
+            deleted += await self.client.delete(key)
+        await self.client.delete(
+            self._key("queries", "hits"), self._key("queries", "recent")
+        )
+        return deleted
+
+    async def usage(self) -> Dict[str, Any]:
+        # Taille des résultats gérée par Redis (maxmemory)
+        return {"entries": await self.client.zcard(self._key("queries", "hits")), "bytes": None}
+
+    async def cleanup_queries(self, max_age_days: int) -> int:
+        # Les résultats expirent via leur TTL : on retire les membres orphelins des index
+        cutoff = (datetime.utcnow() - timedelta(days=max_age_days)).timestamp()
+        recent_key = self._key("queries", "recent")
+        stale = await self.client.zrangebyscore(recent_key, "-inf", cutoff)
+
+        hits_key = self._key("queries", "hits")
+        cursor = 0
+        while True:
+            cursor, page = await self.client.zscan(hits_key, cursor, count=500)
+            if page:
+                # Une seule requête par page pour les tests d'existence
+                async with self.client.pipeline(transaction=False) as pipe:
+                    for query_hash, _ in page:
+                        pipe.exists(self._key("query", query_hash))
+                    exists = await pipe.execute()
+                stale.extend(query_hash for (query_hash, _), found in zip(page, exists) if not found)
+            if not cursor:
+                break
+
+        if stale:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for query_hash in stale:
+                    pipe.delete(self._key("query", query_hash))
+                pipe.zrem(hits_key, *stale)
+                pipe.zrem(recent_key, *stale)
+                await pipe.execute()
+        return len(set(stale))
+
+    async def record_question(self, normalized: str, question: str):
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.zincrby(self._key("questions", "count"), 1, normalized)
+            pipe.hset(self._key("question", normalized), "last_asked", datetime.utcnow().isoformat())
+            pipe.hsetnx(self._key("question", normalized), "display", question)
+            variations_key = self._key("question_variations", normalized)
+            pipe.zincrby(variations_key, 1, question)
+            # Seules les question_variations_max formulations les plus vues sont gardées
+            pipe.zremrangebyrank(variations_key, 0, -settings.question_variations_max - 1)
+            await pipe.execute()
+
+    async def frequent_questions(self, limit: int) -> List[Dict[str, Any]]:
+        top = await self.client.zrevrange(self._key("questions", "count"), 0, limit - 1, withscores=True)
+
+        async with self.client.pipeline(transaction=False) as pipe:
+            for normalized, _ in top:
+                pipe.hmget(self._key("question", normalized), "last_asked", "display")
+                pipe.zrevrange(self._key("question_variations", normalized), 0, -1)
+            details = await pipe.execute()
+
+        return [
+            {
+                "question": details[2 * i][1] or normalized,
+                "normalized_question": normalized,
+                "count": int(count),
+                "last_asked": details[2 * i][0],
+                "variations": details[2 * i + 1]
+            }
+            for i, (normalized, count) in enumerate(top)
+        ]
+
+    async def question_counts(self, limit: int) -> List[Tuple[str, str, int]]:
+        top = await self.client.zrevrange(self._key("questions", "count"), 0, limit - 1, withscores=True)
+
+        async with self.client.pipeline(transaction=False) as pipe:
+            for normalized, _ in top:
+                pipe.hget(self._key("question", normalized), "display")
+            displays = await pipe.execute()
+
+        return [
+            (normalized, displays[i] or normalized, int(count))
+            for i, (normalized, count) in enumerate(top)
+        ]
+
+
+def create_cache_backend(name: Optional[str] = None) -> CacheBackend:
+    """Instancier le backend configuré (cache_backend = "sqlite" ou "redis")"""
+    name = (name or settings.cache_backend).lower()
+    if name == "redis":
+        return RedisCacheBackend()
+    if name == "sqlite":
+        return SQLiteCacheBackend()
+    raise ValueError(f"Backend de cache inconnu: {name}")
@@ -0,0 +1,102 @@
+"""Encodage compact des résultats du cache des requêtes
+
+Format binaire : en-tête de 4 octets (b"SC", version du format, codec)
+suivi de la charge utile. Les lignes historiques, stockées en texte JSON,
+restent lisibles.
+"""
+import json
+import zlib
+from typing import Any, Dict, Tuple, Union
+
+MAGIC = b"SC"
+FORMAT_VERSION = 1
+HEADER_SIZE = 4
+
+CODEC_JSON = "json"
+CODEC_ZLIB = "zlib"
+CODEC_MSGPACK_ZSTD = "msgpack-zstd"
+
+_CODEC_IDS = {CODEC_JSON: 0, CODEC_ZLIB: 1, CODEC_MSGPACK_ZSTD: 2}
+_CODEC_NAMES = {codec_id: name for name, codec_id in _CODEC_IDS.items()}
+CODECS = tuple(_CODEC_IDS)
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+_zstd_compressor = None
+_zstd_decompressor = None
+
+
+def _msgpack():
+    try:
+        import msgpack
+    except ImportError:
+        raise RuntimeError("Le codec msgpack-zstd nécessite les paquets msgpack et zstandard")
+    return msgpack
+
+
+def _zstd():
+    global _zstd_compressor, _zstd_decompressor
+    if _zstd_compressor is None:
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError("Le codec msgpack-zstd nécessite les paquets msgpack et zstandard")
+        _zstd_compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+        _zstd_decompressor = zstandard.ZstdDecompressor()
+    return _zstd_compressor, _zstd_decompressor
+
+
+def _json_bytes(result: Dict[str, Any]) -> bytes:
+    return json.dumps(result, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def encode_result(result: Dict[str, Any], codec: str = CODEC_ZLIB) -> Tuple[bytes, int]:
+    """Encoder un résultat avec l'en-tête versionné
+
+    Retourne (données stockées, taille non compressée).
+    """
+    if codec not in _CODEC_IDS:
+        raise ValueError(f"Codec de cache inconnu: {codec}")
+
+    if codec == CODEC_MSGPACK_ZSTD:
+        raw = _msgpack().packb(result, use_bin_type=True, default=str)
+        compressor, _ = _zstd()
+        payload = compressor.compress(raw)
+    else:
+        raw = _json_bytes(result)
+        payload = zlib.compress(raw, ZLIB_LEVEL) if codec == CODEC_ZLIB else raw
+
+    return MAGIC + bytes((FORMAT_VERSION, _CODEC_IDS[codec])) + payload, len(raw)
+
+
+def decode_result(stored: Union[str, bytes]) -> Tuple[Dict[str, Any], int]:
+    """Décoder un résultat stocké (binaire versionné ou texte JSON historique)
+
+    Retourne (résultat, taille non compressée).
+    """
+    if isinstance(stored, str):
+        return json.loads(stored), len(stored)
+
+    if stored[:2] != MAGIC:
+        # Texte JSON stocké en BLOB
+        return json.loads(stored.decode("utf-8")), len(stored)
+
+    version, codec_id = stored[2], stored[3]
+    if version != FORMAT_VERSION or codec_id not in _CODEC_NAMES:
+        raise ValueError(f"Format de cache non supporté: version {version}, codec {codec_id}")
+
+    payload = memoryview(stored)[HEADER_SIZE:]
+    codec = _CODEC_NAMES[codec_id]
+    if codec == CODEC_MSGPACK_ZSTD:
+        _, decompressor = _zstd()
+        raw = decompressor.decompress(payload)
+        return _msgpack().unpackb(raw, raw=False), len(raw)
+
+    raw = zlib.decompress(payload) if codec == CODEC_ZLIB else bytes(payload)
+    return json.loads(raw.decode("utf-8")), len(raw)
+
+
+def stored_size(stored: Union[str, bytes]) -> int:
+    """Taille sur disque d'un résultat stocké"""
+    return len(stored.encode("utf-8")) if isinstance(stored, str) else len(stored)
@@ -0,0 +1,74 @@
+"""Éviction du cache des requêtes SQLite dans un budget d'octets
+
+La taille totale est tenue à jour par des triggers dans query_cache_usage :
+le dépassement du budget se vérifie en une lecture, et l'éviction ne
+parcourt que les index last_accessed / hit_count, jamais la table entière.
+"""
+import sqlite3
+from typing import Dict, List, Tuple
+
+POLICY_LRU = "lru"
+POLICY_LFU = "lfu"
+POLICY_HYBRID = "hybrid"
+POLICIES = (POLICY_LRU, POLICY_LFU, POLICY_HYBRID)
+
+# Après dépassement, on libère jusqu'à cette fraction du budget pour ne pas
+# évincer à chaque écriture
+EVICTION_TARGET_RATIO = 0.9
+
+# Nombre de candidats lus par itération (hybride : échantillon LRU)
+CANDIDATE_BATCH = 64
+
+_CANDIDATE_QUERIES = {
+    # Moins récemment utilisées (idx_query_last_accessed)
+    POLICY_LRU: "SELECT id, result_size FROM query_cache ORDER BY last_accessed, id LIMIT ?",
+    # Moins fréquemment utilisées, puis les plus anciennes (idx_query_hit_count)
+    POLICY_LFU: "SELECT id, result_size FROM query_cache ORDER BY hit_count, last_accessed LIMIT ?",
+    # Échantillon des moins récentes, départagé par fréquence : une entrée
+    # récente n'est jamais évincée, une entrée ancienne mais populaire survit
+    POLICY_HYBRID: """SELECT id, result_size FROM (
+                          SELECT id, result_size, hit_count, last_accessed FROM query_cache
+                          ORDER BY last_accessed, id LIMIT ?
+                      ) ORDER BY hit_count, last_accessed""",
+}
+
+
+def cache_usage(conn: sqlite3.Connection) -> Tuple[int, int]:
+    """(octets, entrées) du cache des requêtes"""
+    row = conn.execute("SELECT total_bytes, entries FROM query_cache_usage WHERE id = 1").fetchone()
+    return (row[0], row[1]) if row else (0, 0)
+
+
+def evict_query_cache(conn: sqlite3.Connection, max_bytes: int, policy: str = POLICY_LRU) -> Dict[str, int]:
+    """Évincer des entrées jusqu'à repasser sous le budget (à appeler dans une transaction)"""
+    if policy not in POLICIES:
+        raise ValueError(f"Politique d'éviction inconnue: {policy}")
+
+    stats = {"evicted": 0, "freed_bytes": 0}
+    if max_bytes <= 0:
+        return stats
+
+    total_bytes, _ = cache_usage(conn)
+    if total_bytes <= max_bytes:
+        return stats
+
+    to_free = total_bytes - int(max_bytes * EVICTION_TARGET_RATIO)
+    # L'hybride échantillonne plus large pour que la fréquence départage
+    limit = CANDIDATE_BATCH * 4 if policy == POLICY_HYBRID else CANDIDATE_BATCH
+
+    while stats["freed_bytes"] < to_free:
+        candidates = conn.execute(_CANDIDATE_QUERIES[policy], (limit,)).fetchall()
+        if not candidates:
+            break
+
+        victims: List[Tuple[int]] = []
+        for entry_id, size in candidates[:CANDIDATE_BATCH]:
+            victims.append((entry_id,))
+            stats["freed_bytes"] += size
+            if stats["freed_bytes"] >= to_free:
+                break
+
+        conn.executemany("DELETE FROM query_cache WHERE id = ?", victims)
+        stats["evicted"] += len(victims)
+
+    return stats
@@ -0,0 +1,163 @@
+"""Purge incrémentale des tables du cache SQLite
+
+Les suppressions se font par lots d'au plus batch_size lignes expirées,
+parcourus par clé primaire croissante à partir du dernier identifiant
+supprimé (recherche par position, sans fenêtres vides sur une table aux
+identifiants clairsemés), chacun dans une transaction courte sur le thread
+écrivain : les écritures
+différées et les autres requêtes s'intercalent entre deux lots au lieu
+d'attendre la fin d'un DELETE non borné. L'espace libéré est rendu au
+système par PRAGMA incremental_vacuum, lui aussi par tranches.
+"""
+import asyncio
+import sqlite3
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, Dict, Optional
+from loguru import logger
+from config import settings
+from database import db_manager
+
+# Mode auto_vacuum INCREMENTAL (PRAGMA auto_vacuum)
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+class CachePurger:
+    """Suppression par lots des entrées expirées et récupération de l'espace"""
+
+    def __init__(self, batch_size: Optional[int] = None, pause: Optional[float] = None,
+                 vacuum_pages: Optional[int] = None):
+        self.batch_size = batch_size
+        self.pause = pause
+        self.vacuum_pages = vacuum_pages
+        self._lock = asyncio.Lock()
+        self.progress: Dict[str, Any] = {"running": False}
+        self.last_report: Optional[Dict[str, Any]] = None
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def _settings(self):
+        return (
+            self.batch_size or settings.cache_purge_batch_size,
+            settings.cache_purge_pause if self.pause is None else self.pause,
+            self.vacuum_pages or settings.cache_purge_vacuum_pages
+        )
+
+    @asynccontextmanager
+    async def session(self):
+        """Purge exclusive : ouvre puis clôt le rapport de progression"""
+        async with self._lock:
+            self.progress = {
+                "running": True,
+                "started_at": datetime.utcnow().isoformat(),
+                "finished_at": None,
+                "table": None,
+                "position": None,
+                "max_id": None,
+                "batches": 0,
+                "deleted": {},
+                "dropped_tables": [],
+                "vacuumed_pages": 0
+            }
+            try:
+                yield self.progress
+            finally:
+                self.progress.update({
+                    "running": False,
+                    "table": None,
+                    "finished_at": datetime.utcnow().isoformat()
+                })
+                self.last_report = dict(self.progress)
+                logger.info(
+                    f"Purge du cache terminée: {self.progress['deleted']} lignes supprimées en "
+                    f"{self.progress['batches']} lots, {len(self.progress['dropped_tables'])} tables "
+                    f"supprimées, {self.progress['vacuumed_pages']} pages récupérées"
+                )
+
+    async def purge_table(self, table: str, time_column: str, cutoff: datetime) -> int:
+        """Supprimer les lignes plus anciennes que cutoff, par lots repris après le dernier id supprimé"""
+        batch_size, pause, _ = self._settings()
+        bounds = (await db_manager.fetch_sqlite_query_async(
+            f"SELECT MIN(id) AS min_id, MAX(id) AS max_id FROM {table}"
+        ))[0]
+        if bounds["min_id"] is None:
+            return 0
+
+        self.progress.update({"table": table, "position": bounds["min_id"] - 1, "max_id": bounds["max_id"]})
+        self.progress["deleted"].setdefault(table, 0)
+        select = f"SELECT id FROM {table} WHERE id > ? AND {time_column} < ? ORDER BY id LIMIT ?"
+        delete = f"DELETE FROM {table} WHERE id >= ? AND id <= ? AND {time_column} < ?"
+
+        def _delete_batch(conn: sqlite3.Connection, position: int):
+            ids = [row[0] for row in conn.execute(select, (position, cutoff.isoformat(), batch_size))]
+            if not ids:
+                return 0, position
+            # Les lignes expirées de [premier, dernier] sont exactement celles du lot
+            conn.execute(delete, (ids[0], ids[-1], cutoff.isoformat()))
+            return len(ids), ids[-1]
+
+        position, deleted = bounds["min_id"] - 1, 0
+        while True:
+            count, position = await db_manager.run_sqlite_transaction(
+                lambda conn, after=position: _delete_batch(conn, after)
+            )
+            if not count:
+                break
+            deleted += count
+
+            self.progress["position"] = position
+            self.progress["deleted"][table] = deleted
+            self.progress["batches"] += 1
+            if count < batch_size:
+                break
+
+            # Laisser passer les autres écritures entre deux lots
+            await asyncio.sleep(pause)
+
+        return deleted
+
+    async def drop_table(self, table: str):
+        """Supprimer une table entière (partition expirée) dans sa propre transaction"""
+        _, pause, _ = self._settings()
+        await db_manager.run_sqlite_transaction(lambda conn: conn.execute(f"DROP TABLE IF EXISTS {table}"))
+        self.progress["dropped_tables"].append(table)
+        await asyncio.sleep(pause)
+
+    async def reclaim_space(self) -> int:
+        """Rendre les pages libres au système (auto_vacuum INCREMENTAL requis)"""
+        _, pause, vacuum_pages = self._settings()
+
+        def _auto_vacuum(conn: sqlite3.Connection) -> int:
+            return conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+
+        if await db_manager.run_sqlite_read(_auto_vacuum) != AUTO_VACUUM_INCREMENTAL:
+            logger.info(
+                "auto_vacuum INCREMENTAL inactif sur cette base : un VACUUM unique hors "
+                "production est nécessaire pour récupérer l'espace par tranches"
+            )
+            return 0
+
+        def _vacuum_step(conn: sqlite3.Connection) -> int:
+            before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            conn.execute(f"PRAGMA incremental_vacuum({int(vacuum_pages)})").fetchall()
+            return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+        reclaimed = 0
+        while True:
+            freed = await db_manager.run_sqlite_transaction(_vacuum_step)
+            if freed <= 0:
+                break
+            reclaimed += freed
+            self.progress["vacuumed_pages"] = reclaimed
+            await asyncio.sleep(pause)
+        return reclaimed
+
+    def status(self) -> Dict[str, Any]:
+        """Progression de la purge en cours et rapport de la dernière purge"""
+        return {"current": self.progress if self.running else None, "last": self.last_report}
+
+
+# Instance globale
+cache_purger = CachePurger()
@@ -1,20 +1,64 @@
 """Services de cache et analyse des requêtes"""
 import json
+import asyncio
 import hashlib
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
+from config import settings
 from database import db_manager
-from models import QueryCache, ActionCache, QuestionStats
+from write_behind import write_queue
+from memory_cache import LRUCache
+from semantic_cache import SemanticCache
+from cache_backends import CacheBackend, create_cache_backend
+from audit_watermark import audit_watermark, is_stale
+from cache_purge import cache_purger
+from cache_stats import cache_stats
+from text_normalizer import normalize_question
+from nlp_service import NLPService
+from question_ranking import FrequentQuestions
+from autocomplete import AutocompleteIndex
+from similarity_index import similarity_index
+from action_telemetry import (
+    LEGACY_ARCHIVE, expired_partitions, legacy_newest, prune_rollups, rollup_counts, summarize
+)
+from models import QueryCache, ActionCache, QuestionStats, QueryAnalysis
 from loguru import logger
 
 
 class CacheService:
-    """Service de gestion du cache"""
+    """Service de gestion du cache (niveau mémoire LRU devant le backend partagé)"""
+    
+    # Niveau 1 : requête normalisée -> {"query_hash", "result", "hit_count"}
+    memory_tier = LRUCache(
+        max_entries=settings.query_cache_memory_max_entries,
+        max_bytes=settings.query_cache_memory_max_bytes,
+        ttl_seconds=settings.query_cache_memory_ttl
+    )
+    # Réponses des questions reformulées (mêmes entités, texte similaire)
+    semantic_tier = SemanticCache(
+        threshold=settings.semantic_cache_threshold,
+        max_entries=settings.semantic_cache_max_entries,
+        ttl_seconds=settings.semantic_cache_ttl
+    )
+    # Niveau 2 : backend configuré (SQLite local ou Redis partagé)
+    backend: CacheBackend = create_cache_backend()
+    _cleanup_task: Optional[asyncio.Task] = None
+    
+    @staticmethod
+    async def start_backend():
+        """Initialiser le backend de cache configuré"""
+        await CacheService.backend.start()
+        logger.info(f"Backend de cache: {CacheService.backend.name}")
+    
+    @staticmethod
+    async def stop_backend():
+        """Fermer le backend de cache"""
+        await CacheService.backend.stop()
     
     @staticmethod
     def normalize_query(query: str) -> str:
-        """Normaliser une requête pour le cache"""
-        return query.lower().strip().replace("  ", " ")
+        """Normaliser une requête pour le cache (forme canonique, voir text_normalizer)"""
+        return normalize_question(query)
     
     @staticmethod
     def generate_query_hash(query: str) -> str:
@@ -26,29 +70,51 @@ class CacheService:
     async def get_cached_query(query: str) -> Optional[Dict[str, Any]]:
         """Récupérer une requête du cache"""
         try:
-            query_hash = CacheService.generate_query_hash(query)
-            
-            # Rechercher dans SQLite
-            result = db_manager.fetch_sqlite_query(
-                "SELECT * FROM query_cache WHERE query_hash = ?",
-                (query_hash,)
-            )
+            normalized_query = CacheService.normalize_query(query)
             
-            if result:
-                row = result[0]
-                # Mettre à jour le compteur et la date d'accès
-                db_manager.execute_sqlite_query(
-                    "UPDATE query_cache SET hit_count = hit_count + 1, last_accessed = ? WHERE query_hash = ?",
-                    (datetime.utcnow().isoformat(), query_hash)
-                )
-                
+            # Niveau mémoire : ni hash ni accès au backend pour la lecture
+            entry = CacheService.memory_tier.get(normalized_query)
+            if entry is not None and await CacheService._is_stale(entry["result"]):
+                await CacheService._invalidate_stale(query, normalized_query, entry["query_hash"])
+                cache_stats.record_lookup(normalized_query)
+                return None
+            if entry is not None:
+                cache_stats.record_lookup(normalized_query, "memory")
+                entry["hit_count"] += 1
+                await CacheService.backend.record_hit(entry["query_hash"])
                 return {
-                    "result": json.loads(row["result"]),
-                    "hit_count": row["hit_count"] + 1,
+                    "result": entry["result"],
+                    "hit_count": entry["hit_count"],
                     "cached": True
                 }
             
-            return None
+            query_hash = hashlib.md5(normalized_query.encode()).hexdigest()
+            cached = await CacheService.backend.get_query(query_hash)
+            
+            if cached is None:
+                cache_stats.record_lookup(normalized_query)
+                return None
+            
+            if await CacheService._is_stale(cached["result"]):
+                await CacheService._invalidate_stale(query, normalized_query, query_hash)
+                cache_stats.record_lookup(normalized_query)
+                return None
+            
+            cache_stats.record_lookup(normalized_query, "backend", cached["size"])
+            entry = {
+                "query_hash": query_hash,
+                "result": cached["result"],
+                "hit_count": cached["hit_count"]
+            }
+            
+            # Lecture traversante : promotion vers le niveau mémoire
+            CacheService.memory_tier.set(normalized_query, entry, size=cached["size"])
+            
+            return {
+                "result": entry["result"],
+                "hit_count": entry["hit_count"],
+                "cached": True
+            }
             
         except Exception as e:
             logger.error(f"Erreur lors de la récupération du cache: {e}")
@@ -60,15 +126,14 @@ class CacheService:
         try:
             query_hash = CacheService.generate_query_hash(query)
             normalized_query = CacheService.normalize_query(query)
-            result_json = json.dumps(result, ensure_ascii=False)
             
-            # Insérer ou mettre à jour dans SQLite
-            db_manager.execute_sqlite_query(
-                """INSERT OR REPLACE INTO query_cache 
-                   (query_hash, normalized_query, result, hit_count, created_at, last_accessed)
-                   VALUES (?, ?, ?, 1, ?, ?)""",
-                (query_hash, normalized_query, result_json, 
-                 datetime.utcnow().isoformat(), datetime.utcnow().isoformat())
+            # Écriture traversante : backend puis niveau mémoire
+            size = await CacheService.backend.set_query(query_hash, normalized_query, result)
+            cache_stats.record_write(size)
+            CacheService.memory_tier.set(
+                normalized_query,
+                {"query_hash": query_hash, "result": result, "hit_count": 1},
+                size=size
             )
             
             logger.info(f"Requête mise en cache: {query_hash}")
@@ -77,40 +142,127 @@ class CacheService:
             logger.error(f"Erreur lors de la mise en cache: {e}")
     
     @staticmethod
-    async def get_cache_stats() -> Dict[str, Any]:
-        """Obtenir les statistiques du cache"""
+    async def _is_stale(result: Dict[str, Any]) -> bool:
+        """Des données d'audit plus récentes recouvrent-elles la fenêtre de la réponse"""
+        tag = result.get("freshness") if isinstance(result, dict) else None
+        if not tag:
+            return False
+        return is_stale(tag, await audit_watermark.current())
+    
+    @staticmethod
+    async def _invalidate_stale(query: str, normalized_query: str, query_hash: str):
+        """Retirer une réponse périmée de tous les niveaux"""
+        cache_stats.incr("stale")
+        CacheService.memory_tier.delete(normalized_query)
+        # Le cache sémantique indexe la question posée, pas sa forme canonique
+        CacheService.semantic_tier.invalidate(query)
+        await CacheService.backend.delete_query(query_hash)
+        logger.info(f"Réponse périmée par de nouvelles données d'audit: {query_hash}")
+    
+    @staticmethod
+    async def get_semantic_answer(query: str, analysis: QueryAnalysis) -> Optional[Dict[str, Any]]:
+        """Réponse mise en cache d'une question reformulée aux mêmes entités"""
+        if not settings.semantic_cache_enabled:
+            return None
+        try:
+            match = CacheService.semantic_tier.lookup(query, analysis)
+            if match and await CacheService._is_stale(match["response"]):
+                cache_stats.incr("stale")
+                CacheService.semantic_tier.invalidate(match["matched_question"])
+                match = None
+            cache_stats.record_semantic(match is not None)
+            return match
+        except Exception as e:
+            logger.error(f"Erreur lors de la recherche sémantique dans le cache: {e}")
+            return None
+    
+    @staticmethod
+    def cache_semantic_answer(query: str, analysis: QueryAnalysis, result: Dict[str, Any]):
+        """Indexer la réponse d'une question pour ses reformulations"""
+        if not settings.semantic_cache_enabled:
+            return
+        try:
+            CacheService.semantic_tier.add(query, analysis, result)
+        except Exception as e:
+            logger.error(f"Erreur lors de l'indexation sémantique: {e}")
+    
+    @staticmethod
+    async def invalidate_query(query: str) -> bool:
+        """Invalider une requête dans les deux niveaux du cache"""
         try:
-            # Statistiques générales
-            total_queries = db_manager.fetch_sqlite_query(
-                "SELECT COUNT(*) as count FROM query_cache"
-            )[0]["count"]
+            normalized_query = CacheService.normalize_query(query)
+            query_hash = hashlib.md5(normalized_query.encode()).hexdigest()
             
-            total_hits = db_manager.fetch_sqlite_query(
-                "SELECT SUM(hit_count) as total FROM query_cache"
-            )[0]["total"] or 0
+            CacheService.memory_tier.delete(normalized_query)
+            CacheService.semantic_tier.invalidate(query)
+            deleted = await CacheService.backend.delete_query(query_hash)
             
-            # Top requêtes
-            top_queries = db_manager.fetch_sqlite_query(
-                """SELECT normalized_query, hit_count, last_accessed 
-                   FROM query_cache 
-                   ORDER BY hit_count DESC 
-                   LIMIT 10"""
-            )
+            logger.info(f"Requête invalidée: {query_hash}")
+            return deleted
             
-            # Requêtes récentes
-            recent_queries = db_manager.fetch_sqlite_query(
-                """SELECT normalized_query, hit_count, last_accessed 
-                   FROM query_cache 
-                   ORDER BY last_accessed DESC 
-                   LIMIT 10"""
-            )
+        except Exception as e:
+            logger.error(f"Erreur lors de l'invalidation du cache: {e}")
+            return False
+    
+    @staticmethod
+    async def clear_query_cache() -> int:
+        """Vider le cache des requêtes (niveau mémoire et backend)"""
+        try:
+            CacheService.memory_tier.clear()
+            CacheService.semantic_tier.clear()
+            deleted = await CacheService.backend.clear_queries()
+            
+            logger.info(f"Cache des requêtes vidé: {deleted} entrées supprimées")
+            return deleted
+            
+        except Exception as e:
+            logger.error(f"Erreur lors du vidage du cache: {e}")
+            return 0
+    
+    @staticmethod
+    def get_tier_stats(counters: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+        """Compteurs de hits/misses par niveau de cache"""
+        if counters is None:
+            counters = cache_stats.snapshot()["counters"]
+        backend_lookups = counters["lookups"] - counters["memory_hits"]
+        return {
+            "memory": CacheService.memory_tier.stats(),
+            "semantic": CacheService.semantic_tier.stats(),
+            "analysis": NLPService.analysis_cache_stats(),
+            CacheService.backend.name: {
+                "hits": counters["backend_hits"],
+                "misses": backend_lookups - counters["backend_hits"],
+                "hit_rate": (counters["backend_hits"] / backend_lookups) * 100 if backend_lookups else 0.0
+            },
+            "freshness": {
+                "stale_invalidations": counters["stale"],
+                **audit_watermark.stats()
+            }
+        }
+    
+    @staticmethod
+    async def get_cache_stats() -> Dict[str, Any]:
+        """Obtenir les statistiques du cache (compteurs en mémoire, sans parcours du cache)"""
+        try:
+            usage = await CacheService.backend.usage()
+            stats = cache_stats.snapshot()
+            counters = stats["counters"]
             
             return {
-                "total_queries": total_queries,
-                "total_hits": total_hits,
-                "hit_rate": (total_hits / max(total_queries, 1)) * 100,
-                "top_queries": [dict(row) for row in top_queries],
-                "recent_queries": [dict(row) for row in recent_queries]
+                "backend": CacheService.backend.name,
+                "total_queries": usage["entries"],
+                "total_bytes": usage["bytes"],
+                "max_bytes": settings.query_cache_max_bytes if CacheService.backend.name == "sqlite" else None,
+                "lookups": counters["lookups"],
+                "total_hits": counters["hits"],
+                "misses": counters["misses"],
+                # hits / recherches (et non plus hits / entrées)
+                "hit_rate": stats["hit_rate"],
+                "effective_hit_rate": stats["effective_hit_rate"],
+                "counters": counters,
+                "top_queries": stats["top_queries"],
+                "recent_queries": stats["recent_queries"],
+                "tiers": CacheService.get_tier_stats(counters)
             }
             
         except Exception as e:
@@ -123,10 +275,7 @@ class CacheService:
         try:
             metadata_json = json.dumps(metadata or {}, ensure_ascii=False)
             
-            db_manager.execute_sqlite_query(
-                "INSERT INTO action_cache (action_type, user_name, metadata) VALUES (?, ?, ?)",
-                (action_type, user, metadata_json)
-            )
+            write_queue.enqueue_action(action_type, user, metadata_json, datetime.utcnow().isoformat())
             
         except Exception as e:
             logger.error(f"Erreur lors de la mise en cache de l'action: {e}")
@@ -136,138 +285,273 @@ class CacheService:
         """Obtenir les statistiques des actions"""
         try:
             # Calculer la date de début selon le timeframe
+            now = datetime.utcnow()
             if timeframe == "1h":
-                start_time = datetime.utcnow() - timedelta(hours=1)
-            elif timeframe == "24h":
-                start_time = datetime.utcnow() - timedelta(days=1)
+                start_time = now - timedelta(hours=1)
             elif timeframe == "7d":
-                start_time = datetime.utcnow() - timedelta(days=7)
+                start_time = now - timedelta(days=7)
             else:
-                start_time = datetime.utcnow() - timedelta(days=1)
-            
-            # Actions par type
-            actions_by_type = db_manager.fetch_sqlite_query(
-                """SELECT action_type, COUNT(*) as count 
-                   FROM action_cache 
-                   WHERE timestamp >= ? 
-                   GROUP BY action_type 
-                   ORDER BY count DESC""",
-                (start_time.isoformat(),)
-            )
+                start_time = now - timedelta(days=1)
+            minute_retention_start = now - timedelta(hours=settings.action_rollup_minute_retention_hours)
             
-            # Actions par utilisateur
-            actions_by_user = db_manager.fetch_sqlite_query(
-                """SELECT user_name, COUNT(*) as count 
-                   FROM action_cache 
-                   WHERE timestamp >= ? AND user_name IS NOT NULL
-                   GROUP BY user_name 
-                   ORDER BY count DESC 
-                   LIMIT 10""",
-                (start_time.isoformat(),)
+            # Lecture des seuls agrégats : coût indépendant du volume d'actions
+            rows = await db_manager.run_sqlite_read(
+                lambda conn: rollup_counts(conn, start_time, minute_retention_start)
             )
             
-            # Total des actions
-            total_actions = db_manager.fetch_sqlite_query(
-                "SELECT COUNT(*) as count FROM action_cache WHERE timestamp >= ?",
-                (start_time.isoformat(),)
-            )[0]["count"]
-            
-            return {
-                "timeframe": timeframe,
-                "total_actions": total_actions,
-                "actions_by_type": [dict(row) for row in actions_by_type],
-                "actions_by_user": [dict(row) for row in actions_by_user]
-            }
+            return {"timeframe": timeframe, **summarize(rows)}
             
         except Exception as e:
             logger.error(f"Erreur lors de la récupération des stats d'actions: {e}")
             return {}
     
     @staticmethod
-    async def cleanup_old_cache(max_age_days: int = 30):
-        """Nettoyer les anciennes entrées du cache"""
+    async def cleanup_old_cache(max_age_days: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Nettoyer les anciennes entrées du cache, par lots, puis récupérer l'espace disque"""
+        if max_age_days is None:
+            max_age_days = settings.cache_max_age_days
+        if cache_purger.running:
+            logger.info("Nettoyage du cache déjà en cours")
+            return None
+        
         try:
-            cutoff_date = datetime.utcnow() - timedelta(days=max_age_days)
-            
-            # Nettoyer les requêtes anciennes
-            db_manager.execute_sqlite_query(
-                "DELETE FROM query_cache WHERE created_at < ?",
-                (cutoff_date.isoformat(),)
-            )
-            
-            # Nettoyer les actions anciennes
-            db_manager.execute_sqlite_query(
-                "DELETE FROM action_cache WHERE timestamp < ?",
-                (cutoff_date.isoformat(),)
-            )
-            
-            logger.info(f"Cache nettoyé: entrées plus anciennes que {max_age_days} jours supprimées")
+            async with cache_purger.session() as progress:
+                cutoff_date = datetime.utcnow() - timedelta(days=max_age_days)
+                
+                # Nettoyer les requêtes anciennes
+                deleted = await CacheService.backend.cleanup_queries(max_age_days)
+                
+                # Nettoyer les actions anciennes
+                await CacheService._purge_action_telemetry(cutoff_date)
+                
+                # Les entrées supprimées ne doivent plus être servies par les niveaux mémoire,
+                # qui ne gardent pas leur date de création : vidés seulement si le backend a supprimé
+                if deleted:
+                    CacheService.memory_tier.clear()
+                    CacheService.semantic_tier.clear()
+                
+                await cache_purger.reclaim_space()
+                
+                logger.info(f"Cache nettoyé: entrées plus anciennes que {max_age_days} jours supprimées")
+                return progress
             
         except Exception as e:
             logger.error(f"Erreur lors du nettoyage du cache: {e}")
+            return None
+    
+    @staticmethod
+    async def _purge_action_telemetry(cutoff: datetime):
+        """Supprimer les partitions d'actions expirées et élaguer les agrégats"""
+        partitions = await db_manager.run_sqlite_read(lambda conn: expired_partitions(conn, cutoff))
+        for partition in partitions:
+            await cache_purger.drop_table(partition)
+        
+        # Archive de l'ancienne table action_cache : supprimée d'un bloc une fois expirée
+        newest = await db_manager.run_sqlite_read(legacy_newest)
+        if newest is not None:
+            if newest < cutoff.isoformat():
+                await cache_purger.drop_table(LEGACY_ARCHIVE)
+            else:
+                await cache_purger.purge_table(LEGACY_ARCHIVE, "timestamp", cutoff)
+        
+        now = datetime.utcnow()
+        await db_manager.run_sqlite_transaction(lambda conn: prune_rollups(
+            conn,
+            now - timedelta(hours=settings.action_rollup_minute_retention_hours),
+            now - timedelta(days=settings.action_rollup_hour_retention_days)
+        ))
+    
+    @staticmethod
+    async def _periodic_cleanup(interval: float):
+        while True:
+            await CacheService.cleanup_old_cache()
+            await asyncio.sleep(interval)
+    
+    @staticmethod
+    def start_cleanup_task():
+        """Lancer le nettoyage périodique en arrière-plan (le premier passage est immédiat)"""
+        if settings.cache_purge_interval > 0 and CacheService._cleanup_task is None:
+            CacheService._cleanup_task = asyncio.create_task(
+                CacheService._periodic_cleanup(settings.cache_purge_interval)
+            )
+    
+    @staticmethod
+    async def stop_cleanup_task():
+        """Arrêter le nettoyage périodique (un lot en cours est abandonné, sa transaction est atomique)"""
+        task, CacheService._cleanup_task = CacheService._cleanup_task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
 
 
 class QuestionStatsService:
     """Service de gestion des statistiques de questions"""
     
+    # Classement en mémoire, chargé au démarrage et tenu à jour à chaque question
+    ranking = FrequentQuestions(capacity=settings.frequent_questions_capacity)
+    # Autocomplétion par préfixe des questions enregistrées
+    autocomplete = AutocompleteIndex(
+        top_n=settings.autocomplete_top_n,
+        max_questions=settings.autocomplete_max_questions
+    )
+    # Index de similarité de toutes les questions (partagé avec NLPService)
+    similarity = similarity_index
+    _refresh_task: Optional[asyncio.Task] = None
+    _refit_task: Optional[asyncio.Task] = None
+    _fit_task: Optional[asyncio.Task] = None
+    
     @staticmethod
     async def update_question_stats(question: str):
         """Mettre à jour les statistiques d'une question"""
         try:
             normalized = CacheService.normalize_query(question)
-            
-            # Vérifier si la question existe déjà
-            existing = db_manager.fetch_sqlite_query(
-                "SELECT * FROM question_stats WHERE normalized_question = ?",
-                (normalized,)
-            )
-            
-            if existing:
-                # Mettre à jour le compteur
-                variations = json.loads(existing[0]["variations"] or "[]")
-                if question not in variations:
-                    variations.append(question)
-                
-                db_manager.execute_sqlite_query(
-                    """UPDATE question_stats 
-                       SET count = count + 1, last_asked = ?, variations = ?
-                       WHERE normalized_question = ?""",
-                    (datetime.utcnow().isoformat(), json.dumps(variations), normalized)
-                )
-            else:
-                # Créer une nouvelle entrée
-                db_manager.execute_sqlite_query(
-                    """INSERT INTO question_stats 
-                       (normalized_question, count, last_asked, variations)
-                       VALUES (?, 1, ?, ?)""",
-                    (normalized, datetime.utcnow().isoformat(), json.dumps([question]))
-                )
+            await CacheService.backend.record_question(normalized, question)
+            QuestionStatsService.ranking.record(normalized, question, datetime.utcnow().isoformat())
+            QuestionStatsService.autocomplete.record(normalized, question)
+            QuestionStatsService.similarity.add(normalized, question)
                 
         except Exception as e:
             logger.error(f"Erreur lors de la mise à jour des stats de question: {e}")
     
     @staticmethod
     async def get_frequent_questions(limit: int = 10) -> List[Dict[str, Any]]:
-        """Obtenir les questions les plus fréquentes"""
+        """Obtenir les questions les plus fréquentes (classement en mémoire, O(k))"""
         try:
-            results = db_manager.fetch_sqlite_query(
-                """SELECT normalized_question, count, last_asked, variations
-                   FROM question_stats 
-                   ORDER BY count DESC 
-                   LIMIT ?""",
-                (limit,)
-            )
-            
-            return [
-                {
-                    "question": row["normalized_question"],
-                    "count": row["count"],
-                    "last_asked": row["last_asked"],
-                    "variations": json.loads(row["variations"] or "[]")
-                }
-                for row in results
-            ]
+            ranking = QuestionStatsService.ranking
+            if ranking.loaded and limit <= ranking.capacity:
+                return ranking.top(limit)
+            return await CacheService.backend.frequent_questions(limit)
             
         except Exception as e:
             logger.error(f"Erreur lors de la récupération des questions fréquentes: {e}")
             return []
+    
+    @staticmethod
+    async def get_suggestions(partial_message: str, limit: int = 5) -> List[str]:
+        """Complétions d'un message partiel, complétées par les questions fréquentes"""
+        suggestions = [
+            completion["question"]
+            for completion in QuestionStatsService.autocomplete.complete(partial_message, limit)
+        ]
+        if len(suggestions) < 3:
+            for question in await QuestionStatsService.get_frequent_questions(limit):
+                if question["question"] not in suggestions:
+                    suggestions.append(question["question"])
+        return suggestions[:limit]
+    
+    @staticmethod
+    async def load_question_indexes():
+        """(Re)charger le classement et l'index d'autocomplétion depuis le backend"""
+        ranking = QuestionStatsService.ranking
+        autocomplete = QuestionStatsService.autocomplete
+        # Les questions en file d'écriture doivent figurer dans ce qui est relu ; seules
+        # celles comptées après le vidage sont réappliquées (sinon comptées deux fois)
+        await write_queue.flush()
+        ranking.begin_load()
+        autocomplete.begin_build()
+        ranking.load(await CacheService.backend.frequent_questions(ranking.capacity))
+        counts = await CacheService.backend.question_counts(autocomplete.max_questions)
+        # Reconstruction hors de la boucle d'événements, substituée d'un bloc
+        await asyncio.to_thread(autocomplete.build, counts)
+    
+    @staticmethod
+    async def _periodic_refresh(interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await QuestionStatsService.load_question_indexes()
+            except Exception as e:
+                logger.error(f"Erreur lors du rechargement des index de questions: {e}")
+    
+    @staticmethod
+    async def refit_similarity_index():
+        """Réajuster l'index de similarité sur toutes les questions puis le sauvegarder"""
+        similarity = QuestionStatsService.similarity
+        await write_queue.flush()
+        similarity.begin_fit()
+        counts = await CacheService.backend.question_counts(settings.similarity_index_max_questions)
+        # Ajustement complet hors de la boucle d'événements ; l'index courant reste servi
+        await asyncio.to_thread(similarity.fit, counts)
+        await asyncio.to_thread(similarity.save)
+    
+    @staticmethod
+    async def _initial_fit():
+        try:
+            await QuestionStatsService.refit_similarity_index()
+            logger.info(f"Index de similarité ajusté: {len(QuestionStatsService.similarity)} questions")
+        except Exception as e:
+            logger.error(f"Erreur lors de l'ajustement de l'index de similarité: {e}")
+        finally:
+            QuestionStatsService._fit_task = None
+    
+    @staticmethod
+    async def _periodic_refit(interval: float):
+        elapsed = 0.0
+        check = min(interval, 60.0)
+        while True:
+            await asyncio.sleep(check)
+            elapsed += check
+            if elapsed < interval and not QuestionStatsService.similarity.needs_refit:
+                continue
+            elapsed = 0.0
+            try:
+                await QuestionStatsService.refit_similarity_index()
+            except Exception as e:
+                logger.error(f"Erreur lors du réajustement de l'index de similarité: {e}")
+    
+    @staticmethod
+    async def start_question_indexes():
+        """Charger les index puis les resynchroniser périodiquement avec le backend
+        (autres instances partageant Redis, surestimations du remplacement)"""
+        try:
+            await QuestionStatsService.load_question_indexes()
+            logger.info(
+                f"Index de questions chargés: {len(QuestionStatsService.ranking)} fréquentes, "
+                f"{len(QuestionStatsService.autocomplete)} pour l'autocomplétion"
+            )
+        except Exception as e:
+            logger.error(f"Erreur lors du chargement des index de questions: {e}")
+        
+        try:
+            similarity = QuestionStatsService.similarity
+            if await asyncio.to_thread(similarity.load):
+                logger.info(f"Index de similarité chargé: {len(similarity)} questions")
+            elif QuestionStatsService._fit_task is None:
+                # Pas d'index sauvegardé : ajustement en arrière-plan, index vide servi d'ici là
+                QuestionStatsService._fit_task = asyncio.create_task(QuestionStatsService._initial_fit())
+        except Exception as e:
+            logger.error(f"Erreur lors du chargement de l'index de similarité: {e}")
+        
+        interval = settings.frequent_questions_refresh_interval
+        if interval > 0 and QuestionStatsService._refresh_task is None:
+            QuestionStatsService._refresh_task = asyncio.create_task(
+                QuestionStatsService._periodic_refresh(interval)
+            )
+        refit_interval = settings.similarity_refit_interval
+        if refit_interval > 0 and QuestionStatsService._refit_task is None:
+            QuestionStatsService._refit_task = asyncio.create_task(
+                QuestionStatsService._periodic_refit(refit_interval)
+            )
+    
+    @staticmethod
+    async def stop_question_indexes():
+        """Arrêter les tâches périodiques et sauvegarder l'index de similarité"""
+        tasks = [QuestionStatsService._refresh_task, QuestionStatsService._refit_task,
+                 QuestionStatsService._fit_task]
+        QuestionStatsService._refresh_task = QuestionStatsService._refit_task = None
+        QuestionStatsService._fit_task = None
+        for task in tasks:
+            if task is None:
+                continue
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        try:
+            await asyncio.to_thread(QuestionStatsService.similarity.save)
+        except Exception as e:
+            logger.error(f"Erreur lors de la sauvegarde de l'index de similarité: {e}")
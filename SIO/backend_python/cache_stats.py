@@ -0,0 +1,224 @@
+"""Statistiques du cache tenues en mémoire et matérialisées dans SQLite
+
+Les compteurs (recherches, hits, misses, octets, évictions, requêtes
+regroupées) sont incrémentés en mémoire sur le chemin de la requête et
+écrits périodiquement sous forme de deltas dans la table cache_stats. Les
+requêtes les plus servies sont suivies par l'algorithme Space-Saving :
+mémoire bornée, quel que soit le nombre de requêtes distinctes.
+"""
+import asyncio
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from loguru import logger
+from config import settings
+from database import db_manager
+
+COUNTERS = (
+    "lookups", "hits", "misses", "memory_hits", "backend_hits", "stale",
+    "semantic_lookups", "semantic_hits", "coalesced",
+    "writes", "bytes_written", "bytes_read", "evictions", "evicted_bytes"
+)
+
+
+class SpaceSaving:
+    """Top-k approximatif des éléments les plus fréquents (Metwally et al.)
+
+    Au plus capacity éléments sont suivis ; un nouvel élément remplace le
+    moins fréquent et hérite de son compteur, qui devient sa marge d'erreur.
+    Tout élément de fréquence réelle supérieure à N / capacity est présent.
+    """
+
+    def __init__(self, capacity: int = 100):
+        self.capacity = capacity
+        # élément -> [compteur, erreur]
+        self._counts: Dict[str, List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def add(self, item: str, count: int = 1):
+        entry = self._counts.get(item)
+        if entry is not None:
+            entry[0] += count
+        elif len(self._counts) < self.capacity:
+            self._counts[item] = [count, 0]
+        else:
+            # Capacité faible (quelques dizaines) : recherche linéaire du minimum
+            victim = min(self._counts, key=lambda key: self._counts[key][0])
+            floor = self._counts.pop(victim)[0]
+            self._counts[item] = [floor + count, floor]
+
+    def top(self, limit: int = 10) -> List[Dict[str, Any]]:
+        ranked = sorted(self._counts.items(), key=lambda kv: kv[1][0], reverse=True)[:limit]
+        return [{"item": item, "count": count, "error": error} for item, (count, error) in ranked]
+
+    def items(self) -> List[tuple]:
+        return [(item, count, error) for item, (count, error) in self._counts.items()]
+
+    def load(self, rows: List[tuple]):
+        self._counts = {item: [count, error] for item, count, error in rows[:self.capacity]}
+
+
+class CacheStatsRecorder:
+    """Compteurs du cache en O(1), écrits périodiquement dans SQLite"""
+
+    def __init__(self, top_k: int = 100, recent: int = 10):
+        self.recent_limit = recent
+        self._lock = threading.Lock()
+        self._totals: Dict[str, int] = dict.fromkeys(COUNTERS, 0)
+        self._deltas: Dict[str, int] = dict.fromkeys(COUNTERS, 0)
+        self.hot_queries = SpaceSaving(top_k)
+        # Requêtes distinctes les plus récemment servies -> date d'accès
+        self.recent_queries: "OrderedDict[str, str]" = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    def incr(self, name: str, amount: int = 1):
+        """Incrémenter un compteur"""
+        with self._lock:
+            self._bump(name, amount)
+
+    def record_lookup(self, normalized_query: str, tier: Optional[str] = None, size: int = 0):
+        """Recherche dans le cache exact : tier vaut memory, backend ou None (miss)"""
+        with self._lock:
+            self._bump("lookups")
+            if tier is None:
+                self._bump("misses")
+                return
+            self._bump("hits")
+            self._bump(f"{tier}_hits")
+            self._bump("bytes_read", size)
+            self.hot_queries.add(normalized_query)
+            self.recent_queries[normalized_query] = datetime.utcnow().isoformat()
+            self.recent_queries.move_to_end(normalized_query)
+            if len(self.recent_queries) > self.recent_limit:
+                self.recent_queries.popitem(last=False)
+
+    def _bump(self, name: str, amount: int = 1):
+        self._totals[name] += amount
+        self._deltas[name] += amount
+
+    def record_write(self, size: int):
+        with self._lock:
+            self._bump("writes")
+            self._bump("bytes_written", size)
+
+    def record_semantic(self, hit: bool):
+        with self._lock:
+            self._bump("semantic_lookups")
+            if hit:
+                self._bump("semantic_hits")
+
+    def record_eviction(self, count: int, freed_bytes: int):
+        with self._lock:
+            self._bump("evictions", count)
+            self._bump("evicted_bytes", freed_bytes)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Compteurs cumulés et ratios (sans accès disque)"""
+        with self._lock:
+            totals = dict(self._totals)
+            top = self.hot_queries.top(10)
+            recent = list(reversed(self.recent_queries.items()))
+
+        lookups = totals["lookups"]
+        served = totals["hits"] + totals["semantic_hits"] + totals["coalesced"]
+        return {
+            "counters": totals,
+            "hit_rate": (totals["hits"] / lookups) * 100 if lookups else 0.0,
+            # Réponses servies sans nouveau calcul (cache exact, sémantique, regroupement)
+            "effective_hit_rate": (min(served, lookups) / lookups) * 100 if lookups else 0.0,
+            "top_queries": [
+                {"normalized_query": entry["item"], "hit_count": entry["count"], "error": entry["error"]}
+                for entry in top
+            ],
+            "recent_queries": [
+                {"normalized_query": query, "last_accessed": accessed_at} for query, accessed_at in recent
+            ]
+        }
+
+    # ------------------------------------------------------------------
+    # Persistance
+    # ------------------------------------------------------------------
+
+    async def load(self):
+        """Reprendre les compteurs et le top-k matérialisés"""
+        rows = await db_manager.fetch_sqlite_query_async("SELECT name, value FROM cache_stats")
+        hot = await db_manager.fetch_sqlite_query_async(
+            "SELECT normalized_query, hits, error FROM cache_hot_queries ORDER BY hits DESC"
+        )
+        with self._lock:
+            for row in rows:
+                if row["name"] in self._totals:
+                    self._totals[row["name"]] = row["value"] + self._deltas[row["name"]]
+            self.hot_queries.load([(row["normalized_query"], row["hits"], row["error"]) for row in hot])
+
+    async def flush(self) -> int:
+        """Écrire les deltas des compteurs et l'état du top-k"""
+        with self._lock:
+            deltas = {name: value for name, value in self._deltas.items() if value}
+            self._deltas = dict.fromkeys(COUNTERS, 0)
+            hot = self.hot_queries.items()
+
+        if not deltas:
+            return 0
+
+        updated_at = datetime.utcnow().isoformat()
+
+        def _write(conn):
+            conn.executemany(
+                """INSERT INTO cache_stats (name, value, updated_at) VALUES (?, ?, ?)
+                   ON CONFLICT(name) DO UPDATE SET value = value + excluded.value,
+                                                   updated_at = excluded.updated_at""",
+                [(name, value, updated_at) for name, value in deltas.items()]
+            )
+            conn.execute("DELETE FROM cache_hot_queries")
+            conn.executemany(
+                "INSERT INTO cache_hot_queries (normalized_query, hits, error) VALUES (?, ?, ?)",
+                hot
+            )
+
+        try:
+            await db_manager.run_sqlite_transaction(_write)
+        except Exception as e:
+            logger.error(f"Erreur lors de l'écriture des statistiques du cache: {e}")
+            with self._lock:
+                for name, value in deltas.items():
+                    self._deltas[name] += value
+            return 0
+        return len(deltas)
+
+    async def _run(self, interval: float):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            if self._stopping:
+                break
+            await self.flush()
+
+    async def start(self):
+        """Charger les compteurs puis lancer l'écriture périodique"""
+        await self.load()
+        if self._task is None:
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run(settings.cache_stats_flush_interval))
+
+    async def stop(self):
+        """Arrêter l'écriture périodique et écrire les derniers deltas"""
+        task, self._task = self._task, None
+        if task is not None:
+            # Arrêt coopératif : une écriture en cours n'est pas interrompue
+            self._stopping = True
+            self._wakeup.set()
+            await task
+        await self.flush()
+
+
+# Instance globale
+cache_stats = CacheStatsRecorder(top_k=settings.cache_stats_top_k)
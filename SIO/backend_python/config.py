@@ -18,9 +18,94 @@ class Settings(BaseSettings):
     # Base de données
     mongodb_uri: str = "mongodb://localhost:27017/auditdb"
     mongodb_db_name: str = "auditdb"
+    mongodb_ensure_indexes: bool = True
+    # À activer une fois event_date rempli (python audit_migrations.py backfill-dates) ;
+    # l'ingestion doit alors écrire event_date, ou la migration tourner avec --follow
+    audit_use_native_dates: bool = False
+    # "standard" ou "timeseries" (python audit_migrations.py to-timeseries)
+    audit_storage_mode: str = "standard"
+    audit_timeseries_collection: str = "actions_audit_ts"
+    # Délai entre deux lectures du filigrane (horodatage maximal) des données d'audit
+    audit_watermark_refresh_interval: float = 5.0
+    # Avance tolérée d'une fenêtre glissante (dernières N heures) avant de recalculer
+    # la réponse en cache, en fraction de la longueur de la fenêtre
+    audit_sliding_window_drift: float = 0.01
     sqlite_db_path: str = "./cache/chatbot_cache.db"
+    sqlite_reader_pool_size: int = 4
+    sqlite_busy_timeout: float = 5.0
+    # Budget disque des résultats en cache (0 : illimité) et politique d'éviction (lru, lfu, hybrid)
+    query_cache_max_bytes: int = 256 * 1024 * 1024
+    query_cache_eviction_policy: str = "lru"
+    # Purge par lots des entrées expirées (intervalle en secondes, 0 : désactivée)
+    cache_max_age_days: int = 30
+    cache_purge_interval: float = 6 * 3600
+    cache_purge_batch_size: int = 500
+    cache_purge_pause: float = 0.05
+    cache_purge_vacuum_pages: int = 256
+    # Rétention des agrégats de la télémétrie des actions (les partitions
+    # journalières brutes suivent cache_max_age_days)
+    action_rollup_minute_retention_hours: int = 48
+    action_rollup_hour_retention_days: int = 90
+    # Formulations conservées par question dans question_variations (les moins vues sont remplacées)
+    question_variations_max: int = 50
+    # Classement en mémoire des questions fréquentes (taille, resynchronisation en secondes, 0 : désactivée)
+    frequent_questions_capacity: int = 200
+    frequent_questions_refresh_interval: float = 300.0
+    # Autocomplétion : complétions gardées par nœud du trie, questions indexées
+    autocomplete_top_n: int = 10
+    autocomplete_max_questions: int = 5000
+    # Index de similarité des questions : fichier, réajustement périodique (secondes) ou
+    # anticipé quand la part de questions ajoutées depuis l'ajustement dépasse le ratio
+    similarity_index_path: str = "./cache/similarity_index.npz"
+    similarity_refit_interval: float = 3600.0
+    similarity_refit_ratio: float = 0.2
+    similarity_index_max_questions: int = 200000
+    # Analyse par lot (/api/audit/analyze/batch) : questions acceptées par requête
+    analysis_batch_max_size: int = 5000
+    # Cache des analyses de questions (partie indépendante de l'heure), borné en entrées et en octets
+    analysis_cache_max_entries: int = 2000
+    analysis_cache_max_bytes: int = 4 * 1024 * 1024
+    # Classifieur d'intentions entraîné (python intent_classifier.py train) : fichier du modèle et
+    # probabilité minimale retenue, en deçà les règles de NLPService décident
+    intent_model_path: str = "./cache/intent_model.npz"
+    intent_model_min_confidence: float = 0.5
+    # Pool d'exécution des traitements NLP hors de la boucle d'événements ("thread" ou "process"),
+    # délai par tâche (secondes) et nombre maximal de tâches en cours ou en attente
+    nlp_executor_mode: str = "thread"
+    nlp_executor_workers: int = 2
+    nlp_executor_timeout: float = 5.0
+    nlp_executor_batch_timeout: float = 120.0
+    nlp_executor_max_pending: int = 64
+    # Statistiques du cache : écriture périodique des compteurs, taille du top-k
+    cache_stats_flush_interval: float = 30.0
+    cache_stats_top_k: int = 100
+    # Encodage des résultats en cache : json, zlib ou msgpack-zstd (paquets msgpack et zstandard)
+    query_cache_codec: str = "zlib"
+    
+    # Niveau mémoire du cache des requêtes
+    query_cache_memory_max_entries: int = 1000
+    query_cache_memory_max_bytes: int = 32 * 1024 * 1024
+    query_cache_memory_ttl: float = 3600.0
+    
+    # Cache sémantique des réponses (questions reformulées)
+    semantic_cache_enabled: bool = True
+    semantic_cache_threshold: float = 0.5
+    semantic_cache_max_entries: int = 5000
+    semantic_cache_ttl: float = 3600.0
+    
+    # Délai maximal d'une réponse partagée entre questions identiques simultanées
+    chat_single_flight_timeout: float = 60.0
+    
+    # Écritures différées du cache
+    write_behind_flush_interval: float = 1.0
+    write_behind_max_pending: int = 500
     redis_url: str = "redis://localhost:6379"
     
+    # Cache des requêtes : "sqlite" (local) ou "redis" (partagé entre instances)
+    cache_backend: str = "sqlite"
+    cache_ttl_seconds: int = 30 * 24 * 3600
+    redis_key_prefix: str = "sio:cache:"
+    
     # API Keys
     openai_api_key: str
     
@@ -46,6 +131,31 @@ class Settings(BaseSettings):
             return [origin.strip() for origin in v.split(',')]
         return v
     
+    @validator('query_cache_eviction_policy')
+    def check_eviction_policy(cls, v):
+        if v not in ("lru", "lfu", "hybrid"):
+            raise ValueError("query_cache_eviction_policy doit valoir lru, lfu ou hybrid")
+        return v
+    
+    @validator('query_cache_codec')
+    def check_cache_codec(cls, v):
+        if v not in ("json", "zlib", "msgpack-zstd"):
+            raise ValueError("query_cache_codec doit valoir json, zlib ou msgpack-zstd")
+        return v
+    
+    @validator('nlp_executor_mode')
+    def check_nlp_executor_mode(cls, v):
+        if v not in ("thread", "process"):
+            raise ValueError("nlp_executor_mode doit valoir thread ou process")
+        return v
+    
+    @validator('cache_backend')
+    def check_cache_backend(cls, v):
+        v = v.lower()
+        if v not in ("sqlite", "redis"):
+            raise ValueError("cache_backend doit valoir sqlite ou redis")
+        return v
+    
     class Config:
         env_file = ".env"
         case_sensitive = False
@@ -1,11 +1,97 @@
 """Gestion des connexions aux bases de données"""
+import os
+import queue
 import sqlite3
 import asyncio
-from typing import Optional
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Callable, TypeVar, List, Any
 from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo.errors import ConnectionFailure
 from loguru import logger
 from config import settings
+from action_telemetry import migrate_legacy_table, LEGACY_ARCHIVE
+from question_store import migrate_json_variations, migrate_normalized_questions
+from text_normalizer import NORMALIZER_VERSION, normalize_question
+
+
+T = TypeVar("T")
+
+
+class SQLitePool:
+    """Pool de connexions SQLite exécutées dans des threads dédiés
+
+    Les lectures sont réparties sur un nombre borné de connexions lectrices
+    (le mode WAL autorise les lectures concurrentes), les écritures passent
+    toutes par une connexion écrivaine unique, sérialisée sur son propre thread.
+    """
+    
+    def __init__(self, db_path: str, writer_conn: sqlite3.Connection, writer_lock: threading.Lock,
+                 reader_count: int = 4):
+        self.db_path = db_path
+        self.reader_count = max(1, reader_count)
+        self._writer_conn = writer_conn
+        self._writer_lock = writer_lock
+        self._readers: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        self._reader_conns: List[sqlite3.Connection] = []
+        self._reader_executor = ThreadPoolExecutor(
+            max_workers=self.reader_count, thread_name_prefix="sqlite-reader"
+        )
+        self._writer_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-writer")
+        
+        for _ in range(self.reader_count):
+            conn = open_sqlite_connection(db_path)
+            conn.execute('PRAGMA query_only = ON')
+            self._reader_conns.append(conn)
+            self._readers.put(conn)
+    
+    def _read(self, func: Callable[[sqlite3.Connection], T]) -> T:
+        conn = self._readers.get()
+        try:
+            return func(conn)
+        finally:
+            self._readers.put(conn)
+    
+    def _write(self, func: Callable[[sqlite3.Connection], T]) -> T:
+        with self._writer_lock:
+            try:
+                result = func(self._writer_conn)
+                self._writer_conn.commit()
+                return result
+            except Exception:
+                self._writer_conn.rollback()
+                raise
+    
+    async def read(self, func: Callable[[sqlite3.Connection], T]) -> T:
+        """Exécuter une fonction de lecture sur une connexion lectrice"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._reader_executor, self._read, func)
+    
+    async def write(self, func: Callable[[sqlite3.Connection], T]) -> T:
+        """Exécuter une fonction d'écriture dans une transaction sur la connexion écrivaine"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._writer_executor, self._write, func)
+    
+    def close(self):
+        """Arrêter les threads et fermer les connexions lectrices"""
+        self._reader_executor.shutdown(wait=True)
+        self._writer_executor.shutdown(wait=True)
+        for conn in self._reader_conns:
+            conn.close()
+        self._reader_conns.clear()
+
+
+def open_sqlite_connection(db_path: str) -> sqlite3.Connection:
+    """Ouvrir une connexion SQLite configurée pour l'application"""
+    conn = sqlite3.connect(
+        db_path,
+        check_same_thread=False,
+        timeout=settings.sqlite_busy_timeout
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA foreign_keys = ON')
+    return conn
 
 
 class DatabaseManager:
@@ -15,6 +101,8 @@ class DatabaseManager:
         self.mongodb_client: Optional[AsyncIOMotorClient] = None
         self.mongodb_db = None
         self.sqlite_conn: Optional[sqlite3.Connection] = None
+        self.sqlite_pool: Optional[SQLitePool] = None
+        self._sqlite_write_lock = threading.Lock()
     
     async def connect_mongodb(self):
         """Connexion à MongoDB"""
@@ -32,21 +120,27 @@ class DatabaseManager:
     def connect_sqlite(self):
         """Connexion à SQLite"""
         try:
-            import os
             os.makedirs(os.path.dirname(settings.sqlite_db_path), exist_ok=True)
             
-            self.sqlite_conn = sqlite3.connect(
-                settings.sqlite_db_path, 
-                check_same_thread=False
-            )
-            self.sqlite_conn.row_factory = sqlite3.Row
+            # Connexion écrivaine (clés étrangères activées à l'ouverture)
+            self.sqlite_conn = open_sqlite_connection(settings.sqlite_db_path)
             
-            # Activation des clés étrangères et mode WAL
-            self.sqlite_conn.execute('PRAGMA foreign_keys = ON')
+            # Espace libéré récupérable par tranches (sans effet sur une base déjà créée)
+            self.sqlite_conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            
+            # Mode WAL : lectures concurrentes pendant les écritures
             self.sqlite_conn.execute('PRAGMA journal_mode = WAL')
             
             # Création des tables
             self._create_sqlite_tables()
+            
+            # Pool de lecteurs et thread écrivain pour l'accès asynchrone
+            self.sqlite_pool = SQLitePool(
+                settings.sqlite_db_path,
+                self.sqlite_conn,
+                self._sqlite_write_lock,
+                reader_count=settings.sqlite_reader_pool_size
+            )
             logger.info(f"Connecté à SQLite: {settings.sqlite_db_path}")
             return True
         except Exception as e:
@@ -64,55 +158,175 @@ class DatabaseManager:
                 query_hash TEXT UNIQUE NOT NULL,
                 normalized_query TEXT NOT NULL,
                 result TEXT NOT NULL,
+                result_size INTEGER NOT NULL DEFAULT 0,
                 hit_count INTEGER DEFAULT 1,
                 created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
                 last_accessed DATETIME DEFAULT CURRENT_TIMESTAMP
             )
         ''')
         
-        # Table pour le cache des actions
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS action_cache (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                action_type TEXT NOT NULL,
-                user_name TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                metadata TEXT
-            )
-        ''')
+        # Agrégats des actions ; les lignes brutes vont dans les partitions
+        # journalières action_log_AAAAMMJJ, créées à la première écriture
+        for rollup in ("action_rollup_minute", "action_rollup_hour"):
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS {rollup} (
+                    bucket TEXT NOT NULL,
+                    action_type TEXT NOT NULL,
+                    user_name TEXT NOT NULL DEFAULT '',
+                    count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (bucket, action_type, user_name)
+                )
+            ''')
         
         # Table pour les statistiques des questions
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS question_stats (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 normalized_question TEXT UNIQUE NOT NULL,
+                display_question TEXT,
                 count INTEGER DEFAULT 1,
                 last_asked DATETIME DEFAULT CURRENT_TIMESTAMP,
                 variations TEXT
             )
         ''')
         
+        # Formulations rencontrées par question, bornées (voir question_store)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS question_variations (
+                question_id INTEGER NOT NULL REFERENCES question_stats(id) ON DELETE CASCADE,
+                variation TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 1,
+                last_seen DATETIME,
+                PRIMARY KEY (question_id, variation)
+            ) WITHOUT ROWID
+        ''')
+        
+        # Bases antérieures aux partitions : action_cache reportée dans les agrégats
+        if migrate_legacy_table(
+            self.sqlite_conn,
+            datetime.utcnow() - timedelta(hours=settings.action_rollup_minute_retention_hours)
+        ):
+            logger.info(f"Table action_cache reportée dans les agrégats et archivée ({LEGACY_ARCHIVE})")
+        
+        # Bases créées avant le suivi de la taille des résultats
+        if self._add_missing_column(cursor, "query_cache", "result_size", "INTEGER NOT NULL DEFAULT 0"):
+            cursor.execute("UPDATE query_cache SET result_size = length(CAST(result AS BLOB))")
+        
+        # Bases créées avant la normalisation canonique des questions
+        self._add_missing_column(cursor, "question_stats", "display_question", "TEXT")
+        
+        # Variations historiques stockées en tableau JSON dans question_stats
+        migrated = migrate_json_variations(self.sqlite_conn, settings.question_variations_max)
+        if migrated:
+            logger.info(f"Variations de {migrated} questions reportées dans question_variations")
+        
+        # Formes canoniques calculées par une version antérieure de la normalisation
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS cache_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+        ''')
+        renormalized = migrate_normalized_questions(
+            self.sqlite_conn, NORMALIZER_VERSION, normalize_question, settings.question_variations_max
+        )
+        if renormalized:
+            logger.info(f"{renormalized} questions renormalisées (version {NORMALIZER_VERSION}), "
+                        "cache des requêtes vidé")
+        
+        # Taille totale du cache des requêtes, tenue à jour par triggers
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS query_cache_usage (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                total_bytes INTEGER NOT NULL DEFAULT 0,
+                entries INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        cursor.execute('''
+            INSERT OR IGNORE INTO query_cache_usage (id, total_bytes, entries)
+            SELECT 1, COALESCE(SUM(result_size), 0), COUNT(*) FROM query_cache
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_query_cache_insert AFTER INSERT ON query_cache
+            BEGIN
+                UPDATE query_cache_usage
+                SET total_bytes = total_bytes + NEW.result_size, entries = entries + 1
+                WHERE id = 1;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_query_cache_delete AFTER DELETE ON query_cache
+            BEGIN
+                UPDATE query_cache_usage
+                SET total_bytes = total_bytes - OLD.result_size, entries = entries - 1
+                WHERE id = 1;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_query_cache_resize AFTER UPDATE OF result_size ON query_cache
+            BEGIN
+                UPDATE query_cache_usage
+                SET total_bytes = total_bytes + NEW.result_size - OLD.result_size
+                WHERE id = 1;
+            END
+        ''')
+        
+        # Compteurs cumulés du cache et requêtes les plus servies (top-k)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS cache_stats (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL DEFAULT 0,
+                updated_at DATETIME
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS cache_hot_queries (
+                normalized_query TEXT PRIMARY KEY,
+                hits INTEGER NOT NULL,
+                error INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        
         # Index pour améliorer les performances
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_query_hash ON query_cache(query_hash)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_action_timestamp ON action_cache(timestamp)')
+        # Candidats à l'éviction (LRU, LFU)
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_query_last_accessed ON query_cache(last_accessed)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_query_hit_count ON query_cache(hit_count, last_accessed)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_question_normalized ON question_stats(normalized_question)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_question_count ON question_stats(count)')
+        # Formulation la moins vue d'une question (remplacement Space-Saving)
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_variation_count ON question_variations(question_id, count, last_seen)')
         
         self.sqlite_conn.commit()
         logger.info("Tables SQLite créées avec succès")
     
+    @staticmethod
+    def _add_missing_column(cursor: sqlite3.Cursor, table: str, column: str, definition: str) -> bool:
+        """Ajouter une colonne absente d'une table existante"""
+        columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+        if column in columns:
+            return False
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        logger.info(f"Colonne {table}.{column} ajoutée")
+        return True
+    
     async def close_connections(self):
         """Fermeture des connexions"""
         if self.mongodb_client:
             self.mongodb_client.close()
             logger.info("Connexion MongoDB fermée")
         
+        if self.sqlite_pool:
+            self.sqlite_pool.close()
+            self.sqlite_pool = None
+        
         if self.sqlite_conn:
             self.sqlite_conn.close()
             logger.info("Connexion SQLite fermée")
     
     def get_mongodb_collection(self, collection_name: str):
         """Récupérer une collection MongoDB"""
-        if not self.mongodb_db:
+        if self.mongodb_db is None:
             raise Exception("MongoDB non connecté")
         return self.mongodb_db[collection_name]
     
@@ -121,9 +335,10 @@ class DatabaseManager:
         if not self.sqlite_conn:
             raise Exception("SQLite non connecté")
         
-        cursor = self.sqlite_conn.cursor()
-        cursor.execute(query, params)
-        self.sqlite_conn.commit()
+        with self._sqlite_write_lock:
+            cursor = self.sqlite_conn.cursor()
+            cursor.execute(query, params)
+            self.sqlite_conn.commit()
         return cursor
     
     def fetch_sqlite_query(self, query: str, params: tuple = ()):
@@ -131,9 +346,44 @@ class DatabaseManager:
         if not self.sqlite_conn:
             raise Exception("SQLite non connecté")
         
-        cursor = self.sqlite_conn.cursor()
-        cursor.execute(query, params)
-        return cursor.fetchall()
+        with self._sqlite_write_lock:
+            cursor = self.sqlite_conn.cursor()
+            cursor.execute(query, params)
+            return cursor.fetchall()
+    
+    def _get_sqlite_pool(self) -> SQLitePool:
+        if not self.sqlite_pool:
+            raise Exception("SQLite non connecté")
+        return self.sqlite_pool
+    
+    async def execute_sqlite_query_async(self, query: str, params: tuple = ()) -> int:
+        """Exécuter une requête SQLite sans bloquer la boucle d'événements"""
+        def _execute(conn: sqlite3.Connection) -> int:
+            return conn.execute(query, params).rowcount
+        
+        return await self._get_sqlite_pool().write(_execute)
+    
+    async def executemany_sqlite_query_async(self, query: str, params_seq: List[tuple]) -> int:
+        """Exécuter une requête SQLite pour plusieurs jeux de paramètres en une transaction"""
+        def _executemany(conn: sqlite3.Connection) -> int:
+            return conn.executemany(query, params_seq).rowcount
+        
+        return await self._get_sqlite_pool().write(_executemany)
+    
+    async def fetch_sqlite_query_async(self, query: str, params: tuple = ()) -> List[sqlite3.Row]:
+        """Récupérer des données SQLite sans bloquer la boucle d'événements"""
+        def _fetch(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+            return conn.execute(query, params).fetchall()
+        
+        return await self._get_sqlite_pool().read(_fetch)
+    
+    async def run_sqlite_transaction(self, func: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Exécuter une fonction dans une transaction sur la connexion écrivaine"""
+        return await self._get_sqlite_pool().write(func)
+    
+    async def run_sqlite_read(self, func: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Exécuter une fonction de lecture sur une connexion du pool"""
+        return await self._get_sqlite_pool().read(func)
 
 
 # Instance globale du gestionnaire de base de données
@@ -0,0 +1,396 @@
+"""Classifieur d'intentions linéaire sur n-grammes de caractères hachés
+
+Les questions sont repliées (minuscules, accents retirés, ponctuation
+réduite à des espaces) puis découpées en n-grammes de caractères (2 à 4 par
+défaut), hachés dans un espace de taille fixe (text_features) : ni
+vocabulaire à conserver, ni mot inconnu, et les variantes proches
+(« connexion » / « connexions », fautes de frappe) partagent l'essentiel de
+leurs traits. Les comptes sont amortis (log1p) et normalisés L2.
+
+Le modèle (régression logistique multinomiale) est entraîné hors ligne par
+la commande « train », sur des exemples annotés (SEED_EXAMPLES) et sur les
+formulations enregistrées dans question_stats / question_variations,
+étiquetées par les règles de NLPService quand une règle reconnaît la
+question. Seuls les poids (traits x intentions) et les biais sont
+sauvegardés (.npz) ; la prédiction d'un lot somme, par texte et par
+intention, les poids des traits présents (np.bincount) puis applique un
+softmax, sans scikit-learn ni construction de matrice creuse.
+
+Usage :
+    python intent_classifier.py train [--db ./cache/chatbot_cache.db] [--output ./cache/intent_model.npz]
+    python intent_classifier.py bench [--db ./cache/chatbot_cache.db] [--folds 5]
+"""
+import os
+import re
+import time
+import random
+import sqlite3
+import argparse
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from loguru import logger
+from config import settings
+from text_normalizer import fold
+from text_features import char_ngrams
+from services import get_nlp_service
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+# Exemples annotés : vérité de référence de l'entraînement et du banc d'essai
+SEED_EXAMPLES: Dict[str, List[str]] = {
+    "USER_ACTIVITY": [
+        "Qui a fait un DROP sur la table CLIENTS ?",
+        "Qu'a fait l'utilisateur ADMIN ?",
+        "Activité de l'utilisateur SCOTT",
+        "Actions de user bob",
+        "Quelles actions a réalisé JDOE ?",
+        "Que fait l'utilisateur HR ces temps-ci ?",
+        "Qui a exécuté des requêtes sur le schéma SALES ?",
+        "Liste des opérations effectuées par SYSTEM",
+        "Historique des actions de l'utilisateur APP_USER",
+        "Quels utilisateurs ont exécuté des commandes ?",
+        "Qui se connecte le plus souvent ?",
+        "Quels sont les utilisateurs les plus actifs ?",
+        "Montre-moi ce qu'a fait le compte BATCH",
+        "Qui a réalisé des opérations sur la base ?",
+        "Activité des comptes applicatifs",
+        "Top des utilisateurs par nombre d'actions",
+    ],
+    "OBJECT_MODIFICATIONS": [
+        "Quelles modifications sur la table COMMANDES ?",
+        "Changements de structure de la base",
+        "Tables créées récemment",
+        "Quels objets ont été supprimés ?",
+        "ALTER TABLE sur FACTURES",
+        "Liste des CREATE exécutés",
+        "Qui a modifié la table EMPLOYES ?",
+        "Objets modifiés dans le schéma HR",
+        "Index supprimés sur la table PRODUITS",
+        "Les colonnes de la table CLIENTS ont-elles changé ?",
+        "Historique des DDL sur le schéma FINANCE",
+        "Quelles tables ont été altérées ?",
+        "Insertions et suppressions dans la table STOCK",
+        "Nombre d'UPDATE sur la table PAIEMENTS",
+        "Vues recréées dans la base",
+        "Modification de la structure des tables",
+    ],
+    "TIME_ANALYSIS": [
+        "Que s'est-il passé hier ?",
+        "Activité d'aujourd'hui",
+        "Événements de cette semaine",
+        "Répartition des actions par heure",
+        "À quel moment l'activité est-elle maximale ?",
+        "Quand la base a-t-elle été le plus sollicitée ?",
+        "Évolution de l'activité ce mois",
+        "Pics d'activité au cours de la nuit",
+        "Actions réalisées pendant le week-end",
+        "Chronologie des événements de la journée",
+        "Activité durant les 3 derniers jours",
+        "Quelles sont les heures de pointe ?",
+        "Tendance jour par jour",
+        "Ce qui s'est passé entre 8h et 10h",
+        "Activité mensuelle",
+        "Historique sur les dernières 24 heures",
+    ],
+    "SECURITY_ANALYSIS": [
+        "Tentatives de connexion échouées",
+        "Y a-t-il des accès suspects ?",
+        "Violations de sécurité détectées",
+        "Permissions accordées à SCOTT",
+        "Échecs d'authentification",
+        "Qui a obtenu des privilèges DBA ?",
+        "Connexions depuis des postes inconnus",
+        "Comptes verrouillés récemment",
+        "Attaques par force brute",
+        "Activité suspecte hors des heures ouvrées",
+        "GRANT et REVOKE exécutés",
+        "Mots de passe modifiés",
+        "Connexions refusées",
+        "Intrusions potentielles",
+        "Utilisateurs suspects",
+        "Audit des droits d'accès",
+    ],
+    "PERFORMANCE_ANALYSIS": [
+        "Requêtes lentes",
+        "Problèmes de performance",
+        "Temps de réponse de la base",
+        "Pourquoi la base est-elle lente ?",
+        "Charge du serveur",
+        "Utilisation du CPU",
+        "Requêtes les plus coûteuses",
+        "Optimisation des requêtes",
+        "Goulots d'étranglement",
+        "Lenteur de l'application",
+        "Sessions qui consomment le plus de ressources",
+        "Amélioration des temps d'exécution",
+        "Durée moyenne des requêtes",
+        "Attentes et verrous bloquants",
+        "Rapidité des traitements batch",
+        "Consommation mémoire de la base",
+    ],
+    "GENERAL": [
+        "Bonjour",
+        "Merci",
+        "Que peux-tu faire ?",
+        "Aide",
+        "Comment ça marche ?",
+        "Salut, ça va ?",
+        "Qui es-tu ?",
+        "Explique-moi ce chatbot",
+        "Au revoir",
+        "Quelles questions puis-je poser ?",
+        "C'est quoi l'audit Oracle ?",
+        "Bonne journée",
+        "Tu peux m'aider ?",
+        "Présente-toi",
+        "D'accord",
+        "Que signifie AUD$ ?",
+    ],
+}
+
+
+def prepare(text: str) -> str:
+    """Texte replié et encadré d'espaces : les n-grammes marquent les débuts et fins de mots"""
+    return f" {_NON_WORD.sub(' ', fold(text)).strip()} "
+
+
+def hashed_features(texts: Sequence[str], n_features: int,
+                    ngram_range: Tuple[int, int] = (2, 4)) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(lignes, colonnes, valeurs) des n-grammes hachés des questions préparées"""
+    return char_ngrams([prepare(text) for text in texts], n_features, ngram_range)
+
+
+def hashed_ngrams(texts: Sequence[str], n_features: int,
+                  ngram_range: Tuple[int, int] = (2, 4)) -> "sparse.csr_matrix":
+    """Matrice creuse (textes x traits) des n-grammes hachés (entraînement)"""
+    from scipy import sparse
+
+    rows, columns, values = hashed_features(texts, n_features, ngram_range)
+    return sparse.csr_matrix((values, (rows, columns)), shape=(len(texts), n_features))
+
+
+class IntentClassifier:
+    """Prédiction des intentions par lot à partir d'un modèle sauvegardé"""
+
+    def __init__(self, path: Optional[str] = None, n_features: int = 2 ** 16,
+                 ngram_range: Tuple[int, int] = (2, 4)):
+        self.path = path
+        self.n_features = n_features
+        self.ngram_range = ngram_range
+        self.classes: List[str] = []
+        self.weights: Optional[np.ndarray] = None
+        self.bias: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    @property
+    def ready(self) -> bool:
+        """Modèle disponible (chargé depuis le disque au premier appel)"""
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self.load()
+                    self._loaded = True
+        return self.weights is not None
+
+    def fit(self, texts: Sequence[str], labels: Sequence[str], c: float = 10.0):
+        """Entraîner le modèle (scikit-learn n'est requis qu'ici)"""
+        from sklearn.linear_model import LogisticRegression
+
+        model = LogisticRegression(C=c, class_weight="balanced", max_iter=2000)
+        model.fit(hashed_ngrams(texts, self.n_features, self.ngram_range), list(labels))
+        coefficients, intercepts = model.coef_, model.intercept_
+        if len(model.classes_) == 2:
+            # Cas binaire : une seule fonction de décision, équivalente au softmax de [0, z]
+            coefficients = np.vstack([np.zeros_like(coefficients), coefficients])
+            intercepts = np.concatenate([[0.0], intercepts])
+        self.classes = [str(label) for label in model.classes_]
+        self.weights = np.ascontiguousarray(coefficients.T, dtype=np.float32)
+        self.bias = intercepts.astype(np.float32)
+        self._loaded = True
+
+    def predict_proba(self, texts: Sequence[str]) -> np.ndarray:
+        """Probabilités (textes x classes) du lot"""
+        rows, columns, values = hashed_features(texts, self.n_features, self.ngram_range)
+        # Scores = X @ poids : contributions des traits présents, sommées par (texte, intention)
+        n_classes = len(self.classes)
+        contributions = self.weights[columns] * values[:, None]
+        cells = rows[:, None] * n_classes + np.arange(n_classes)
+        scores = np.bincount(cells.ravel(), weights=contributions.ravel(), minlength=len(texts) * n_classes)
+        scores = scores.reshape(len(texts), n_classes) + self.bias
+        scores -= scores.max(axis=1, keepdims=True)
+        np.exp(scores, out=scores)
+        scores /= scores.sum(axis=1, keepdims=True)
+        return scores
+
+    def predict(self, texts: Sequence[str]) -> List[Tuple[str, float]]:
+        """(intention, probabilité) de chaque texte du lot"""
+        if not texts:
+            return []
+        probabilities = self.predict_proba(texts)
+        best = probabilities.argmax(axis=1)
+        return [
+            (self.classes[column], float(probability))
+            for column, probability in zip(best, probabilities[np.arange(len(best)), best])
+        ]
+
+    def save(self, path: Optional[str] = None) -> bool:
+        """Écrire le modèle sur disque (écriture atomique)"""
+        path = path or self.path
+        if not path or self.weights is None:
+            return False
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f"{path}.tmp.npz"
+        np.savez(
+            temporary, weights=self.weights, bias=self.bias, classes=np.array(self.classes, dtype=str),
+            n_features=np.array(self.n_features), ngram_range=np.array(self.ngram_range)
+        )
+        os.replace(temporary, path)
+        return True
+
+    def load(self) -> bool:
+        """Charger le modèle sauvegardé"""
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with np.load(self.path, allow_pickle=False) as saved:
+                weights, bias = saved["weights"], saved["bias"]
+                classes = saved["classes"].tolist()
+                n_features = int(saved["n_features"])
+                ngram_range = tuple(int(n) for n in saved["ngram_range"])
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning(f"Modèle d'intentions illisible, classification par règles: {e}")
+            return False
+        if weights.shape != (n_features, len(classes)):
+            logger.warning(f"Modèle d'intentions incohérent: {weights.shape}")
+            return False
+        self.weights, self.bias, self.classes = weights, bias, classes
+        self.n_features, self.ngram_range = n_features, ngram_range
+        logger.info(f"Modèle d'intentions chargé: {len(classes)} intentions")
+        return True
+
+
+# ----------------------------------------------------------------------
+# Entraînement et banc d'essai (ligne de commande)
+# ----------------------------------------------------------------------
+
+def seed_examples() -> List[Tuple[str, str]]:
+    return [(text, intent) for intent, texts in SEED_EXAMPLES.items() for text in texts]
+
+
+def recorded_examples(db_path: str) -> List[Tuple[str, str]]:
+    """Formulations enregistrées, étiquetées par les règles quand une règle les reconnaît"""
+    from question_store import all_variations
+
+    if not os.path.exists(db_path):
+        return []
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        rows = all_variations(conn)
+    except sqlite3.OperationalError:
+        return []
+    finally:
+        conn.close()
+
+    rules = get_nlp_service()
+    examples = []
+    for _, variations, _ in rows:
+        for question in variations:
+            intent, confidence = rules.classify_intent_rules(question)
+            if confidence > 0:
+                examples.append((question, intent))
+    return examples
+
+
+def train(db_path: str, output: str) -> IntentClassifier:
+    examples = seed_examples() + recorded_examples(db_path)
+    classifier = IntentClassifier(path=output)
+    classifier.fit([text for text, _ in examples], [intent for _, intent in examples])
+    classifier.save()
+    counts = Counter(intent for _, intent in examples)
+    print(f"{len(examples)} exemples ({len(examples) - len(seed_examples())} enregistrés) -> {output}")
+    for intent, count in sorted(counts.items()):
+        print(f"  {intent:<22}{count:>6}")
+    return classifier
+
+
+def benchmark(db_path: str, folds: int = 5, repeat: int = 200) -> Dict[str, float]:
+    """Exactitude (validation croisée sur les exemples annotés) et latence, modèle contre règles"""
+    rules = get_nlp_service()
+    examples = seed_examples()
+    random.Random(0).shuffle(examples)
+    recorded = recorded_examples(db_path)
+
+    model_correct = rules_correct = model_general = rules_general = 0
+    for fold_index in range(folds):
+        test = examples[fold_index::folds]
+        training = [example for i, example in enumerate(examples) if i % folds != fold_index] + recorded
+        classifier = IntentClassifier()
+        classifier.fit([text for text, _ in training], [intent for _, intent in training])
+        predictions = classifier.predict([text for text, _ in test])
+        for (text, expected), (predicted, _) in zip(test, predictions):
+            rule_intent, _ = rules.classify_intent_rules(text)
+            model_correct += predicted == expected
+            rules_correct += rule_intent == expected
+            model_general += predicted == "GENERAL"
+            rules_general += rule_intent == "GENERAL"
+
+    texts = [text for text, _ in examples]
+    classifier = IntentClassifier()
+    classifier.fit(texts, [intent for _, intent in examples])
+
+    def _per_question(run, count: int) -> float:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            run()
+        return (time.perf_counter() - start) / (repeat * count) * 1e6
+
+    batch = texts * 10
+    return {
+        "examples": len(examples),
+        "recorded": len(recorded),
+        "model_accuracy": model_correct / len(examples) * 100,
+        "rules_accuracy": rules_correct / len(examples) * 100,
+        "model_general": model_general / len(examples) * 100,
+        "rules_general": rules_general / len(examples) * 100,
+        "rules_us": _per_question(lambda: [rules.classify_intent_rules(t) for t in texts], len(texts)),
+        "model_single_us": _per_question(lambda: [classifier.predict([t]) for t in texts], len(texts)),
+        "model_batch_us": _per_question(lambda: classifier.predict(batch), len(batch)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Classifieur d'intentions : entraînement et banc d'essai")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    train_parser = subparsers.add_parser("train", help="Entraîner et sauvegarder le modèle")
+    train_parser.add_argument("--db", default=settings.sqlite_db_path)
+    train_parser.add_argument("--output", default=settings.intent_model_path)
+    bench_parser = subparsers.add_parser("bench", help="Comparer le modèle aux règles")
+    bench_parser.add_argument("--db", default=settings.sqlite_db_path)
+    bench_parser.add_argument("--folds", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == "train":
+        train(args.db, args.output)
+        return
+
+    report = benchmark(args.db, args.folds)
+    print(f"{report['examples']} exemples annotés ({args.folds} plis), {report['recorded']} formulations enregistrées")
+    print(f"{'':<12}{'exactitude':>12}{'GENERAL':>10}{'latence/question':>20}")
+    print(f"{'règles':<12}{report['rules_accuracy']:>11.1f}%{report['rules_general']:>9.1f}%"
+          f"{report['rules_us']:>17.1f} µs")
+    print(f"{'modèle':<12}{report['model_accuracy']:>11.1f}%{report['model_general']:>9.1f}%"
+          f"{report['model_single_us']:>17.1f} µs (unitaire)")
+    print(f"{'':<34}{report['model_batch_us']:>17.1f} µs (par lot)")
+
+
+# Instance globale
+intent_classifier = IntentClassifier(path=settings.intent_model_path)
+
+
+if __name__ == "__main__":
+    main()
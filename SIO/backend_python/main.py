@@ -1,5 +1,6 @@
 """Application FastAPI principale"""
 import os
+import asyncio
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 from fastapi import FastAPI, HTTPException, BackgroundTasks
@@ -12,12 +13,19 @@ from config import settings
 from database import db_manager
 from models import (
     ChatMessage, ChatResponse,
-    AuditQuery, AuditAction, QueryAnalysis, TrendAnalysis, AnomalyDetection, QuestionStats
+    AuditQuery, AuditAction, QueryAnalysis, BatchAnalysisRequest, TrendAnalysis, AnomalyDetection, QuestionStats
 )
 ## Suppression des imports liés à l'authentification
-from openai_service import OpenAIService
-from nlp_service import NLPService, AuditAnalysisService
+from services import get_openai_service
+from nlp_service import AuditAnalysisService
+from nlp_executor import nlp_executor, NLPExecutorBusy
 from cache_service import CacheService, QuestionStatsService
+from write_behind import write_queue
+from single_flight import chat_flight
+from cache_purge import cache_purger
+from cache_stats import cache_stats
+from mongo_indexes import audit_index_manager
+from audit_store import audit_collection_name, translate_filter, normalize_document, time_range_filter
 
 
 # Configuration des logs
@@ -42,16 +50,40 @@ async def lifespan(app: FastAPI):
     
     if not mongodb_connected:
         logger.error("Impossible de se connecter à MongoDB")
+    elif settings.mongodb_ensure_indexes:
+        # Index de la collection d'audit et vérification des plans de requêtes
+        await audit_index_manager.bootstrap()
     if not sqlite_connected:
         logger.error("Impossible de se connecter à SQLite")
+    else:
+        # Écritures du cache regroupées en transactions périodiques
+        await write_queue.start()
+        # Compteurs du cache matérialisés périodiquement
+        await cache_stats.start()
     
-    # Nettoyage périodique du cache
-    await CacheService.cleanup_old_cache()
+    # Backend du cache des requêtes (SQLite ou Redis)
+    await CacheService.start_backend()
+    # Questions fréquentes et autocomplétion servies depuis la mémoire
+    await QuestionStatsService.start_question_indexes()
+    
+    # Nettoyage périodique du cache, par lots et en arrière-plan
+    if sqlite_connected:
+        CacheService.start_cleanup_task()
+    
+    # Pool des traitements NLP (workers démarrés avant la première question)
+    nlp_executor.start()
     
     yield
     
     # Arrêt
     logger.info("Arrêt de l'application")
+    await CacheService.stop_cleanup_task()
+    await asyncio.to_thread(nlp_executor.shutdown)
+    await QuestionStatsService.stop_question_indexes()
+    await cache_stats.stop()
+    # Vider la file d'écriture avant de fermer la connexion SQLite
+    await write_queue.stop()
+    await CacheService.stop_backend()
     await db_manager.close_connections()
 
 
@@ -72,8 +104,7 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-openai_service = OpenAIService()
-nlp_service = NLPService()
+openai_service = get_openai_service()
 
 
 
@@ -155,13 +186,40 @@ async def get_frequent_questions(limit: int = 10):
 async def analyze_audit_query(query: str):
     """Analyser une requête d'audit avec NLP"""
     try:
-        analysis = nlp_service.analyze_question(query)
+        analysis = await nlp_executor.analyze_question(query)
         return analysis.dict()
+    except NLPExecutorBusy:
+        raise HTTPException(status_code=503, detail="Analyse NLP saturée, réessayez plus tard")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Délai d'analyse dépassé")
     except Exception as e:
         logger.error(f"Erreur lors de l'analyse de la requête: {e}")
         raise HTTPException(status_code=500, detail="Erreur lors de l'analyse")
 
 
+@app.post("/api/audit/analyze/batch", response_model=Dict[str, Any])
+async def analyze_audit_queries(request: BatchAnalysisRequest):
+    """Analyser un lot de requêtes d'audit (réanalyse des historiques de questions)"""
+    if len(request.questions) > settings.analysis_batch_max_size:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Lot trop volumineux (maximum {settings.analysis_batch_max_size} questions)"
+        )
+    try:
+        # Analyse CPU dans le pool NLP, hors de la boucle d'événements
+        analyses = await nlp_executor.analyze_questions(
+            request.questions, timeout=settings.nlp_executor_batch_timeout
+        )
+        return {"analyses": [analysis.dict() for analysis in analyses], "count": len(analyses)}
+    except NLPExecutorBusy:
+        raise HTTPException(status_code=503, detail="Analyse NLP saturée, réessayez plus tard")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Délai d'analyse dépassé")
+    except Exception as e:
+        logger.error(f"Erreur lors de l'analyse du lot de requêtes: {e}")
+        raise HTTPException(status_code=500, detail="Erreur lors de l'analyse")
+
+
 @app.get("/api/audit/user-activity")
 async def get_user_activity_analysis(timeframe: Optional[str] = "24h", user_filter: Optional[str] = None):
     """Analyser l'activité des utilisateurs"""
@@ -210,7 +268,7 @@ async def search_audit_logs(
 ):
     """Rechercher dans les logs d'audit"""
     try:
-        collection = db_manager.get_mongodb_collection("actions_audit")
+        collection = db_manager.get_mongodb_collection(audit_collection_name())
         filters = {}
         if user:
             filters["os_username"] = {"$regex": user, "$options": "i"}
@@ -219,16 +277,22 @@ async def search_audit_logs(
         if object_name:
             filters["object_name"] = {"$regex": object_name, "$options": "i"}
         if date_start and date_end:
-            filters["event_timestamp"] = {"$gte": date_start, "$lte": date_end}
+            try:
+                filters.update(time_range_filter(date_start, date_end))
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        filters = translate_filter(filters)
         results = []
         async for doc in collection.find(filters).limit(limit):
             doc["_id"] = str(doc["_id"])
-            results.append(doc)
+            results.append(normalize_document(doc))
         return {
             "results": results,
             "count": len(results),
             "filters_applied": filters
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Erreur lors de la recherche d'audit: {e}")
         raise HTTPException(status_code=500, detail="Erreur lors de la recherche")
@@ -239,6 +303,7 @@ async def get_cache_statistics():
     """Obtenir les statistiques du cache"""
     try:
         stats = await CacheService.get_cache_stats()
+        stats["single_flight"] = chat_flight.stats()
         return stats
     except Exception as e:
         logger.error(f"Erreur lors de la récupération des stats de cache: {e}")
@@ -260,6 +325,8 @@ async def get_action_statistics(timeframe: str = "24h"):
 async def cleanup_cache(background_tasks: BackgroundTasks, max_age_days: int = 30):
     """Nettoyer le cache (tâche en arrière-plan)"""
     try:
+        if cache_purger.running:
+            return {"message": "Nettoyage du cache déjà en cours", "progress": cache_purger.progress}
         background_tasks.add_task(CacheService.cleanup_old_cache, max_age_days)
         return {"message": f"Nettoyage du cache programmé (>{max_age_days} jours)"}
     except Exception as e:
@@ -267,6 +334,38 @@ async def cleanup_cache(background_tasks: BackgroundTasks, max_age_days: int = 3
         raise HTTPException(status_code=500, detail="Erreur lors du nettoyage")
 
 
+@app.get("/api/cache/cleanup/status")
+async def cleanup_cache_status():
+    """Progression du nettoyage en cours et rapport du dernier nettoyage"""
+    return cache_purger.status()
+
+
+@app.post("/api/cache/invalidate")
+async def invalidate_cache(query: Optional[str] = None):
+    """Invalider une requête (ou tout le cache des requêtes) dans tous les niveaux"""
+    try:
+        if query:
+            invalidated = await CacheService.invalidate_query(query)
+            return {"invalidated": invalidated, "query": query}
+        deleted = await CacheService.clear_query_cache()
+        return {"invalidated": True, "deleted_entries": deleted}
+    except Exception as e:
+        logger.error(f"Erreur lors de l'invalidation du cache: {e}")
+        raise HTTPException(status_code=500, detail="Erreur lors de l'invalidation du cache")
+
+
+@app.get("/api/admin/indexes")
+async def get_index_report(refresh: bool = False):
+    """Rapport des index MongoDB et des requêtes d'audit en parcours complet"""
+    try:
+        if refresh or not audit_index_manager.last_report:
+            return await audit_index_manager.bootstrap()
+        return audit_index_manager.last_report
+    except Exception as e:
+        logger.error(f"Erreur lors de la vérification des index: {e}")
+        raise HTTPException(status_code=500, detail="Erreur lors de la vérification des index")
+
+
 @app.get("/api/health")
 async def health_check():
     """Vérification de l'état de santé de l'application"""
@@ -280,7 +379,8 @@ async def health_check():
             "databases": {
                 "mongodb": mongodb_status,
                 "sqlite": sqlite_status
-            }
+            },
+            "nlp_executor": nlp_executor.stats()
         }
     except Exception as e:
         logger.error(f"Erreur lors du health check: {e}")
@@ -296,8 +396,10 @@ async def get_app_info():
         "description": "Backend Python pour l'application d'audit SIO",
         "endpoints": {
             "chat": ["/api/chat/message", "/api/chat/suggestions", "/api/chat/frequent-questions"],
-            "audit": ["/api/audit/analyze", "/api/audit/user-activity", "/api/audit/anomalies", "/api/audit/search"],
-            "cache": ["/api/cache/stats", "/api/cache/actions", "/api/cache/cleanup"],
+            "audit": ["/api/audit/analyze", "/api/audit/analyze/batch", "/api/audit/user-activity", "/api/audit/anomalies", "/api/audit/search"],
+            "cache": ["/api/cache/stats", "/api/cache/actions", "/api/cache/cleanup",
+                      "/api/cache/cleanup/status", "/api/cache/invalidate"],
+            "admin": ["/api/admin/indexes"],
             "system": ["/api/health", "/api/info"]
         }
     }
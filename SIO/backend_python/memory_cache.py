@@ -0,0 +1,119 @@
+"""Cache LRU en mémoire borné en entrées, en octets et en durée de vie"""
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+
+def estimate_size(value: Any) -> int:
+    """Estimer la taille mémoire d'une valeur (taille de sa sérialisation JSON)"""
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    return len(json.dumps(value, ensure_ascii=False, default=str))
+
+
+class LRUCache:
+    """Cache LRU/TTL thread-safe
+
+    Les entrées les moins récemment utilisées sont évincées dès que le nombre
+    d'entrées ou la taille cumulée dépasse sa limite ; une entrée plus vieille
+    que ttl_seconds est considérée absente.
+    """
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 16 * 1024 * 1024,
+                 ttl_seconds: Optional[float] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, count=False) is not None
+
+    def _remove(self, key: Hashable):
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def get(self, key: Hashable, count: bool = True) -> Optional[Any]:
+        """Lire une entrée (et la marquer comme récemment utilisée)"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[2] is not None and entry[2] <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+
+            if entry is None:
+                if count:
+                    self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            if count:
+                self.hits += 1
+            return entry[0]
+
+    def set(self, key: Hashable, value: Any, size: Optional[int] = None):
+        """Ajouter ou remplacer une entrée"""
+        if size is None:
+            size = estimate_size(value)
+        if size > self.max_bytes:
+            # Une entrée plus grande que le budget évincerait tout le cache
+            self.delete(key)
+            return
+
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, size, expires_at)
+            self._bytes += size
+
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> bool:
+        """Supprimer une entrée"""
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+                return True
+            return False
+
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        """Instantané des entrées (clé, valeur), des moins aux plus récemment utilisées"""
+        with self._lock:
+            return [(key, entry[0]) for key, entry in self._data.items()]
+
+    def clear(self):
+        """Vider le cache"""
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Statistiques du cache"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) * 100 if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
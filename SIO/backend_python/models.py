@@ -135,6 +135,11 @@ class QueryAnalysis(BaseModel):
     suggested_filters: Dict[str, Any]
 
 
+class BatchAnalysisRequest(BaseModel):
+    """Lot de questions à analyser"""
+    questions: List[str]
+
+
 class UserActivityAnalysis(BaseModel):
     """Analyse d'activité utilisateur"""
     user_stats: Dict[str, Any]
@@ -0,0 +1,156 @@
+"""Gestion déclarative des index MongoDB de la collection d'audit"""
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional
+from pymongo import ASCENDING, IndexModel
+from loguru import logger
+from database import db_manager
+from audit_store import audit_collection_name, field, translate_filter, time_field, time_range_filter
+
+
+def audit_indexes() -> List[IndexModel]:
+    """Index composés couvrant les filtres utilisés par la recherche, le chatbot
+    et les analyses (égalité d'abord, plage temporelle ensuite)"""
+    ts = time_field()
+    keys = [
+        (ts, "os_username"),
+        ("action_name", ts),
+        ("os_username", ts),
+        ("object_name", ts),
+        ("object_schema", ts),
+    ]
+    return [
+        IndexModel(
+            [(field(first), ASCENDING), (field(second), ASCENDING)],
+            name=f"{field(first)}_{field(second)}".replace(".", "_")
+        )
+        for first, second in keys
+    ]
+
+
+def _hot_query_shapes() -> Dict[str, Dict[str, Any]]:
+    """Formes des requêtes fréquentes, avec des valeurs représentatives"""
+    now = datetime.utcnow()
+    start = now - timedelta(days=1)
+    time_range = time_range_filter(start, now)
+
+    return {
+        # search_audit_logs / _execute_audit_query : plage temporelle seule
+        "time_range": time_range,
+        # detect_anomalies : borne inférieure seule
+        "anomalies_window": time_range_filter(start),
+        # search_audit_logs : action exacte
+        "action": {"action_name": "DROP"},
+        # _execute_audit_query : actions extraites + période
+        "actions_in_range": {"action_name": {"$in": ["CREATE", "DROP", "ALTER"]}, **time_range},
+        # search_audit_logs / _execute_audit_query : utilisateur + période
+        "user_in_range": {"os_username": {"$regex": "admin", "$options": "i"}, **time_range},
+        # _execute_audit_query : objet + période
+        "object_in_range": {"object_name": {"$regex": "EMPLOYEES", "$options": "i"}, **time_range},
+        # _execute_audit_query : schéma + période
+        "schema_in_range": {"object_schema": {"$regex": "HR", "$options": "i"}, **time_range},
+    }
+
+
+def _collect_stages(plan: Dict[str, Any], stages: List[str], index_names: List[str]):
+    """Parcourir récursivement un plan d'exécution"""
+    if not isinstance(plan, dict):
+        return
+    if "stage" in plan:
+        stages.append(plan["stage"])
+    if "indexName" in plan:
+        index_names.append(plan["indexName"])
+    for key in ("inputStage", "queryPlan", "outerStage", "innerStage"):
+        if key in plan:
+            _collect_stages(plan[key], stages, index_names)
+    for child in plan.get("inputStages", []):
+        _collect_stages(child, stages, index_names)
+
+
+def summarize_explain(explain: Dict[str, Any]) -> Dict[str, Any]:
+    """Résumer la sortie d'explain() : étapes du plan gagnant et index utilisés"""
+    planner = explain.get("queryPlanner", {})
+    stages: List[str] = []
+    index_names: List[str] = []
+    _collect_stages(planner.get("winningPlan", {}), stages, index_names)
+
+    summary = {
+        "uses_index": "COLLSCAN" not in stages and bool(index_names),
+        "collection_scan": "COLLSCAN" in stages,
+        "stages": stages,
+        "index_names": sorted(set(index_names))
+    }
+
+    execution = explain.get("executionStats")
+    if execution:
+        summary["keys_examined"] = execution.get("totalKeysExamined")
+        summary["docs_examined"] = execution.get("totalDocsExamined")
+        summary["execution_time_ms"] = execution.get("executionTimeMillis")
+
+    return summary
+
+
+class AuditIndexManager:
+    """Création et vérification des index de la collection d'audit"""
+
+    def __init__(self, collection_name: Optional[str] = None, indexes: Optional[List[IndexModel]] = None):
+        self.collection_name = collection_name or audit_collection_name()
+        self.indexes = indexes if indexes is not None else audit_indexes()
+        self.last_report: Dict[str, Any] = {}
+
+    async def ensure_indexes(self) -> List[str]:
+        """Créer les index déclarés (opération idempotente)"""
+        collection = db_manager.get_mongodb_collection(self.collection_name)
+        created = await collection.create_indexes(self.indexes)
+        logger.info(f"Index MongoDB vérifiés sur {self.collection_name}: {', '.join(created)}")
+        return created
+
+    async def verify_query_shapes(self) -> Dict[str, Dict[str, Any]]:
+        """Vérifier via explain() que chaque forme de requête fréquente utilise un index"""
+        collection = db_manager.get_mongodb_collection(self.collection_name)
+        results = {}
+
+        for shape_name, query_filter in _hot_query_shapes().items():
+            try:
+                explain = await collection.find(translate_filter(query_filter)).explain()
+                results[shape_name] = summarize_explain(explain)
+            except Exception as e:
+                logger.error(f"Erreur lors de l'explain de la requête '{shape_name}': {e}")
+                results[shape_name] = {"error": str(e)}
+
+        return results
+
+    async def bootstrap(self) -> Dict[str, Any]:
+        """Créer les index puis vérifier les plans des requêtes fréquentes"""
+        report: Dict[str, Any] = {
+            "collection": self.collection_name,
+            "checked_at": datetime.utcnow().isoformat(),
+            "indexes": [],
+            "query_shapes": {},
+            "collection_scans": []
+        }
+
+        try:
+            report["indexes"] = await self.ensure_indexes()
+        except Exception as e:
+            logger.error(f"Erreur lors de la création des index MongoDB: {e}")
+            report["error"] = str(e)
+
+        report["query_shapes"] = await self.verify_query_shapes()
+        report["collection_scans"] = [
+            name for name, summary in report["query_shapes"].items()
+            if summary.get("collection_scan")
+        ]
+
+        if report["collection_scans"]:
+            logger.warning(
+                f"Requêtes d'audit sans index (COLLSCAN): {', '.join(report['collection_scans'])}"
+            )
+        else:
+            logger.info("Toutes les requêtes d'audit fréquentes utilisent un index")
+
+        self.last_report = report
+        return report
+
+
+# Instance globale du gestionnaire d'index
+audit_index_manager = AuditIndexManager()
@@ -0,0 +1,187 @@
+"""Exécution des traitements NLP hors de la boucle d'événements
+
+Les méthodes de NLPService (analyse d'une question, recherche de questions
+similaires, analyse par lot) sont exécutées dans un pool de threads ou de
+processus, avec un délai par tâche et une limite de tâches en attente : au
+delà, la tâche est refusée (NLPExecutorBusy) au lieu d'allonger la file et
+la latence de toutes les requêtes.
+
+Les workers gardent leur état chaud d'une tâche à l'autre :
+- en mode thread, ils partagent un NLPService (patterns compilés) ainsi que
+  le cache d'analyses et l'index de similarité de l'application, tenu à jour
+  en mémoire ;
+- en mode process, chaque processus crée son NLPService et charge l'index
+  de similarité sauvegardé une fois au démarrage, puis le recharge seulement
+  quand le fichier a été réécrit (réajustement, arrêt).
+"""
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from loguru import logger
+from config import settings
+from models import QueryAnalysis
+from nlp_service import NLPService
+from similarity_index import similarity_index
+from services import get_nlp_service
+
+MODES = ("thread", "process")
+
+# NLPService du processus worker (mode process)
+_worker_service: Optional[NLPService] = None
+_worker_index_mtime: Optional[float] = None
+
+
+class NLPExecutorBusy(RuntimeError):
+    """Trop de traitements NLP en attente"""
+
+
+def _index_mtime() -> Optional[float]:
+    try:
+        return os.path.getmtime(similarity_index.path) if similarity_index.path else None
+    except OSError:
+        return None
+
+
+def _init_worker():
+    """Initialiser un processus worker : service et index de similarité chauds"""
+    global _worker_service, _worker_index_mtime
+    _worker_service = get_nlp_service()
+    _worker_index_mtime = _index_mtime()
+    similarity_index.load()
+
+
+def _run_in_worker(method: str, args: tuple) -> Any:
+    """Exécuter une méthode du NLPService du processus worker"""
+    global _worker_index_mtime
+    if method == "find_similar_questions":
+        mtime = _index_mtime()
+        if mtime != _worker_index_mtime:
+            # Index réécrit par le processus principal depuis le dernier chargement
+            _worker_index_mtime = mtime
+            similarity_index.load()
+    return getattr(_worker_service, method)(*args)
+
+
+class NLPExecutor:
+    """Pool de workers pour les méthodes de NLPService"""
+
+    def __init__(self, mode: str = "thread", workers: int = 2, timeout: Optional[float] = 5.0,
+                 max_pending: int = 64, service: Optional[NLPService] = None):
+        if mode not in MODES:
+            raise ValueError(f"Mode d'exécution NLP inconnu: {mode} (attendu: {', '.join(MODES)})")
+        self.mode = mode
+        self.workers = workers
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self.service = service
+        self._pool: Optional[Executor] = None
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.failures = 0
+
+    def start(self):
+        """Créer le pool (et démarrer les processus workers en mode process)"""
+        if self._pool is not None:
+            return
+        if self.mode == "process":
+            # fork : les workers héritent des modules déjà importés
+            context = multiprocessing.get_context("fork") if os.name == "posix" else None
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=context, initializer=_init_worker
+            )
+            # Démarrer les workers maintenant plutôt qu'à la première question
+            for future in [self._pool.submit(os.getpid) for _ in range(self.workers)]:
+                future.result()
+        else:
+            if self.service is None:
+                self.service = get_nlp_service()
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="nlp")
+        logger.info(f"Pool NLP démarré: {self.workers} workers ({self.mode})")
+
+    def shutdown(self):
+        """Arrêter le pool (les tâches en cours se terminent)"""
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _submit(self, method: str, args: tuple) -> Future:
+        if self.mode == "process":
+            return self._pool.submit(_run_in_worker, method, args)
+        return self._pool.submit(getattr(self.service, method), *args)
+
+    def _done(self, loop: asyncio.AbstractEventLoop):
+        # Appelé depuis le worker : compteur décrémenté dans la boucle d'événements
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            # Boucle fermée (arrêt de l'application)
+            pass
+
+    def _release(self):
+        self.pending -= 1
+
+    async def run(self, method: str, *args, timeout: Optional[float] = None) -> Any:
+        """Exécuter NLPService.<method>(*args) dans le pool
+
+        Lève NLPExecutorBusy si max_pending tâches sont déjà en cours ou en
+        attente, asyncio.TimeoutError si le résultat n'arrive pas à temps.
+        """
+        if self._pool is None:
+            self.start()
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise NLPExecutorBusy(f"{self.pending} traitements NLP en attente")
+
+        future = self._submit(method, args)
+        self.pending += 1
+        # Une tâche expirée occupe son worker jusqu'à la fin : elle reste comptée
+        loop = asyncio.get_running_loop()
+        future.add_done_callback(lambda _: self._done(loop))
+        try:
+            result = await asyncio.wait_for(
+                asyncio.wrap_future(future), timeout if timeout is not None else self.timeout
+            )
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        except Exception:
+            self.failures += 1
+            raise
+        self.completed += 1
+        return result
+
+    async def analyze_question(self, question: str) -> QueryAnalysis:
+        return await self.run("analyze_question", question)
+
+    async def analyze_questions(self, questions: List[str], timeout: Optional[float] = None) -> List[QueryAnalysis]:
+        return await self.run("analyze_questions", questions, timeout=timeout)
+
+    async def find_similar_questions(self, question: str, limit: int = 5) -> List[Dict[str, Any]]:
+        return await self.run("find_similar_questions", question, limit)
+
+    def stats(self) -> Dict[str, Any]:
+        """Statistiques du pool"""
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "running": self._pool is not None,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "failures": self.failures
+        }
+
+
+# Instance globale
+nlp_executor = NLPExecutor(
+    mode=settings.nlp_executor_mode,
+    workers=settings.nlp_executor_workers,
+    timeout=settings.nlp_executor_timeout,
+    max_pending=settings.nlp_executor_max_pending
+)
@@ -1,23 +1,86 @@
 """Services de traitement du langage naturel et d'analyse"""
 import re
 import json
+import heapq
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any, Tuple
-from textblob import TextBlob
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import numpy as np
 from loguru import logger
+from config import settings
 from models import QueryAnalysis, AuditQuery
 from database import db_manager
+from audit_store import audit_collection_name, field, time_range_filter, hour_bucket_expression
+from similarity_index import similarity_index
+from pattern_engine import PatternGroup
+from intent_classifier import intent_classifier
+from memory_cache import LRUCache
+
+# Patterns d'entités, compilés une fois (premier pattern correspondant, dans l'ordre),
+# précédés de mots-clés dont l'un est présent dès qu'un pattern correspond
+USER_PATTERNS = PatternGroup([
+    r"utilisateur(?:\s+(?:os|db))?\s+([A-Za-z0-9_-]+)",
+    r"user\s+([A-Za-z0-9_-]+)",
+    r"(?:je suis|je m'appelle)\s+([A-Za-zÀ-ÿ-]+)"
+], re.IGNORECASE, keywords=["utilisateur", "user", "je suis", "je m'appelle"])
+SQL_ACTION_PATTERNS = PatternGroup(
+    [r'\b(SELECT|INSERT|UPDATE|DELETE|CREATE|DROP|ALTER)\b'], re.IGNORECASE,
+    keywords=["select", "insert", "update", "delete", "create", "drop", "alter"]
+)
+OBJECT_PATTERNS = PatternGroup([
+    r"(?:table|objet)\s+([A-Za-z0-9_-]+)",
+    r"(?:sur|dans)\s+([A-Za-z0-9_-]+)",
+    r"(?:CREATE|DROP|ALTER)\s+(?:TABLE\s+)?([A-Za-z0-9_-]+)"
+], re.IGNORECASE, keywords=["table", "objet", "sur", "dans", "create", "drop", "alter"])
+SCHEMA_PATTERNS = PatternGroup([r"schéma\s+([A-Za-z0-9_-]+)"], re.IGNORECASE, keywords=["schéma"])
+DATE_PATTERNS = PatternGroup([
+    r"(\d{1,2}[\/\-]\d{1,2}[\/\-]\d{4})",
+    r"(aujourd'hui|hier)",
+    r"(cette semaine|ce mois|cette année)",
+    r"(pendant|durant)\s+(\d+)\s+(heures?|jours?|semaines?|mois)"
+], re.IGNORECASE, keywords=["/", "-", "aujourd'hui", "hier", "cette semaine", "ce mois", "cette année", "pendant", "durant"])
+PROGRAM_PATTERNS = PatternGroup(
+    [r"(SQL Developer|Toad|DBeaver|PL\/SQL Developer|SSMS)"], re.IGNORECASE,
+    keywords=["sql developer", "toad", "dbeaver", "ssms"]
+)
+HOST_PATTERNS = PatternGroup([r"(?:poste|host)\s+([A-Za-z0-9_-]+)"], re.IGNORECASE, keywords=["poste", "host"])
+
+# Périodes nommées (expressions littérales, par ordre de priorité) et durées glissantes
+PERIODS = [
+    ("today", "aujourd'hui"),
+    ("yesterday", "hier"),
+    ("this_week", "cette semaine"),
+    ("this_month", "ce mois"),
+]
+DURATION_PATTERNS = PatternGroup(
+    [r"(?:pendant|durant|dernières?)\s+(\d+)\s+(heures?|jours?|semaines?|mois)"], re.IGNORECASE,
+    keywords=["pendant", "durant", "dernière"]
+)
+
+
+def _copy_values(values: Dict[str, Any]) -> Dict[str, Any]:
+    """Copie d'un dictionnaire d'entités ou de filtres (listes comprises)"""
+    return {key: list(value) if isinstance(value, list) else value for key, value in values.items()}
 
 
 class NLPService:
     """Service de traitement du langage naturel"""
     
+    # Partie indépendante de l'heure des analyses (intention, entités, squelette de
+    # filtres, période relative), par texte de question, partagée par les instances
+    analysis_cache = LRUCache(
+        max_entries=settings.analysis_cache_max_entries,
+        max_bytes=settings.analysis_cache_max_bytes
+    )
+    
     def __init__(self):
-        self.vectorizer = TfidfVectorizer(stop_words='french')
+        self.similarity_index = similarity_index
+        self.intent_classifier = intent_classifier
         self.question_patterns = self._load_question_patterns()
+        # Intentions compilées ; les textes sont mis en minuscules avant classification
+        intent_keywords = self._load_intent_keywords()
+        self.intent_patterns = {
+            intent: PatternGroup(patterns, keywords=intent_keywords.get(intent))
+            for intent, patterns in self.question_patterns.items()
+        }
     
     def _load_question_patterns(self) -> Dict[str, List[str]]:
         """Charger les patterns de questions prédéfinis"""
@@ -54,88 +117,100 @@ class NLPService:
             ]
         }
     
+    def _load_intent_keywords(self) -> Dict[str, List[str]]:
+        """Mots-clés dont l'un figure dans toute question reconnue par un pattern de l'intention"""
+        return {
+            "USER_ACTIVITY": ["utilisateur", "qui ", "action", "activité"],
+            "OBJECT_MODIFICATIONS": [
+                "modification", "changement", "créé", "supprimé", "modifié",
+                "create", "drop", "alter", "insert", "update", "delete", "structure"
+            ],
+            "TIME_ANALYSIS": [
+                "hier", "pendant", "durant", "au cours de", "heure", "jour", "semaine", "mois",
+                "quand", "à quel moment"
+            ],
+            "SECURITY_ANALYSIS": ["sécurité", "accès", "permission", "connexion", "suspect", "violation", "infraction"],
+            "PERFORMANCE_ANALYSIS": [
+                "performance", "lenteur", "rapidité", "lente", "temps de réponse",
+                "optimisation", "amélioration", "charge", "utilisation"
+            ]
+        }
+    
     def extract_entities(self, text: str) -> Dict[str, Any]:
         """Extraire les entités du texte"""
         entities = {}
         
         # Extraction des utilisateurs
-        user_patterns = [
-            r"utilisateur(?:\s+(?:os|db))?\s+([A-Za-z0-9_-]+)",
-            r"user\s+([A-Za-z0-9_-]+)",
-            r"(?:je suis|je m'appelle)\s+([A-Za-zÀ-ÿ-]+)"
-        ]
-        
-        for pattern in user_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                entities["user"] = match.group(1)
-                break
+        match = USER_PATTERNS.first(text)
+        if match:
+            entities["user"] = match.group(1)
         
         # Extraction des actions SQL
-        sql_actions = re.findall(r'\b(SELECT|INSERT|UPDATE|DELETE|CREATE|DROP|ALTER)\b', text, re.IGNORECASE)
+        sql_actions = SQL_ACTION_PATTERNS.findall(text)
         if sql_actions:
             entities["actions"] = [action.upper() for action in sql_actions]
         
         # Extraction des objets/tables
-        object_patterns = [
-            r"(?:table|objet)\s+([A-Za-z0-9_-]+)",
-            r"(?:sur|dans)\s+([A-Za-z0-9_-]+)",
-            r"(?:CREATE|DROP|ALTER)\s+(?:TABLE\s+)?([A-Za-z0-9_-]+)"
-        ]
-        
-        for pattern in object_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                entities["object_name"] = match.group(1).upper()
-                break
+        match = OBJECT_PATTERNS.first(text)
+        if match:
+            entities["object_name"] = match.group(1).upper()
         
         # Extraction des schémas
-        schema_match = re.search(r"schéma\s+([A-Za-z0-9_-]+)", text, re.IGNORECASE)
+        schema_match = SCHEMA_PATTERNS.first(text)
         if schema_match:
             entities["schema"] = schema_match.group(1).upper()
         
         # Extraction des dates
-        date_patterns = [
-            r"(\d{1,2}[\/\-]\d{1,2}[\/\-]\d{4})",
-            r"(aujourd'hui|hier)",
-            r"(cette semaine|ce mois|cette année)",
-            r"(pendant|durant)\s+(\d+)\s+(heures?|jours?|semaines?|mois)"
+        dates = [
+            match if isinstance(match, str) else ' '.join(match)
+            for match in DATE_PATTERNS.findall(text)
         ]
         
-        dates = []
-        for pattern in date_patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            dates.extend([match if isinstance(match, str) else ' '.join(match) for match in matches])
-        
         if dates:
             entities["dates"] = dates
         
         # Extraction des programmes/clients
-        program_match = re.search(r"(SQL Developer|Toad|DBeaver|PL\/SQL Developer|SSMS)", text, re.IGNORECASE)
+        program_match = PROGRAM_PATTERNS.first(text)
         if program_match:
             entities["program"] = program_match.group(1)
         
         # Extraction des hosts/postes
-        host_match = re.search(r"(?:poste|host)\s+([A-Za-z0-9_-]+)", text, re.IGNORECASE)
+        host_match = HOST_PATTERNS.first(text)
         if host_match:
             entities["client_host"] = host_match.group(1).upper()
         
         return entities
     
     def classify_intent(self, text: str) -> Tuple[str, float]:
-        """Classifier l'intention de la question"""
+        """Classifier l'intention de la question (modèle entraîné, sinon règles)"""
+        return self.classify_intents([text])[0]
+    
+    def classify_intents(self, texts: List[str]) -> List[Tuple[str, float]]:
+        """Classifier un lot de questions en une prédiction vectorisée
+        
+        Les prédictions du modèle sous le seuil de confiance, ou l'absence de
+        modèle, laissent la décision aux règles.
+        """
+        if not texts or not self.intent_classifier.ready:
+            return [self.classify_intent_rules(text) for text in texts]
+        predictions = self.intent_classifier.predict(texts)
+        return [
+            prediction if prediction[1] >= settings.intent_model_min_confidence
+            else self.classify_intent_rules(text)
+            for text, prediction in zip(texts, predictions)
+        ]
+    
+    def classify_intent_rules(self, text: str) -> Tuple[str, float]:
+        """Classifier l'intention par les patterns (part des patterns de l'intention présents)"""
         text_lower = text.lower()
         best_intent = "GENERAL"
         best_score = 0.0
         
-        for intent, patterns in self.question_patterns.items():
-            score = 0.0
-            for pattern in patterns:
-                if re.search(pattern, text_lower):
-                    score += 1.0
+        for intent, patterns in self.intent_patterns.items():
+            score = float(patterns.count(text_lower))
             
             # Normaliser le score
-            if patterns:
+            if len(patterns):
                 score = score / len(patterns)
             
             if score > best_score:
@@ -144,39 +219,55 @@ class NLPService:
         
         return best_intent, best_score
     
-    def extract_timeframe(self, text: str) -> Dict[str, Any]:
-        """Extraire la période temporelle"""
-        timeframe = {}
-        now = datetime.utcnow()
+    def timeframe_spec(self, text: str) -> Dict[str, Any]:
+        """Période relative mentionnée dans le texte, indépendante de l'heure courante"""
+        spec = {}
         
         # Patterns temporels
-        if re.search(r"aujourd'hui", text, re.IGNORECASE):
+        text_lower = text.lower()
+        period = next((name for name, expression in PERIODS if expression in text_lower), None)
+        if period:
+            spec["period"] = period
+        
+        # Patterns de durée
+        duration_match = DURATION_PATTERNS.first(text)
+        if duration_match:
+            spec["duration"] = [int(duration_match.group(1)), duration_match.group(2).lower()]
+        
+        return spec
+    
+    @staticmethod
+    def resolve_timeframe(spec: Dict[str, Any], now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Bornes d'une période relative à l'instant now (par défaut : maintenant)"""
+        timeframe = {}
+        if now is None:
+            now = datetime.utcnow()
+        
+        period = spec.get("period")
+        if period == "today":
             timeframe["start"] = now.replace(hour=0, minute=0, second=0, microsecond=0)
             timeframe["end"] = now
             timeframe["period"] = "today"
         
-        elif re.search(r"hier", text, re.IGNORECASE):
+        elif period == "yesterday":
             yesterday = now - timedelta(days=1)
             timeframe["start"] = yesterday.replace(hour=0, minute=0, second=0, microsecond=0)
             timeframe["end"] = yesterday.replace(hour=23, minute=59, second=59)
             timeframe["period"] = "yesterday"
         
-        elif re.search(r"cette semaine", text, re.IGNORECASE):
+        elif period == "this_week":
             start_week = now - timedelta(days=now.weekday())
             timeframe["start"] = start_week.replace(hour=0, minute=0, second=0, microsecond=0)
             timeframe["end"] = now
             timeframe["period"] = "this_week"
         
-        elif re.search(r"ce mois", text, re.IGNORECASE):
+        elif period == "this_month":
             timeframe["start"] = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
             timeframe["end"] = now
             timeframe["period"] = "this_month"
         
-        # Patterns de durée
-        duration_match = re.search(r"(?:pendant|durant|dernières?)\s+(\d+)\s+(heures?|jours?|semaines?|mois)", text, re.IGNORECASE)
-        if duration_match:
-            amount = int(duration_match.group(1))
-            unit = duration_match.group(2).lower()
+        if "duration" in spec:
+            amount, unit = spec["duration"]
             
             if "heure" in unit:
                 timeframe["start"] = now - timedelta(hours=amount)
@@ -192,34 +283,87 @@ class NLPService:
         
         return timeframe
     
-    def analyze_question(self, question: str) -> QueryAnalysis:
+    def extract_timeframe(self, text: str) -> Dict[str, Any]:
+        """Extraire la période temporelle"""
+        return self.resolve_timeframe(self.timeframe_spec(text))
+    
+    def _analysis_template(self, question: str, intent: Optional[Tuple[str, float]] = None) -> Dict[str, Any]:
+        """Partie de l'analyse indépendante de l'heure, mémorisée par texte de question
+        
+        intent : (intention, confiance) déjà prédite pour la question (analyse par lot).
+        """
+        template = NLPService.analysis_cache.get(question)
+        if template is not None:
+            template["hits"] += 1
+            return template
+        
+        entities = self.extract_entities(question)
+        intent, confidence = intent or self.classify_intent(question)
+        template = {
+            "intent": intent,
+            "confidence": confidence,
+            "entities": entities,
+            "filters": self._generate_suggested_filters(entities, intent),
+            "timeframe": self.timeframe_spec(question),
+            "hits": 0
+        }
+        NLPService.analysis_cache.set(question, template)
+        return template
+    
+    def analyze_question(self, question: str, intent: Optional[Tuple[str, float]] = None) -> QueryAnalysis:
         """Analyser une question complète"""
         # Normaliser la question
         normalized = question.lower().strip()
         
-        # Extraire les entités
-        entities = self.extract_entities(question)
-        
-        # Classifier l'intention
-        intent, confidence = self.classify_intent(question)
+        # Intention, entités et filtres (mémorisés ; copiés pour l'appelant)
+        template = self._analysis_template(question, intent)
+        entities = _copy_values(template["entities"])
+        suggested_filters = _copy_values(template["filters"])
         
-        # Extraire la période temporelle
-        timeframe = self.extract_timeframe(question)
+        # Période relative résolue à chaque analyse : « hier » suit l'horloge
+        timeframe = self.resolve_timeframe(template["timeframe"])
         if timeframe:
             entities["timeframe"] = timeframe
-        
-        # Générer des filtres suggérés
-        suggested_filters = self._generate_suggested_filters(entities, intent)
+            self._add_timeframe_filters(suggested_filters, timeframe)
         
         return QueryAnalysis(
             original_query=question,
             normalized_query=normalized,
-            intent=intent,
+            intent=template["intent"],
             entities=entities,
-            confidence=confidence,
+            confidence=template["confidence"],
             suggested_filters=suggested_filters
         )
     
+    @staticmethod
+    def analysis_cache_stats(top: int = 10) -> Dict[str, Any]:
+        """Statistiques du cache d'analyses et questions les plus servies depuis le cache"""
+        stats = NLPService.analysis_cache.stats()
+        entries = NLPService.analysis_cache.items()
+        stats["top_questions"] = [
+            {"question": question, "hits": template["hits"]}
+            for question, template in heapq.nlargest(top, entries, key=lambda entry: entry[1]["hits"])
+        ]
+        return stats
+    
+    def analyze_questions(self, questions: List[str]) -> List[QueryAnalysis]:
+        """Analyser un lot de questions, dans l'ordre (les doublons partagent la même analyse)"""
+        # Intentions des questions absentes du cache prédites en un seul lot
+        misses = [
+            question for question in dict.fromkeys(questions)
+            if question not in NLPService.analysis_cache
+        ]
+        intents = dict(zip(misses, self.classify_intents(misses)))
+        
+        analyses: Dict[str, QueryAnalysis] = {}
+        results = []
+        for question in questions:
+            analysis = analyses.get(question)
+            if analysis is None:
+                analysis = analyses[question] = self.analyze_question(question, intents.get(question))
+            results.append(analysis)
+        return results
+    
     def _generate_suggested_filters(self, entities: Dict[str, Any], intent: str) -> Dict[str, Any]:
         """Générer des filtres suggérés basés sur l'analyse"""
         filters = {}
@@ -244,14 +388,6 @@ class NLPService:
         if "client_host" in entities:
             filters["client_host"] = entities["client_host"]
         
-        # Filtres temporels
-        if "timeframe" in entities:
-            tf = entities["timeframe"]
-            if "start" in tf:
-                filters["date_start"] = tf["start"].isoformat()
-            if "end" in tf:
-                filters["date_end"] = tf["end"].isoformat()
-        
         # Filtres basés sur l'intention
         if intent == "SECURITY_ANALYSIS":
             filters["focus"] = "security"
@@ -260,42 +396,27 @@ class NLPService:
         elif intent == "USER_ACTIVITY":
             filters["focus"] = "user_activity"
         
+        # Filtres temporels
+        if "timeframe" in entities:
+            NLPService._add_timeframe_filters(filters, entities["timeframe"])
+        
         return filters
     
+    @staticmethod
+    def _add_timeframe_filters(filters: Dict[str, Any], timeframe: Dict[str, Any]):
+        """Ajouter les bornes de la période aux filtres (avant le filtre d'intention)"""
+        focus = filters.pop("focus", None)
+        if "start" in timeframe:
+            filters["date_start"] = timeframe["start"].isoformat()
+        if "end" in timeframe:
+            filters["date_end"] = timeframe["end"].isoformat()
+        if focus is not None:
+            filters["focus"] = focus
+    
     def find_similar_questions(self, question: str, limit: int = 5) -> List[Dict[str, Any]]:
-        """Trouver des questions similaires"""
+        """Trouver des questions similaires (index persistant de toutes les questions)"""
         try:
-            # Récupérer les questions existantes
-            existing_questions = db_manager.fetch_sqlite_query(
-                "SELECT normalized_question, count FROM question_stats ORDER BY count DESC LIMIT 100"
-            )
-            
-            if not existing_questions:
-                return []
-            
-            # Préparer les textes pour la vectorisation
-            questions_text = [row["normalized_question"] for row in existing_questions]
-            questions_text.append(question.lower().strip())
-            
-            # Vectoriser
-            tfidf_matrix = self.vectorizer.fit_transform(questions_text)
-            
-            # Calculer la similarité
-            similarities = cosine_similarity(tfidf_matrix[-1:], tfidf_matrix[:-1]).flatten()
-            
-            # Obtenir les indices des questions les plus similaires
-            similar_indices = similarities.argsort()[-limit:][::-1]
-            
-            results = []
-            for idx in similar_indices:
-                if similarities[idx] > 0.1:  # Seuil de similarité
-                    results.append({
-                        "question": existing_questions[idx]["normalized_question"],
-                        "count": existing_questions[idx]["count"],
-                        "similarity": float(similarities[idx])
-                    })
-            
-            return results
+            return self.similarity_index.search(question, limit)
             
         except Exception as e:
             logger.error(f"Erreur lors de la recherche de questions similaires: {e}")
@@ -309,7 +430,7 @@ class AuditAnalysisService:
     async def analyze_user_activity(filters: Dict[str, Any] = None) -> Dict[str, Any]:
         """Analyser l'activité des utilisateurs"""
         try:
-            collection = db_manager.get_mongodb_collection("actions_audit")
+            collection = db_manager.get_mongodb_collection(audit_collection_name())
             
             # Pipeline d'agrégation pour l'analyse des utilisateurs
             pipeline = []
@@ -320,10 +441,10 @@ class AuditAnalysisService:
                 if "timeframe" in filters:
                     tf = filters["timeframe"]
                     if "start" in tf and "end" in tf:
-                        match_stage["event_timestamp"] = {
-                            "$gte": tf["start"].isoformat(),
-                            "$lte": tf["end"].isoformat()
-                        }
+                        match_stage.update(time_range_filter(tf["start"], tf["end"]))
+                elif "date_start" in filters and "date_end" in filters:
+                    # Filtres suggérés par l'analyse NLP (horodatages ISO)
+                    match_stage.update(time_range_filter(filters["date_start"], filters["date_end"]))
                 
                 if match_stage:
                     pipeline.append({"$match": match_stage})
@@ -332,7 +453,7 @@ class AuditAnalysisService:
             pipeline.extend([
                 {
                     "$group": {
-                        "_id": "$os_username",
+                        "_id": f"${field('os_username')}",
                         "total_actions": {"$sum": 1},
                         "unique_objects": {"$addToSet": "$object_name"},
                         "actions_by_type": {"$push": "$action_name"},
@@ -387,7 +508,7 @@ class AuditAnalysisService:
     async def detect_anomalies(timeframe: str = "24h") -> Dict[str, Any]:
         """Détecter les anomalies dans les actions d'audit"""
         try:
-            collection = db_manager.get_mongodb_collection("actions_audit")
+            collection = db_manager.get_mongodb_collection(audit_collection_name())
             
             # Calculer la période
             if timeframe == "1h":
@@ -402,16 +523,14 @@ class AuditAnalysisService:
             # Pipeline pour détecter les anomalies
             pipeline = [
                 {
-                    "$match": {
-                        "event_timestamp": {"$gte": start_time.isoformat()}
-                    }
+                    "$match": time_range_filter(start_time)
                 },
                 {
                     "$group": {
                         "_id": {
-                            "user": "$os_username",
+                            "user": f"${field('os_username')}",
                             "action": "$action_name",
-                            "hour": {"$substr": ["$event_timestamp", 11, 2]}
+                            "hour": hour_bucket_expression()
                         },
                         "count": {"$sum": 1}
                     }
@@ -434,11 +553,12 @@ class AuditAnalysisService:
                 
                 for hourly in doc.get("hourly_counts", []):
                     if hourly["count"] > threshold and avg > 0:
+                        hour = hourly["hour"]
                         anomalies.append({
                             "type": "activity_spike",
                             "user": doc["_id"]["user"],
                             "action": doc["_id"]["action"],
-                            "hour": hourly["hour"],
+                            "hour": hour.isoformat() if isinstance(hour, datetime) else hour,
                             "count": hourly["count"],
                             "average": avg,
                             "threshold": threshold,
@@ -1,22 +1,34 @@
 """Service d'intégration avec OpenAI pour le chatbot"""
-import openai
+import asyncio
 from typing import Dict, List, Any, Optional
 from loguru import logger
 from config import settings
-from nlp_service import NLPService, AuditAnalysisService
+from nlp_service import AuditAnalysisService
+from nlp_executor import nlp_executor, NLPExecutorBusy
 from cache_service import CacheService, QuestionStatsService
+from single_flight import chat_flight
+from cache_stats import cache_stats
+from audit_watermark import AUDIT_INTENTS, audit_watermark, freshness_tag
+from audit_store import audit_collection_name, translate_filter, normalize_document, time_range_filter
 from models import ChatResponse
+from services import get_nlp_service
 
 
 class OpenAIService:
     """Service d'intégration avec OpenAI"""
     
     def __init__(self):
-        openai.api_key = settings.openai_api_key
-        self.nlp_service = NLPService()
+        self.nlp_service = get_nlp_service()
         self.max_tokens = 1000
         self.temperature = 0.7
     
+    @staticmethod
+    def _openai():
+        """Client OpenAI, importé au premier appel plutôt qu'au démarrage"""
+        import openai
+        openai.api_key = settings.openai_api_key
+        return openai
+    
     async def process_chat_message(self, message: str, user_id: Optional[str] = None) -> ChatResponse:
         """Traiter un message de chat avec analyse NLP et OpenAI"""
         try:
@@ -31,44 +43,30 @@ class OpenAIService:
                     cached=True
                 )
             
-            # Analyser la question avec NLP
-            analysis = self.nlp_service.analyze_question(message)
-            logger.info(f"Analyse NLP - Intent: {analysis.intent}, Confidence: {analysis.confidence}")
-            
             # Mettre à jour les statistiques de questions
             await QuestionStatsService.update_question_stats(message)
             
-            # Générer la réponse selon l'intention
-            if analysis.intent in ["USER_ACTIVITY", "OBJECT_MODIFICATIONS", "SECURITY_ANALYSIS"]:
-                response = await self._handle_audit_query(message, analysis)
-            else:
-                response = await self._handle_general_query(message, analysis)
-            
-            # Trouver des questions similaires pour suggestions
-            similar_questions = self.nlp_service.find_similar_questions(message)
-            suggestions = [q["question"] for q in similar_questions[:3]]
-            
-            # Créer la réponse finale
-            chat_response = ChatResponse(
-                response=response,
-                analysis=analysis.dict(),
-                suggestions=suggestions,
-                cached=False
+            # Questions identiques simultanées : une seule calcule la réponse
+            chat_response, shared = await chat_flight.do(
+                CacheService.generate_query_hash(message),
+                lambda: self._answer_message(message, user_id),
+                timeout=settings.chat_single_flight_timeout
             )
             
-            # Mettre en cache la réponse
-            await CacheService.cache_query_result(message, chat_response.dict())
-            
-            # Logger l'action
-            await CacheService.cache_action("chat_query", user_id, {
-                "intent": analysis.intent,
-                "confidence": analysis.confidence
-            })
+            if shared:
+                cache_stats.incr("coalesced")
+                logger.info(f"Réponse partagée avec une requête identique en cours: {message[:50]}...")
+                analysis = chat_response.analysis or {}
+                await CacheService.cache_action("chat_query", user_id, {
+                    "intent": analysis.get("intent"),
+                    "confidence": analysis.get("confidence"),
+                    "coalesced": True
+                })
             
             return chat_response
             
         except Exception as e:
-            logger.error(f"Erreur lors du traitement du message: {e}")
+            logger.error(f"Erreur lors du traitement du message: {e!r}")
             return ChatResponse(
                 response="Désolé, une erreur s'est produite lors du traitement de votre demande.",
                 analysis=None,
@@ -76,6 +74,73 @@ class OpenAIService:
                 cached=False
             )
     
+    async def _answer_message(self, message: str, user_id: Optional[str] = None) -> ChatResponse:
+        """Calculer la réponse d'un message absent du cache exact"""
+        # Analyse exécutée dans le pool NLP, hors de la boucle d'événements
+        analysis = await nlp_executor.analyze_question(message)
+        logger.info(f"Analyse NLP - Intent: {analysis.intent}, Confidence: {analysis.confidence}")
+        
+        # Question reformulée : réponse d'une question similaire aux mêmes entités
+        semantic_match = await CacheService.get_semantic_answer(message, analysis)
+        if semantic_match:
+            logger.info(
+                f"Réponse sémantique (similarité {semantic_match['similarity']:.2f}) pour: {message[:50]}..."
+            )
+            cached_response = semantic_match["response"]
+            # Alias exact : la même formulation sera servie sans analyse NLP
+            await CacheService.cache_query_result(message, cached_response)
+            await CacheService.cache_action("chat_query", user_id, {
+                "intent": analysis.intent,
+                "confidence": analysis.confidence,
+                "semantic_cache": True
+            })
+            return ChatResponse(
+                response=cached_response.get("response", ""),
+                analysis=cached_response.get("analysis"),
+                suggestions=cached_response.get("suggestions"),
+                cached=True
+            )
+        
+        # Générer la réponse selon l'intention
+        if analysis.intent in AUDIT_INTENTS:
+            # Filigrane relu avant la requête : les données arrivées pendant le calcul périment la réponse
+            watermark = await audit_watermark.current(max_age=0)
+            response = await self._handle_audit_query(message, analysis)
+        else:
+            watermark = None
+            response = await self._handle_general_query(message, analysis)
+        
+        # Trouver des questions similaires pour suggestions
+        try:
+            similar_questions = await nlp_executor.find_similar_questions(message)
+        except (NLPExecutorBusy, asyncio.TimeoutError) as e:
+            # Suggestions facultatives : pool saturé, réponse sans suggestions
+            logger.warning(f"Questions similaires indisponibles: {e!r}")
+            similar_questions = []
+        suggestions = [q["question"] for q in similar_questions[:3]]
+        
+        # Créer la réponse finale
+        chat_response = ChatResponse(
+            response=response,
+            analysis=analysis.dict(),
+            suggestions=suggestions,
+            cached=False
+        )
+        
+        # Mettre en cache la réponse avec son étiquette de fraîcheur
+        cached_response = chat_response.dict()
+        cached_response["freshness"] = freshness_tag(analysis, watermark)
+        await CacheService.cache_query_result(message, cached_response)
+        CacheService.cache_semantic_answer(message, analysis, cached_response)
+        
+        # Logger l'action
+        await CacheService.cache_action("chat_query", user_id, {
+            "intent": analysis.intent,
+            "confidence": analysis.confidence
+        })
+        
+        return chat_response
+    
     async def _handle_audit_query(self, message: str, analysis) -> str:
         """Traiter une requête d'audit spécifique"""
         try:
@@ -130,7 +195,7 @@ class OpenAIService:
         """Exécuter une requête d'audit avec les filtres"""
         try:
             from database import db_manager
-            collection = db_manager.get_mongodb_collection("actions_audit")
+            collection = db_manager.get_mongodb_collection(audit_collection_name())
             
             # Construire la requête MongoDB
             query = {}
@@ -151,17 +216,14 @@ class OpenAIService:
                 query["object_schema"] = {"$regex": filters["object_schema"], "$options": "i"}
             
             if "date_start" in filters and "date_end" in filters:
-                query["event_timestamp"] = {
-                    "$gte": filters["date_start"],
-                    "$lte": filters["date_end"]
-                }
+                query.update(time_range_filter(filters["date_start"], filters["date_end"]))
             
             # Exécuter la requête
             results = []
-            async for doc in collection.find(query).limit(100):
+            async for doc in collection.find(translate_filter(query)).limit(100):
                 # Convertir ObjectId en string
                 doc["_id"] = str(doc["_id"])
-                results.append(doc)
+                results.append(normalize_document(doc))
             
             return {
                 "query": query,
@@ -221,7 +283,7 @@ class OpenAIService:
     async def _generate_openai_response(self, context: str) -> str:
         """Générer une réponse avec OpenAI"""
         try:
-            response = await openai.ChatCompletion.acreate(
+            response = await self._openai().ChatCompletion.acreate(
                 model="gpt-3.5-turbo",
                 messages=[
                     {
@@ -246,29 +308,8 @@ class OpenAIService:
     async def get_chat_suggestions(self, partial_message: str) -> List[str]:
         """Obtenir des suggestions de complétion pour un message partiel"""
         try:
-            # Trouver des questions similaires
-            similar = self.nlp_service.find_similar_questions(partial_message, limit=5)
-            
-            # Obtenir les questions fréquentes
-            frequent = await QuestionStatsService.get_frequent_questions(limit=5)
-            
-            # Combiner et filtrer les suggestions
-            suggestions = []
-            
-            # Ajouter les questions similaires
-            for q in similar:
-                if q["similarity"] > 0.3:
-                    suggestions.append(q["question"])
-            
-            # Ajouter les questions fréquentes si pas assez de similaires
-            if len(suggestions) < 3:
-                for q in frequent:
-                    if q["question"] not in suggestions:
-                        suggestions.append(q["question"])
-                        if len(suggestions) >= 5:
-                            break
-            
-            return suggestions[:5]
+            # Index de préfixes en mémoire : pas de calcul par frappe
+            return await QuestionStatsService.get_suggestions(partial_message, limit=5)
             
         except Exception as e:
             logger.error(f"Erreur lors de la génération de suggestions: {e}")
@@ -0,0 +1,65 @@
+"""Groupes de patterns compilés pour l'analyse des questions
+
+Chaque groupe (patterns d'une intention, d'un type d'entité) est compilé une
+fois et peut déclarer des mots-clés : des sous-chaînes en minuscules dont au
+moins une figure nécessairement dans tout texte où l'un des patterns
+correspond. Un test d'inclusion de ces mots-clés dans le texte en minuscules
+(quelques dizaines de nanosecondes) écarte le groupe avant toute recherche
+d'expression régulière, ce qui est le cas de la plupart des groupes pour une
+question donnée. Les patterns ne sont évalués qu'ensuite, dans leur ordre,
+ce qui conserve exactement les résultats de re.search / re.findall pattern
+par pattern.
+
+Une alternance combinée de tous les patterns d'un groupe a été écartée :
+le moteur re n'optimise pas les alternances (pas de recherche de préfixe
+littéral) et la recherche combinée est plus lente que la somme des
+recherches individuelles.
+"""
+import re
+from typing import List, Optional, Pattern, Sequence
+
+
+class PatternGroup:
+    """Patterns compilés d'un groupe, précédés d'un filtre par mots-clés"""
+
+    def __init__(self, patterns: List[str], flags: int = 0, keywords: Optional[Sequence[str]] = None):
+        self.patterns: List[Pattern] = [re.compile(pattern, flags) for pattern in patterns]
+        self.keywords = tuple(keyword.lower() for keyword in keywords) if keywords else None
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def candidate(self, text: str) -> bool:
+        """Un des patterns peut correspondre (faux : aucun ne correspond)"""
+        if self.keywords is None:
+            return True
+        text = text.lower()
+        for keyword in self.keywords:
+            if keyword in text:
+                return True
+        return False
+
+    def count(self, text: str) -> int:
+        """Nombre de patterns du groupe présents dans le texte"""
+        if not self.candidate(text):
+            return 0
+        return sum(1 for pattern in self.patterns if pattern.search(text))
+
+    def first(self, text: str) -> Optional[re.Match]:
+        """Correspondance du premier pattern (dans l'ordre du groupe) présent"""
+        if not self.candidate(text):
+            return None
+        for pattern in self.patterns:
+            match = pattern.search(text)
+            if match:
+                return match
+        return None
+
+    def findall(self, text: str) -> List:
+        """Résultats de findall de chaque pattern, mis bout à bout"""
+        if not self.candidate(text):
+            return []
+        results = []
+        for pattern in self.patterns:
+            results.extend(pattern.findall(text))
+        return results
@@ -0,0 +1,102 @@
+"""Profil et banc d'essai du démarrage de l'application
+
+Profil : « python -X importtime -c 'import main' » dans un interpréteur
+neuf, temps propre de chaque module regroupé par paquet de premier niveau,
+et modules les plus coûteux (temps cumulé, imports compris).
+
+Banc d'essai : sur plusieurs interpréteurs neufs, temps médian et minimal
+de l'interpréteur seul, de l'import de l'application et de la première
+analyse de question (service NLP prêt), chacun mesuré depuis le lancement
+du processus.
+
+Usage :
+    python profile_startup.py [--module main] [--runs 5] [--top 15]
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+from collections import defaultdict
+from statistics import median
+from typing import Dict, List, Tuple
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+# Première analyse : registre de services, patterns et modèle d'intentions chargés
+FIRST_ANALYSIS = (
+    "from services import get_nlp_service; "
+    "get_nlp_service().analyze_question('Qui a fait un DROP sur la table CLIENTS hier ?')"
+)
+
+
+def import_times(module: str) -> List[Tuple[str, int, int]]:
+    """(module, temps propre, temps cumulé) en microsecondes, dans l'ordre de -X importtime"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=DIRECTORY, capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def by_package(rows: List[Tuple[str, int, int]]) -> Dict[str, int]:
+    """Temps propre total par paquet de premier niveau"""
+    totals: Dict[str, int] = defaultdict(int)
+    for name, self_us, _ in rows:
+        totals[name.split(".")[0]] += self_us
+    return totals
+
+
+def timed_run(code: str) -> float:
+    """Durée (secondes) d'un interpréteur neuf exécutant code, lancement compris"""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], cwd=DIRECTORY, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def benchmark(module: str, runs: int) -> Dict[str, List[float]]:
+    steps = {
+        "interpréteur": "pass",
+        f"import {module}": f"import {module}",
+        "première analyse": f"import {module}; {FIRST_ANALYSIS}",
+    }
+    # Un premier passage non mesuré remplit le cache de bytecode et celui du système de fichiers
+    timed_run(f"import {module}")
+    return {label: [timed_run(code) for _ in range(runs)] for label, code in steps.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profil des imports et durée du démarrage")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    rows = import_times(args.module)
+    total = next((cumulative for name, _, cumulative in rows if name == args.module), 0)
+    print(f"import {args.module}: {total / 1000:.0f} ms ({len(rows)} modules)")
+
+    print(f"\n{'paquet':<28}{'temps propre':>14}{'part':>8}")
+    packages = sorted(by_package(rows).items(), key=lambda item: item[1], reverse=True)
+    for package, self_us in packages[:args.top]:
+        share = self_us / total * 100 if total else 0.0
+        print(f"{package:<28}{self_us / 1000:>11.1f} ms{share:>7.1f}%")
+
+    print(f"\n{'module':<44}{'cumulé':>12}")
+    for name, _, cumulative_us in sorted(rows, key=lambda row: row[2], reverse=True)[:args.top]:
+        print(f"{name:<44}{cumulative_us / 1000:>9.1f} ms")
+
+    print(f"\n{'étape':<28}{'médiane':>10}{'min':>10}  ({args.runs} processus)")
+    for label, durations in benchmark(args.module, args.runs).items():
+        print(f"{label:<28}{median(durations) * 1000:>7.0f} ms{min(durations) * 1000:>7.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
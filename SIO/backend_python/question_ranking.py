@@ -0,0 +1,99 @@
+"""Classement en mémoire des questions les plus fréquentes
+
+Les compteurs des capacity questions les plus posées sont chargés depuis le
+backend au démarrage puis incrémentés à chaque question. Après chaque mise
+à jour, le classement est publié sous forme d'un tuple immuable : les
+lectures (suggestions à chaque frappe) ne prennent aucun verrou et coûtent
+O(k). Une question absente du classement remplace la moins posée et hérite
+de son compteur (Space-Saving) ; la resynchronisation périodique avec le
+backend corrige cette surestimation.
+"""
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+# (question affichée, forme canonique, nombre, dernière date, variations)
+RankedQuestion = Tuple[str, str, int, Optional[str], Tuple[str, ...]]
+
+
+class FrequentQuestions:
+    """Top-k incrémental des questions, lu sans verrou"""
+
+    def __init__(self, capacity: int = 200, max_variations: int = 10):
+        self.capacity = capacity
+        self.max_variations = max_variations
+        self._lock = threading.Lock()
+        # forme canonique -> [nombre, question affichée, dernière date, variations]
+        self._entries: Dict[str, List[Any]] = {}
+        self._ranking: Tuple[RankedQuestion, ...] = ()
+        # Questions comptées pendant un rechargement, réappliquées ensuite
+        self._during_load: Optional[List[Tuple[str, str, str]]] = None
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self._ranking)
+
+    def record(self, normalized: str, question: str, asked_at: str):
+        """Compter une question posée"""
+        with self._lock:
+            if self._during_load is not None:
+                self._during_load.append((normalized, question, asked_at))
+            self._count(normalized, question, asked_at)
+            self._publish()
+
+    def _count(self, normalized: str, question: str, asked_at: str):
+        entry = self._entries.get(normalized)
+        if entry is None:
+            floor = 0
+            if len(self._entries) >= self.capacity:
+                # Capacité de quelques centaines : recherche linéaire du minimum
+                victim = min(self._entries, key=lambda key: self._entries[key][0])
+                floor = self._entries.pop(victim)[0]
+            entry = self._entries[normalized] = [floor, question, asked_at, []]
+
+        entry[0] += 1
+        entry[2] = asked_at
+        if question not in entry[3] and len(entry[3]) < self.max_variations:
+            entry[3].append(question)
+
+    def begin_load(self):
+        """Marquer le début d'un rechargement : les questions comptées d'ici à load()
+        seront réappliquées au classement chargé"""
+        with self._lock:
+            self._during_load = []
+
+    def load(self, questions: List[Dict[str, Any]]):
+        """Remplacer le classement par celui du backend (format de frequent_questions)"""
+        with self._lock:
+            self._entries = {
+                row["normalized_question"]: [
+                    row["count"], row["question"], row["last_asked"],
+                    list(row["variations"][:self.max_variations])
+                ]
+                for row in questions[:self.capacity]
+            }
+            for normalized, question, asked_at in self._during_load or []:
+                self._count(normalized, question, asked_at)
+            self._during_load = None
+            self._publish()
+            self.loaded = True
+
+    def _publish(self):
+        ranked = sorted(self._entries.items(), key=lambda item: item[1][0], reverse=True)
+        self._ranking = tuple(
+            (display, normalized, count, last_asked, tuple(variations))
+            for normalized, (count, display, last_asked, variations) in ranked
+        )
+
+    def top(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Questions les plus fréquentes (lecture d'un instantané, sans verrou)"""
+        ranking = self._ranking
+        return [
+            {
+                "question": display,
+                "normalized_question": normalized,
+                "count": count,
+                "last_asked": last_asked,
+                "variations": list(variations)
+            }
+            for display, normalized, count, last_asked, variations in ranking[:limit]
+        ]
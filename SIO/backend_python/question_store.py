@@ -0,0 +1,210 @@
+"""Statistiques des questions : compteur par upsert et variations bornées
+
+question_stats garde une ligne par forme canonique, incrémentée par un
+INSERT ... ON CONFLICT DO UPDATE. Les formulations rencontrées vont dans la
+table fille question_variations, bornée à max_variations lignes par
+question selon l'algorithme Space-Saving : une nouvelle formulation
+remplace la moins vue et hérite de son compteur. Le coût d'une mise à jour
+ne dépend plus de la popularité de la question.
+"""
+import json
+import sqlite3
+from typing import Any, Callable, Dict, List, Tuple
+
+
+def _record_variation(conn: sqlite3.Connection, question_id: int, variation: str, count: int,
+                      seen_at: str, max_variations: int):
+    updated = conn.execute(
+        """UPDATE question_variations SET count = count + ?, last_seen = ?
+           WHERE question_id = ? AND variation = ?""",
+        (count, seen_at, question_id, variation)
+    ).rowcount
+    if updated:
+        return
+
+    # Au plus max_variations lignes : comptage et minimum bornés, sur index
+    stored = conn.execute(
+        "SELECT COUNT(*) FROM question_variations WHERE question_id = ?", (question_id,)
+    ).fetchone()[0]
+    floor = 0
+    if stored >= max_variations:
+        victim = conn.execute(
+            """SELECT variation, count FROM question_variations
+               WHERE question_id = ? ORDER BY count, last_seen LIMIT 1""",
+            (question_id,)
+        ).fetchone()
+        conn.execute(
+            "DELETE FROM question_variations WHERE question_id = ? AND variation = ?",
+            (question_id, victim[0])
+        )
+        floor = victim[1]
+
+    conn.execute(
+        """INSERT INTO question_variations (question_id, variation, count, last_seen)
+           VALUES (?, ?, ?, ?)""",
+        (question_id, variation, floor + count, seen_at)
+    )
+
+
+def upsert_questions(conn: sqlite3.Connection, updates: Dict[str, Dict[str, Any]], max_variations: int):
+    """Appliquer les mises à jour fusionnées {forme canonique: {count, last_asked, variations}}"""
+    for normalized, update in updates.items():
+        variations: Dict[str, int] = update["variations"]
+        # La forme canonique n'est pas lisible : la première formulation est affichée
+        display = next(iter(variations), None)
+        question_id = conn.execute(
+            """INSERT INTO question_stats (normalized_question, display_question, count, last_asked)
+               VALUES (?, ?, ?, ?)
+               ON CONFLICT(normalized_question) DO UPDATE SET
+                   count = count + excluded.count,
+                   last_asked = excluded.last_asked,
+                   display_question = COALESCE(display_question, excluded.display_question)
+               RETURNING id""",
+            (normalized, display, update["count"], update["last_asked"])
+        ).fetchone()[0]
+
+        for variation, count in variations.items():
+            _record_variation(conn, question_id, variation, count, update["last_asked"], max_variations)
+
+
+def top_questions(conn: sqlite3.Connection, limit: int) -> List[Dict[str, Any]]:
+    """Questions les plus posées et leurs formulations les plus vues"""
+    rows = conn.execute(
+        """SELECT id, normalized_question, display_question, count, last_asked
+           FROM question_stats
+           ORDER BY count DESC
+           LIMIT ?""",
+        (limit,)
+    ).fetchall()
+    if not rows:
+        return []
+
+    variations: Dict[int, List[str]] = {row[0]: [] for row in rows}
+    placeholders = ",".join("?" * len(rows))
+    for question_id, variation in conn.execute(
+        f"""SELECT question_id, variation FROM question_variations
+            WHERE question_id IN ({placeholders})
+            ORDER BY count DESC, last_seen DESC""",
+        list(variations)
+    ):
+        variations[question_id].append(variation)
+
+    return [
+        {
+            "question": display or normalized,
+            "normalized_question": normalized,
+            "count": count,
+            "last_asked": last_asked,
+            "variations": variations[question_id]
+        }
+        for question_id, normalized, display, count, last_asked in rows
+    ]
+
+
+def all_variations(conn: sqlite3.Connection) -> List[Tuple[str, List[str], int]]:
+    """(forme canonique, formulations, nombre) de chaque question enregistrée"""
+    rows = conn.execute(
+        """SELECT q.normalized_question, COALESCE(q.display_question, q.normalized_question), q.count, v.variation
+           FROM question_stats q LEFT JOIN question_variations v ON v.question_id = q.id
+           ORDER BY q.id"""
+    ).fetchall()
+    questions: Dict[str, Tuple[str, List[str], int]] = {}
+    for normalized, display, count, variation in rows:
+        entry = questions.setdefault(normalized, (normalized, [], count or 1))
+        entry[1].append(variation if variation is not None else display)
+    return list(questions.values())
+
+
+def migrate_json_variations(conn: sqlite3.Connection, max_variations: int) -> int:
+    """Reporter les anciens tableaux JSON question_stats.variations dans la table fille
+
+    Migration unique : la colonne est vidée une fois reportée.
+    """
+    rows = conn.execute(
+        "SELECT id, last_asked, variations FROM question_stats WHERE variations IS NOT NULL"
+    ).fetchall()
+    for question_id, last_asked, variations in rows:
+        try:
+            items = json.loads(variations)
+        except ValueError:
+            items = []
+        conn.executemany(
+            """INSERT OR IGNORE INTO question_variations (question_id, variation, count, last_seen)
+               VALUES (?, ?, 1, ?)""",
+            [(question_id, str(item), last_asked) for item in items[:max_variations]]
+        )
+    conn.execute("UPDATE question_stats SET variations = NULL WHERE variations IS NOT NULL")
+    return len(rows)
+
+
+def migrate_normalized_questions(conn: sqlite3.Connection, version: int, normalize: Callable[[str], str],
+                                 max_variations: int) -> int:
+    """Recalculer les formes canoniques enregistrées par une autre version de la normalisation
+
+    Migration unique par version (cache_meta.normalizer_version). Chaque
+    question est renormalisée à partir de sa formulation la plus vue ; les
+    lignes qui partagent désormais une forme sont fusionnées dans la plus
+    posée (comptes sommés, dernière date, variations réunies). Les résultats
+    de query_cache, indexés par les anciennes clés, sont supprimés.
+    Retourne le nombre de questions dont la forme a changé.
+    """
+    stored = conn.execute("SELECT value FROM cache_meta WHERE key = 'normalizer_version'").fetchone()
+    if stored is not None and int(stored[0]) == version:
+        return 0
+
+    rows = conn.execute(
+        """SELECT q.id, q.normalized_question, q.count, q.last_asked,
+                  COALESCE((SELECT v.variation FROM question_variations v WHERE v.question_id = q.id
+                            ORDER BY v.count DESC, v.last_seen DESC LIMIT 1),
+                           q.display_question, q.normalized_question)
+           FROM question_stats q
+           ORDER BY q.count DESC, q.id"""
+    ).fetchall()
+    groups: Dict[str, List[Tuple[int, str, int, str]]] = {}
+    for question_id, normalized, count, last_asked, source in rows:
+        groups.setdefault(normalize(source), []).append((question_id, normalized, count or 0, last_asked))
+
+    changed = 0
+    renamed: List[Tuple[str, int]] = []
+    for key, members in groups.items():
+        # Lignes triées par compte décroissant : la plus posée reçoit les autres
+        survivor_id, survivor_key = members[0][0], members[0][1]
+        for question_id, _, _, _ in members[1:]:
+            for variation, count, last_seen in conn.execute(
+                "SELECT variation, count, last_seen FROM question_variations WHERE question_id = ?",
+                (question_id,)
+            ).fetchall():
+                _record_variation(conn, survivor_id, variation, count, last_seen, max_variations)
+            conn.execute("DELETE FROM question_variations WHERE question_id = ?", (question_id,))
+            conn.execute("DELETE FROM question_stats WHERE id = ?", (question_id,))
+        if len(members) > 1:
+            display = conn.execute(
+                """SELECT variation FROM question_variations WHERE question_id = ?
+                   ORDER BY count DESC, last_seen DESC LIMIT 1""",
+                (survivor_id,)
+            ).fetchone()
+            conn.execute(
+                """UPDATE question_stats
+                   SET count = ?, last_asked = ?, display_question = COALESCE(?, display_question)
+                   WHERE id = ?""",
+                (sum(member[2] for member in members),
+                 max((member[3] for member in members if member[3] is not None), default=None),
+                 display[0] if display else None, survivor_id)
+            )
+        if key != survivor_key or len(members) > 1:
+            changed += len(members)
+        if key != survivor_key:
+            renamed.append((key, survivor_id))
+
+    # Clés temporaires d'abord : une nouvelle forme peut être l'ancienne d'une autre ligne
+    conn.executemany("UPDATE question_stats SET normalized_question = '#' || id WHERE id = ?",
+                     [(question_id,) for _, question_id in renamed])
+    conn.executemany("UPDATE question_stats SET normalized_question = ? WHERE id = ?", renamed)
+
+    conn.execute("DELETE FROM query_cache")
+    conn.execute(
+        """INSERT INTO cache_meta (key, value) VALUES ('normalizer_version', ?)
+           ON CONFLICT(key) DO UPDATE SET value = excluded.value""",
+        (str(version),)
+    )
+    return changed
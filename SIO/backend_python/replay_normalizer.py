@@ -0,0 +1,83 @@
+"""Rejeu hors ligne des formulations enregistrées avec l'ancienne et la nouvelle normalisation
+
+Les formulations stockées dans question_variations sont ré-normalisées pour mesurer
+le taux de hit qu'aurait obtenu le cache. Chaque clé distincte coûte un
+miss (cache froid, sans expiration) ; les autres occurrences sont des hits :
+
+    taux de hit = 1 - clés distinctes / questions posées
+
+Usage :
+    python replay_normalizer.py [--db ./cache/chatbot_cache.db] [--examples 10]
+"""
+import sqlite3
+import argparse
+from collections import defaultdict
+from typing import Dict, List, Set, Tuple
+from config import settings
+from text_normalizer import normalize_question
+from question_store import all_variations
+
+
+def legacy_normalize(question: str) -> str:
+    """Normalisation historique de CacheService.normalize_query"""
+    return question.lower().strip().replace("  ", " ")
+
+
+def load_variations(db_path: str) -> List[Tuple[List[str], int]]:
+    """(formulations, nombre de questions posées) par question enregistrée"""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        return [(variations, count) for _, variations, count in all_variations(conn)]
+    finally:
+        conn.close()
+
+
+def replay(rows: List[Tuple[List[str], int]]) -> Dict[str, object]:
+    """Taux de hit des deux normalisations sur les mêmes questions"""
+    total = 0
+    legacy_keys: Set[str] = set()
+    groups: Dict[str, Set[str]] = defaultdict(set)
+
+    for variations, count in rows:
+        # Une ligne compte au moins autant de questions que de formulations distinctes
+        total += max(count, len(variations))
+        for question in variations:
+            legacy_keys.add(legacy_normalize(question))
+            groups[normalize_question(question)].add(question)
+
+    def _hit_rate(distinct: int) -> float:
+        return (1 - distinct / total) * 100 if total else 0.0
+
+    merged = sorted(
+        (sorted(questions) for questions in groups.values() if len(questions) > 1),
+        key=len, reverse=True
+    )
+    return {
+        "questions": total,
+        "legacy_keys": len(legacy_keys),
+        "canonical_keys": len(groups),
+        "legacy_hit_rate": _hit_rate(len(legacy_keys)),
+        "canonical_hit_rate": _hit_rate(len(groups)),
+        "merged_groups": merged
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rejeu des formulations avec la normalisation canonique")
+    parser.add_argument("--db", default=settings.sqlite_db_path)
+    parser.add_argument("--examples", type=int, default=10)
+    args = parser.parse_args()
+
+    report = replay(load_variations(args.db))
+    print(f"{report['questions']} questions posées")
+    print(f"{'normalisation':<14}{'clés':>8}{'taux de hit':>14}")
+    print(f"{'historique':<14}{report['legacy_keys']:>8}{report['legacy_hit_rate']:>13.1f}%")
+    print(f"{'canonique':<14}{report['canonical_keys']:>8}{report['canonical_hit_rate']:>13.1f}%")
+    print(f"Gain : {report['canonical_hit_rate'] - report['legacy_hit_rate']:+.1f} points")
+
+    for questions in report["merged_groups"][:args.examples]:
+        print("\n  " + "\n  ".join(questions))
+
+
+if __name__ == "__main__":
+    main()
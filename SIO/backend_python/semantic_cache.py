@@ -0,0 +1,151 @@
+"""Cache sémantique des réponses du chatbot (questions reformulées)"""
+import re
+import json
+import time
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from models import QueryAnalysis
+from text_features import char_ngrams, cosine
+
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+
+
+def _prepare(text: str) -> str:
+    """Minuscules, sans accents ni ponctuation"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return _SPACES.sub(" ", _PUNCTUATION.sub(" ", text)).strip()
+
+
+def entity_signature(analysis: QueryAnalysis) -> str:
+    """Signature de l'intention et des entités : deux questions ne peuvent
+    partager une réponse que si elles portent sur les mêmes entités"""
+    entities = {}
+    for key, value in analysis.entities.items():
+        if key == "timeframe":
+            # Bornes calculées à l'instant de l'analyse : seule la période compte
+            entities[key] = value.get("period")
+        elif isinstance(value, list):
+            entities[key] = sorted(str(v).lower() for v in value)
+        else:
+            entities[key] = str(value).lower()
+    return json.dumps({"intent": analysis.intent, "entities": entities}, sort_keys=True)
+
+
+class SemanticCache:
+    """Cache des réponses indexé par similarité cosinus entre questions
+
+    Les questions sont vectorisées par n-grammes de caractères hachés
+    (text_features : pas d'apprentissage de vocabulaire, ajout incrémental,
+    sans scikit-learn) et regroupées par
+    signature d'entités : seule la poignée de questions partageant les mêmes
+    entités est comparée à la question entrante.
+    """
+
+    def __init__(self, threshold: float = 0.5, max_entries: int = 5000,
+                 ttl_seconds: Optional[float] = None):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # signature -> OrderedDict(question préparée -> (vecteur, réponse, expiration))
+        self._buckets: Dict[str, "OrderedDict[str, Tuple[Any, Dict[str, Any], Optional[float]]]"] = {}
+        # Ordre d'utilisation global pour l'éviction LRU
+        self._lru: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._lru)
+
+    @staticmethod
+    def _vectorize(prepared: str) -> Tuple[Any, Any]:
+        """(colonnes, valeurs) des n-grammes de 3 à 5 caractères, mots encadrés d'espaces"""
+        _, columns, values = char_ngrams([f" {prepared} "], 2 ** 18, (3, 5), sublinear=False)
+        return columns, values
+
+    def lookup(self, question: str, analysis: QueryAnalysis) -> Optional[Dict[str, Any]]:
+        """Réponse d'une question similaire aux mêmes entités, si au-dessus du seuil"""
+        signature = entity_signature(analysis)
+        prepared = _prepare(question)
+
+        with self._lock:
+            bucket = self._buckets.get(signature)
+            if not bucket:
+                self.misses += 1
+                return None
+            candidates = list(bucket.items())
+
+        vector = self._vectorize(prepared)
+        now = time.monotonic()
+        best_question, best_score, best_response = None, 0.0, None
+        for candidate, (candidate_vector, response, expires_at) in candidates:
+            if expires_at is not None and expires_at <= now:
+                continue
+            score = cosine(vector, candidate_vector)
+            if score > best_score:
+                best_question, best_score, best_response = candidate, score, response
+
+        with self._lock:
+            if best_response is None or best_score < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if (signature, best_question) in self._lru:
+                self._lru.move_to_end((signature, best_question))
+
+        return {"response": best_response, "similarity": best_score, "matched_question": best_question}
+
+    def add(self, question: str, analysis: QueryAnalysis, response: Dict[str, Any]):
+        """Enregistrer la réponse d'une question"""
+        signature = entity_signature(analysis)
+        prepared = _prepare(question)
+        vector = self._vectorize(prepared)
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+
+        with self._lock:
+            self._buckets.setdefault(signature, OrderedDict())[prepared] = (vector, response, expires_at)
+            self._lru[(signature, prepared)] = None
+            self._lru.move_to_end((signature, prepared))
+
+            while len(self._lru) > self.max_entries:
+                (old_signature, old_question), _ = self._lru.popitem(last=False)
+                self._discard(old_signature, old_question)
+
+    def _discard(self, signature: str, prepared: str):
+        bucket = self._buckets.get(signature)
+        if bucket is not None:
+            bucket.pop(prepared, None)
+            if not bucket:
+                del self._buckets[signature]
+
+    def invalidate(self, question: str):
+        """Retirer une question, quelle que soit sa signature"""
+        prepared = _prepare(question)
+        with self._lock:
+            for signature, candidate in [key for key in self._lru if key[1] == prepared]:
+                del self._lru[(signature, candidate)]
+                self._discard(signature, candidate)
+
+    def clear(self):
+        """Vider le cache sémantique"""
+        with self._lock:
+            self._buckets.clear()
+            self._lru.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Statistiques du cache sémantique"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._lru),
+            "signatures": len(self._buckets),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) * 100 if lookups else 0.0
+        }
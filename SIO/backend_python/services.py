@@ -0,0 +1,44 @@
+"""Registre des services partagés de l'application
+
+Un seul NLPService (patterns compilés) et un seul OpenAIService par
+processus, créés au premier accès : l'API, le pool NLP, la normalisation
+des questions et les outils en ligne de commande utilisent les mêmes
+instances. Le registre n'importe pas lui-même les modules des services,
+ce qui évite les imports circulaires (text_normalizer, nlp_service) ; ces
+modules restent importés au démarrage par main.py, cache_service et
+nlp_executor. Seuls scikit-learn, SciPy et openai sont différés jusqu'au
+premier usage.
+"""
+import threading
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from nlp_service import NLPService
+    from openai_service import OpenAIService
+
+# Réentrant : la création d'un service peut demander un autre service du registre
+_lock = threading.RLock()
+_nlp_service: Optional["NLPService"] = None
+_openai_service: Optional["OpenAIService"] = None
+
+
+def get_nlp_service() -> "NLPService":
+    """NLPService partagé"""
+    global _nlp_service
+    if _nlp_service is None:
+        with _lock:
+            if _nlp_service is None:
+                from nlp_service import NLPService
+                _nlp_service = NLPService()
+    return _nlp_service
+
+
+def get_openai_service() -> "OpenAIService":
+    """OpenAIService partagé"""
+    global _openai_service
+    if _openai_service is None:
+        with _lock:
+            if _openai_service is None:
+                from openai_service import OpenAIService
+                _openai_service = OpenAIService()
+    return _openai_service
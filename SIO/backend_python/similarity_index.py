@@ -0,0 +1,363 @@
+"""Index persistant de similarité entre questions (TF-IDF)
+
+Le vocabulaire et les poids IDF sont appris par un ajustement complet
+(TfidfVectorizer) sur toutes les questions enregistrées. Les vecteurs,
+normalisés L2, sont rangés par terme (listes inversées) : une recherche ne
+parcourt que les questions partageant un terme avec la question posée,
+puis extrait le top-k par argpartition.
+
+Les nouvelles questions sont vectorisées avec le vocabulaire courant et
+ajoutées à un segment incrémental, fusionné par lots dans les listes
+inversées ; les termes inconnus sont pris en compte au réajustement
+suivant, exécuté en arrière-plan. L'index est sauvegardé sur disque
+(fichier .npz compressé) et rechargé au démarrage.
+"""
+import os
+import re
+import math
+import threading
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from loguru import logger
+from config import settings
+
+# Mots vides français, sans accents (l'analyseur retire les accents avant de filtrer)
+FRENCH_STOP_WORDS = frozenset("""
+a ai aie aient aies ait alors as au aucun aucune aupres aura aurai auraient aurais aurait auras aurez
+auriez aurions aurons auront aussi autre aux avaient avais avait avant avec avez aviez avions avoir
+avons ayant ayez ayons bon c ca car ce ceci cela celle celles celui cependant ces cet cette ceux
+chaque ci comme comment d dans de des deja depuis doit donc dont du elle elles en encore entre es
+est et etaient etais etait etant etc ete etes etiez etions etre eu eue eues eurent eus eusse eut
+eux fait faut fois furent fus fut ici il ils j je jusqu l la le les leur leurs lui m ma mais me
+meme memes mes moi mon n ne ni nos notre nous on ont ou par parce pas peu peut plus pour pourquoi
+qu quand que quel quelle quelles quels qui s sa sans se sera serai seraient serais serait seras
+serez seriez serions serons seront ses si sien son sont sous soyez soyons suis sur t ta te tes toi
+ton tous tout toute toutes tres tu un une unes uns vos votre vous y
+""".split())
+
+MIN_SIMILARITY = 0.1
+
+
+class _Postings:
+    """Listes inversées termes x questions au format CSR, en tableaux NumPy
+
+    La ligne t (data[indptr[t]:indptr[t + 1]], mêmes bornes dans indices)
+    donne les questions contenant le terme t et leur poids. SciPy n'est
+    importé que par l'ajustement, pas au chargement ni à la recherche.
+    """
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, data: np.ndarray, shape: Tuple[int, int]):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.shape = shape
+
+    @classmethod
+    def empty(cls, size: int) -> "_Postings":
+        return cls(np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32),
+                   (0, size))
+
+
+class _IndexState:
+    """Vocabulaire figé, listes inversées et segment incrémental"""
+
+    def __init__(self, vocabulary: Dict[str, int], idf: np.ndarray, postings: _Postings,
+                 keys: List[str], questions: List[str], counts: List[int]):
+        self.vocabulary = vocabulary
+        self.idf = idf
+        # termes x questions : ligne t = questions contenant le terme t et leur poids
+        self.postings = postings
+        self.keys = keys
+        self.questions = questions
+        self.counts = counts
+        self.positions = {key: position for position, key in enumerate(keys)}
+        # Questions ajoutées depuis la dernière fusion : terme -> [(position, poids)]
+        self.delta: Dict[int, List[Tuple[int, float]]] = {}
+        self.delta_rows: List[Tuple[np.ndarray, np.ndarray]] = []
+        self.appended_since_fit = 0
+
+
+_TOKEN = re.compile(r"(?u)\b\w\w+\b")
+
+
+def _analyze(text: str) -> List[str]:
+    """Termes de la question : minuscules, accents retirés, mots d'au moins deux lettres hors mots vides
+
+    Même découpage que l'analyseur par défaut de TfidfVectorizer
+    (strip_accents="unicode"), sans importer scikit-learn hors réajustement.
+    """
+    text = text.lower()
+    if not text.isascii():
+        text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+    return [term for term in _TOKEN.findall(text) if term not in FRENCH_STOP_WORDS]
+
+
+def _pack_strings(strings: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """(octets UTF-8 concaténés, bornes de chaque chaîne) pour la sauvegarde"""
+    encoded = [string.encode("utf-8") for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(item) for item in encoded])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _unpack_strings(saved: Any, name: str) -> List[str]:
+    """Chaînes sauvegardées par _pack_strings (ou tableau de chaînes des anciens fichiers)"""
+    if f"{name}_offsets" not in saved.files:
+        return saved[name].tolist()
+    raw = saved[name].tobytes()
+    offsets = saved[f"{name}_offsets"].tolist()
+    return [raw[start:end].decode("utf-8") for start, end in zip(offsets, offsets[1:])]
+
+
+class SimilarityIndex:
+    """Recherche des questions enregistrées les plus proches d'une question"""
+
+    def __init__(self, path: Optional[str] = None, merge_threshold: int = 1000):
+        self.path = path
+        self.merge_threshold = merge_threshold
+        self._lock = threading.Lock()
+        self._analyze = _analyze
+        self._state: Optional[_IndexState] = None
+        self._during_fit: Optional[List[Tuple[str, str]]] = None
+
+    def __len__(self) -> int:
+        state = self._state
+        return len(state.keys) if state else 0
+
+    @property
+    def ready(self) -> bool:
+        return self._state is not None
+
+    # ------------------------------------------------------------------
+    # Vectorisation
+    # ------------------------------------------------------------------
+
+    def _vectorize(self, state: _IndexState, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(colonnes, poids) du vecteur TF-IDF normalisé, vocabulaire figé"""
+        counts = Counter(
+            state.vocabulary[term] for term in self._analyze(text) if term in state.vocabulary
+        )
+        if not counts:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        columns = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        # Même pondération que l'ajustement : tf sous-linéaire x idf, norme L2
+        weights = np.fromiter((1 + math.log(c) for c in counts.values()), dtype=float, count=len(counts))
+        weights *= state.idf[columns]
+        weights /= np.linalg.norm(weights)
+        return columns, weights
+
+    # ------------------------------------------------------------------
+    # Ajustement, ajout, fusion
+    # ------------------------------------------------------------------
+
+    def begin_fit(self):
+        """Marquer le début d'un réajustement : les questions ajoutées d'ici à
+        fit() seront réappliquées au nouvel index"""
+        with self._lock:
+            self._during_fit = []
+
+    def fit(self, questions: List[Tuple[str, str, int]]):
+        """Réajuster le vocabulaire sur (forme canonique, question affichée, nombre)
+
+        Calcul complet, prévu pour un thread d'arrière-plan ; l'index courant
+        reste interrogeable jusqu'à la substitution.
+        """
+        # Import différé : scikit-learn (≈ 1 s d'import) n'est requis que pour l'ajustement
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        vectorizer = TfidfVectorizer(analyzer=_analyze, sublinear_tf=True, norm="l2", dtype=np.float32)
+        keys = [key for key, _, _ in questions]
+        texts = [question for _, question, _ in questions]
+        try:
+            matrix = vectorizer.fit_transform(texts).T.tocsr()
+            postings = _Postings(matrix.indptr, matrix.indices, matrix.data, matrix.shape)
+            vocabulary = {term: int(column) for term, column in vectorizer.vocabulary_.items()}
+            idf = vectorizer.idf_.astype(np.float32)
+        except ValueError:
+            # Aucune question ou vocabulaire vide
+            postings = _Postings.empty(len(keys))
+            vocabulary, idf = {}, np.empty(0, dtype=np.float32)
+
+        state = _IndexState(
+            vocabulary, idf, postings, keys, texts, [count for _, _, count in questions]
+        )
+        with self._lock:
+            for key, question in self._during_fit or []:
+                self._append(state, key, question)
+            self._during_fit = None
+            self._state = state
+
+    def _append(self, state: _IndexState, key: str, question: str):
+        position = state.positions.get(key)
+        if position is not None:
+            state.counts[position] += 1
+            return
+
+        columns, weights = self._vectorize(state, question)
+        position = len(state.keys)
+        state.keys.append(key)
+        state.questions.append(question)
+        state.counts.append(1)
+        state.positions[key] = position
+        state.delta_rows.append((columns, weights))
+        for column, weight in zip(columns.tolist(), weights.tolist()):
+            state.delta.setdefault(column, []).append((position, weight))
+        state.appended_since_fit += 1
+
+        if len(state.delta_rows) >= self.merge_threshold:
+            self._merge(state)
+
+    @staticmethod
+    def _merged_postings(state: _IndexState) -> _Postings:
+        """Listes inversées incluant le segment incrémental"""
+        rows = state.delta_rows
+        if not rows:
+            return state.postings
+        postings = state.postings
+        terms_count, size = postings.shape
+        # Triplets (terme, question, poids) existants puis ajoutés, regroupés par terme
+        terms = np.concatenate([
+            np.repeat(np.arange(terms_count, dtype=np.int64), np.diff(postings.indptr))
+        ] + [cols for cols, _ in rows])
+        positions = np.concatenate([
+            postings.indices.astype(np.int64),
+            np.repeat(np.arange(size, size + len(rows), dtype=np.int64), [len(cols) for cols, _ in rows])
+        ])
+        data = np.concatenate([postings.data] + [weights.astype(np.float32) for _, weights in rows])
+        # Tri stable : dans chaque liste, les questions restent par position croissante
+        order = np.argsort(terms, kind="stable")
+        indptr = np.zeros(terms_count + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(terms, minlength=terms_count))
+        return _Postings(indptr, positions[order], data[order], (terms_count, size + len(rows)))
+
+    def _merge(self, state: _IndexState):
+        """Fusionner le segment incrémental dans les listes inversées"""
+        state.postings = self._merged_postings(state)
+        state.delta, state.delta_rows = {}, []
+
+    def add(self, key: str, question: str):
+        """Ajouter (ou recompter) une question"""
+        with self._lock:
+            if self._during_fit is not None:
+                self._during_fit.append((key, question))
+            if self._state is not None:
+                self._append(self._state, key, question)
+
+    @property
+    def needs_refit(self) -> bool:
+        """Questions ajoutées avec un vocabulaire devenu trop ancien"""
+        state = self._state
+        if state is None:
+            return True
+        return state.appended_since_fit > max(100, len(state.keys) * settings.similarity_refit_ratio)
+
+    # ------------------------------------------------------------------
+    # Recherche
+    # ------------------------------------------------------------------
+
+    def search(self, question: str, limit: int = 5, exclude: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Questions les plus similaires (cosinus), par similarité décroissante"""
+        state = self._state
+        if state is None:
+            return []
+        columns, weights = self._vectorize(state, question)
+        if not len(columns):
+            return []
+        # Recherche possible depuis un worker pendant un ajout : références lues ensemble
+        with self._lock:
+            postings, delta, size = state.postings, state.delta, len(state.keys)
+
+        # Contributions des listes inversées des seuls termes de la question
+        spans = [(postings.indptr[column], postings.indptr[column + 1]) for column in columns.tolist()]
+        indices = np.concatenate([postings.indices[start:end] for start, end in spans])
+        contributions = np.concatenate([
+            postings.data[start:end] * weight for (start, end), weight in zip(spans, weights.tolist())
+        ])
+        scores = np.bincount(indices, weights=contributions, minlength=size)
+        for column, weight in zip(columns.tolist(), weights.tolist()):
+            for position, doc_weight in delta.get(column, ()):
+                if position < size:
+                    scores[position] += weight * doc_weight
+
+        if exclude is not None and exclude in state.positions:
+            scores[state.positions[exclude]] = 0.0
+        candidates = np.flatnonzero(scores > MIN_SIMILARITY)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit)[:limit]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        return [
+            {
+                "question": state.questions[position],
+                "normalized_question": state.keys[position],
+                "count": state.counts[position],
+                "similarity": float(min(scores[position], 1.0))
+            }
+            for position in candidates.tolist()
+        ]
+
+    # ------------------------------------------------------------------
+    # Persistance
+    # ------------------------------------------------------------------
+
+    def save(self) -> bool:
+        """Écrire l'index sur disque (écriture atomique)"""
+        if not self.path or self._state is None:
+            return False
+        with self._lock:
+            # Copie fusionnée : l'état servi aux recherches n'est pas modifié
+            state = self._state
+            postings = self._merged_postings(state)
+            strings = {
+                "terms": sorted(state.vocabulary, key=state.vocabulary.get),
+                "keys": list(state.keys),
+                "questions": list(state.questions)
+            }
+            arrays = {
+                "idf": state.idf,
+                "data": postings.data,
+                "indices": postings.indices,
+                "indptr": postings.indptr,
+                "shape": np.array(postings.shape),
+                "counts": np.array(state.counts, dtype=np.int64),
+                "appended_since_fit": np.array(state.appended_since_fit)
+            }
+        # UTF-8 concaténé : un tableau numpy de str réserve 4 octets par caractère de la plus longue chaîne
+        for name, values in strings.items():
+            arrays[name], arrays[f"{name}_offsets"] = _pack_strings(values)
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f"{self.path}.tmp.npz"
+        np.savez_compressed(temporary, **arrays)
+        os.replace(temporary, self.path)
+        return True
+
+    def load(self) -> bool:
+        """Recharger l'index sauvegardé"""
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with np.load(self.path, allow_pickle=False) as saved:
+                terms = _unpack_strings(saved, "terms")
+                postings = _Postings(saved["indptr"], saved["indices"], saved["data"],
+                                     tuple(int(n) for n in saved["shape"]))
+                state = _IndexState(
+                    {term: column for column, term in enumerate(terms)}, saved["idf"], postings,
+                    _unpack_strings(saved, "keys"), _unpack_strings(saved, "questions"), saved["counts"].tolist()
+                )
+                state.appended_since_fit = int(saved["appended_since_fit"])
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning(f"Index de similarité illisible, réajustement nécessaire: {e}")
+            return False
+
+        with self._lock:
+            self._state = state
+        return True
+
+
+# Instance globale
+similarity_index = SimilarityIndex(path=settings.similarity_index_path)
@@ -0,0 +1,81 @@
+"""Regroupement des calculs concurrents identiques (single-flight)"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from loguru import logger
+
+
+class SingleFlight:
+    """Un seul calcul en cours par clé
+
+    La première requête (meneuse) lance le calcul ; les requêtes identiques
+    qui arrivent pendant ce calcul attendent le même future au lieu de le
+    refaire. Une erreur de la meneuse est propagée à toutes les suiveuses.
+    """
+
+    def __init__(self, name: str = "single_flight"):
+        self.name = name
+        self._calls: Dict[str, asyncio.Future] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self.failures = 0
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]],
+                 timeout: Optional[float] = None) -> Tuple[Any, bool]:
+        """Exécuter func une seule fois pour toutes les requêtes concurrentes sur key
+
+        Retourne (résultat, partagé) : partagé vaut True pour les suiveuses.
+        Lève asyncio.TimeoutError si le résultat n'est pas disponible à temps.
+        """
+        future = self._calls.get(key)
+        if future is not None:
+            self.coalesced += 1
+            try:
+                # shield : le délai d'une suiveuse n'annule pas le calcul partagé
+                return await asyncio.wait_for(asyncio.shield(future), timeout), True
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        self.leaders += 1
+        try:
+            result = await asyncio.wait_for(func(), timeout)
+        except asyncio.CancelledError:
+            self._fail(future, RuntimeError(f"Calcul {self.name} annulé pour {key}"))
+            raise
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                self.timeouts += 1
+            self._fail(future, e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    def _fail(self, future: asyncio.Future, error: BaseException):
+        self.failures += 1
+        future.set_exception(error)
+        # Marquer l'exception comme consultée s'il n'y a aucune suiveuse
+        future.exception()
+        logger.warning(f"{self.name}: échec propagé aux requêtes en attente: {error!r}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Compteurs de regroupement"""
+        requests = self.leaders + self.coalesced
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "coalesced_rate": (self.coalesced / requests) * 100 if requests else 0.0,
+            "timeouts": self.timeouts,
+            "failures": self.failures
+        }
+
+
+# Instance globale pour les questions du chatbot
+chat_flight = SingleFlight("chat")
@@ -0,0 +1,125 @@
+"""Tests de la télémétrie des actions (partitions journalières, agrégats)"""
+import sqlite3
+from datetime import datetime, timedelta
+import pytest
+import pytest_asyncio
+
+from config import settings
+from database import db_manager
+from write_behind import write_queue
+from cache_service import CacheService
+from action_telemetry import LEGACY_ARCHIVE, list_partitions
+
+
+@pytest_asyncio.fixture
+async def telemetry_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "sqlite_db_path", str(tmp_path / "cache" / "test_cache.db"))
+    monkeypatch.setattr(settings, "cache_purge_pause", 0)
+    assert db_manager.connect_sqlite()
+    yield tmp_path
+    await db_manager.close_connections()
+
+
+def _record(action_type, user, timestamp):
+    write_queue.enqueue_action(action_type, user, "{}", timestamp.isoformat())
+
+
+def _count(table):
+    return db_manager.fetch_sqlite_query(f"SELECT COUNT(*) AS n FROM {table}")[0]["n"]
+
+
+@pytest.mark.asyncio
+async def test_actions_go_to_daily_partitions_and_rollups(telemetry_db):
+    now = datetime.utcnow()
+    _record("chat_query", "alice", now)
+    _record("chat_query", "alice", now)
+    _record("chat_query", None, now - timedelta(days=2))
+    await write_queue.flush()
+
+    partitions = list_partitions(db_manager.sqlite_conn)
+
+    assert partitions == sorted({
+        "action_log_" + (now - timedelta(days=2)).strftime("%Y%m%d"),
+        "action_log_" + now.strftime("%Y%m%d")
+    })
+    assert _count(partitions[-1]) == 2
+    minute = db_manager.fetch_sqlite_query(
+        "SELECT user_name, count FROM action_rollup_minute WHERE bucket = ?", (now.isoformat()[:16],)
+    )
+    assert [dict(row) for row in minute] == [{"user_name": "alice", "count": 2}]
+
+
+@pytest.mark.asyncio
+async def test_action_stats_read_rollups_per_timeframe(telemetry_db):
+    now = datetime.utcnow()
+    for _ in range(3):
+        _record("chat_query", "alice", now)
+    _record("cache_hit", "bob", now - timedelta(minutes=30))
+    _record("chat_query", None, now - timedelta(hours=5))
+    _record("chat_query", "bob", now - timedelta(days=3))
+    _record("chat_query", "bob", now - timedelta(days=10))
+    await write_queue.flush()
+
+    hour = await CacheService.get_action_stats("1h")
+    day = await CacheService.get_action_stats("24h")
+    week = await CacheService.get_action_stats("7d")
+
+    assert hour["total_actions"] == 4
+    assert hour["actions_by_type"] == [
+        {"action_type": "chat_query", "count": 3}, {"action_type": "cache_hit", "count": 1}
+    ]
+    assert day["total_actions"] == 5
+    assert day["actions_by_user"] == [{"user_name": "alice", "count": 3}, {"user_name": "bob", "count": 1}]
+    assert week["total_actions"] == 6
+
+
+@pytest.mark.asyncio
+async def test_cleanup_drops_expired_partitions(telemetry_db):
+    now = datetime.utcnow()
+    _record("chat_query", "alice", now - timedelta(days=40))
+    _record("chat_query", "alice", now)
+    await write_queue.flush()
+
+    progress = await CacheService.cleanup_old_cache(max_age_days=30)
+
+    assert progress["dropped_tables"] == ["action_log_" + (now - timedelta(days=40)).strftime("%Y%m%d")]
+    assert list_partitions(db_manager.sqlite_conn) == ["action_log_" + now.strftime("%Y%m%d")]
+    # Agrégats horaires conservés au-delà des partitions brutes
+    assert (await CacheService.get_action_stats("24h"))["total_actions"] == 1
+    assert _count("action_rollup_hour") == 2
+
+
+@pytest.mark.asyncio
+async def test_legacy_action_cache_is_rolled_up_and_archived(telemetry_db, monkeypatch):
+    await db_manager.close_connections()
+    conn = sqlite3.connect(settings.sqlite_db_path)
+    conn.execute('''
+        CREATE TABLE action_cache (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            action_type TEXT NOT NULL,
+            user_name TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            metadata TEXT
+        )
+    ''')
+    recent = (datetime.utcnow() - timedelta(minutes=10)).isoformat()
+    conn.executemany(
+        "INSERT INTO action_cache (action_type, user_name, timestamp) VALUES (?, ?, ?)",
+        [("chat_query", "alice", recent), ("chat_query", None, recent)]
+    )
+    conn.execute("DROP TABLE action_rollup_minute")
+    conn.execute("DROP TABLE action_rollup_hour")
+    conn.commit()
+    conn.close()
+
+    assert db_manager.connect_sqlite()
+    stats = await CacheService.get_action_stats("1h")
+
+    assert stats["total_actions"] == 2
+    assert _count(LEGACY_ARCHIVE) == 2
+    assert not db_manager.fetch_sqlite_query("SELECT name FROM sqlite_master WHERE name = 'action_cache'")
+
+    # Archive supprimée d'un bloc une fois entièrement expirée
+    monkeypatch.setattr(settings, "action_rollup_hour_retention_days", 1)
+    progress = await CacheService.cleanup_old_cache(max_age_days=0)
+    assert LEGACY_ARCHIVE in progress["dropped_tables"]
@@ -0,0 +1,85 @@
+"""Tests de la mémorisation des analyses de questions"""
+from datetime import datetime
+import pytest
+
+import nlp_service
+from nlp_service import NLPService
+from memory_cache import LRUCache
+
+NOW = datetime(2024, 3, 14, 15, 30)
+
+
+class FrozenDatetime(datetime):
+    now_value = NOW
+
+    @classmethod
+    def utcnow(cls):
+        return cls.now_value
+
+
+@pytest.fixture
+def nlp(monkeypatch):
+    monkeypatch.setattr(NLPService, "analysis_cache", LRUCache(max_entries=3))
+    monkeypatch.setattr(nlp_service, "datetime", FrozenDatetime)
+    monkeypatch.setattr(FrozenDatetime, "now_value", NOW)
+    return NLPService()
+
+
+def test_cached_analysis_matches_fresh_analysis(nlp):
+    question = "Actions de user bob sur la table CLIENTS hier pendant 3 heures ?"
+    first = nlp.analyze_question(question)
+    second = nlp.analyze_question(question)
+
+    NLPService.analysis_cache.clear()
+    fresh = nlp.analyze_question(question)
+
+    assert second.dict() == first.dict() == fresh.dict()
+    assert list(second.suggested_filters) == list(fresh.suggested_filters)
+    assert second.suggested_filters["date_start"] == "2024-03-14T12:30:00"
+    assert NLPService.analysis_cache.hits == 1
+
+
+def test_relative_timeframe_is_resolved_at_lookup(nlp, monkeypatch):
+    before = nlp.analyze_question("Activité de l'utilisateur ADMIN hier")
+    monkeypatch.setattr(FrozenDatetime, "now_value", datetime(2024, 3, 20, 9, 0))
+    after = nlp.analyze_question("Activité de l'utilisateur ADMIN hier")
+
+    assert NLPService.analysis_cache.hits == 1
+    assert before.entities["timeframe"]["start"] == datetime(2024, 3, 13)
+    assert after.entities["timeframe"]["start"] == datetime(2024, 3, 19)
+    assert after.suggested_filters["date_end"] == "2024-03-19T23:59:59"
+    assert list(after.suggested_filters)[-1] == "focus"
+
+
+def test_resolve_timeframe_from_spec(nlp):
+    spec = nlp.timeframe_spec("Connexions des dernières 2 semaines")
+
+    assert spec == {"duration": [2, "semaines"]}
+    assert nlp.resolve_timeframe(spec, NOW) == {
+        "start": datetime(2024, 2, 29, 15, 30), "end": NOW, "period": "last_2_semaines"
+    }
+    assert nlp.extract_timeframe("Sessions de cette semaine")["start"] == datetime(2024, 3, 11)
+    assert nlp.resolve_timeframe({}, NOW) == {}
+
+
+def test_returned_analysis_does_not_alias_the_cache(nlp):
+    analysis = nlp.analyze_question("DROP et ALTER sur la table T_1")
+    analysis.entities["actions"].append("SELECT")
+    analysis.suggested_filters["object_name"] = "AUTRE"
+
+    again = nlp.analyze_question("DROP et ALTER sur la table T_1")
+
+    assert again.entities["actions"] == ["DROP", "ALTER"]
+    assert again.suggested_filters["object_name"] == "T_1"
+
+
+def test_cache_is_bounded_and_reports_hits_per_question(nlp):
+    for question in ["Q1", "Q2", "Q2", "Q2", "Q3", "Q3", "Q4"]:
+        nlp.analyze_question(question)
+
+    stats = NLPService.analysis_cache_stats(top=2)
+
+    assert stats["entries"] == 3
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 3
+    assert stats["top_questions"] == [{"question": "Q2", "hits": 2}, {"question": "Q3", "hits": 1}]
@@ -0,0 +1,78 @@
+"""Tests de l'invalidation des réponses par filigrane des données d'audit"""
+from datetime import datetime, timedelta
+from models import QueryAnalysis
+from nlp_service import NLPService
+from audit_watermark import freshness_tag, is_stale
+
+# Milieu de journée : les décalages des tests restent dans le même jour
+now = datetime.utcnow().replace(hour=12, minute=0, second=0, microsecond=0)
+SPECS = {
+    "today": {"period": "today"},
+    "yesterday": {"period": "yesterday"},
+    "last_3_hours": {"duration": [3, "heures"]}
+}
+
+
+def _tag(intent, watermark, period=None, at=now):
+    entities = {"object_name": "CLIENTS"}
+    if period:
+        entities["timeframe"] = NLPService.resolve_timeframe(SPECS[period], at)
+    analysis = QueryAnalysis(
+        original_query="", normalized_query="", intent=intent,
+        entities=entities, confidence=1.0, suggested_filters={}
+    )
+    return freshness_tag(analysis, watermark)
+
+
+def test_general_questions_are_not_tagged():
+    assert _tag("GENERAL", now) is None
+    assert is_stale(None, now + timedelta(hours=1)) is False
+
+
+def test_unchanged_watermark_keeps_answer():
+    tag = _tag("OBJECT_MODIFICATIONS", now, "today")
+
+    assert tag is not None
+    assert is_stale(tag, now, now) is False
+
+
+def test_new_data_invalidates_open_window():
+    tag = _tag("OBJECT_MODIFICATIONS", now, "today")
+
+    assert tag["window_end"] is None
+    assert is_stale(tag, now + timedelta(minutes=1), now) is True
+
+
+def test_new_data_after_closed_window_keeps_answer():
+    tag = _tag("OBJECT_MODIFICATIONS", now, "yesterday")
+
+    assert tag["window_end"] is not None
+    assert is_stale(tag, now + timedelta(minutes=1), now) is False
+
+
+def test_first_data_invalidates_answer_computed_on_empty_collection():
+    tag = _tag("OBJECT_MODIFICATIONS", None)
+
+    assert is_stale(tag, now, now) is True
+    assert is_stale(tag, None, now) is False
+
+
+def test_relative_window_is_resolved_again_at_lookup():
+    yesterday = _tag("OBJECT_MODIFICATIONS", now, "yesterday")
+    today = _tag("OBJECT_MODIFICATIONS", now, "today")
+
+    # Même clé de cache le lendemain, sans nouvelles données : la veille a changé
+    assert is_stale(yesterday, now, now + timedelta(hours=6)) is False
+    assert is_stale(yesterday, now, now + timedelta(days=1)) is True
+    assert is_stale(today, now, now + timedelta(days=1)) is True
+
+
+def test_sliding_window_tolerates_small_drift():
+    tag = _tag("OBJECT_MODIFICATIONS", now, "last_3_hours")
+    anomalies = _tag("SECURITY_ANALYSIS", now, at=now)
+
+    assert tag["period"] == "last_3_heures"
+    assert is_stale(tag, now, now + timedelta(seconds=30)) is False
+    assert is_stale(tag, now, now + timedelta(minutes=10)) is True
+    assert anomalies["period"] == "last_24_heures"
+    assert is_stale(anomalies, now, datetime.utcnow() + timedelta(hours=1)) is True
@@ -0,0 +1,118 @@
+"""Tests de l'index d'autocomplétion des questions"""
+import time
+from statistics import median
+import pytest
+import pytest_asyncio
+
+from config import settings
+from database import db_manager
+from write_behind import write_queue
+from cache_service import QuestionStatsService
+from autocomplete import AutocompleteIndex
+from question_ranking import FrequentQuestions
+from similarity_index import SimilarityIndex
+
+QUESTIONS = [
+    ("q1", "Qui a fait un DROP sur la table CLIENTS ?", 10),
+    ("q2", "Qui a créé la table FACTURES ?", 30),
+    ("q3", "Quelles modifications sur la table COMMANDES ?", 5),
+    ("q4", "Activité de l'utilisateur ADMIN", 20),
+]
+
+
+@pytest.fixture
+def index():
+    index = AutocompleteIndex(top_n=3)
+    index.build(QUESTIONS)
+    return index
+
+
+def _questions(completions):
+    return [completion["question"] for completion in completions]
+
+
+def test_prefix_completions_are_ranked_by_count(index):
+    assert _questions(index.complete("qui")) == [
+        "Qui a créé la table FACTURES ?", "Qui a fait un DROP sur la table CLIENTS ?"
+    ]
+    assert _questions(index.complete("Qu")) == [
+        "Qui a créé la table FACTURES ?", "Qui a fait un DROP sur la table CLIENTS ?",
+        "Quelles modifications sur la table COMMANDES ?"
+    ]
+    assert index.complete("pourquoi") == []
+
+
+def test_matching_is_accent_and_case_insensitive(index):
+    assert _questions(index.complete("QUI A CRÉE")) == ["Qui a créé la table FACTURES ?"]
+    assert _questions(index.complete("activite de l'util")) == ["Activité de l'utilisateur ADMIN"]
+
+
+def test_token_prefix_matches_inside_the_question(index):
+    assert _questions(index.complete("drop")) == ["Qui a fait un DROP sur la table CLIENTS ?"]
+    assert _questions(index.complete("table c", limit=5)) == [
+        "Qui a fait un DROP sur la table CLIENTS ?", "Quelles modifications sur la table COMMANDES ?"
+    ]
+    # Mot terminé par une espace : « table » ne complète pas « tables »
+    assert len(index.complete("la table ", limit=5)) == 3
+
+
+def test_recorded_questions_update_the_index(index):
+    for _ in range(26):
+        index.record("q3", "Quelles modifications sur la table COMMANDES ?")
+    index.record("q5", "Qui a supprimé la vue V_STATS ?")
+
+    assert _questions(index.complete("qu", limit=1)) == ["Quelles modifications sur la table COMMANDES ?"]
+    assert _questions(index.complete("qui a sup")) == ["Qui a supprimé la vue V_STATS ?"]
+
+
+def test_questions_recorded_during_build_are_kept():
+    index = AutocompleteIndex()
+    index.begin_build()
+    index.record("q9", "Connexions échouées hier")
+    index.build(QUESTIONS)
+
+    assert _questions(index.complete("connexions")) == ["Connexions échouées hier"]
+
+
+def test_completion_is_sub_millisecond():
+    index = AutocompleteIndex(top_n=10)
+    index.build([
+        (f"q{i}", f"Qui a fait un {action} sur la table T_{i} du schéma S_{i % 50} ?", i)
+        for i, action in enumerate(["DROP", "SELECT", "UPDATE", "DELETE"] * 1250)
+    ])
+    timings = []
+    for prefix in ["qui a fait un d", "t_12", "schema s_4", "select"] * 50:
+        start = time.perf_counter()
+        index.complete(prefix)
+        timings.append(time.perf_counter() - start)
+
+    assert median(timings) < 0.001
+
+
+@pytest_asyncio.fixture
+async def sqlite_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "sqlite_db_path", str(tmp_path / "cache" / "test_cache.db"))
+    monkeypatch.setattr(settings, "cache_backend", "sqlite")
+    monkeypatch.setattr(settings, "frequent_questions_refresh_interval", 0)
+    monkeypatch.setattr(settings, "similarity_refit_interval", 0)
+    monkeypatch.setattr(QuestionStatsService, "autocomplete", AutocompleteIndex())
+    monkeypatch.setattr(QuestionStatsService, "ranking", FrequentQuestions())
+    monkeypatch.setattr(QuestionStatsService, "similarity", SimilarityIndex(path=str(tmp_path / "similarity.npz")))
+    assert db_manager.connect_sqlite()
+    yield
+    await QuestionStatsService.stop_question_indexes()
+    await write_queue.flush()
+    await db_manager.close_connections()
+
+
+@pytest.mark.asyncio
+async def test_suggestions_come_from_stored_questions(sqlite_db, monkeypatch):
+    for question in ["Qui a fait un DROP ?", "Qui a fait un DROP ?", "Activité de user BOB"]:
+        await QuestionStatsService.update_question_stats(question)
+    monkeypatch.setattr(QuestionStatsService, "autocomplete", AutocompleteIndex())
+
+    await QuestionStatsService.start_question_indexes()
+
+    assert len(QuestionStatsService.autocomplete) == 2
+    suggestions = await QuestionStatsService.get_suggestions("activ")
+    assert suggestions[0] == "Activité de user BOB"
@@ -0,0 +1,132 @@
+"""Tests des backends de cache (SQLite local et Redis via fakeredis)"""
+import pytest
+import pytest_asyncio
+import fakeredis
+from pydantic import ValidationError
+
+from config import settings, Settings
+from database import db_manager
+from write_behind import write_queue
+from cache_backends import SQLiteCacheBackend, RedisCacheBackend
+
+
+@pytest_asyncio.fixture
+async def sqlite_backend(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "sqlite_db_path", str(tmp_path / "cache" / "test_cache.db"))
+    assert db_manager.connect_sqlite()
+    backend = SQLiteCacheBackend()
+    await backend.start()
+    yield backend
+    await write_queue.flush()
+    await backend.stop()
+    await db_manager.close_connections()
+
+
+@pytest_asyncio.fixture
+async def redis_backend():
+    backend = RedisCacheBackend(client=fakeredis.FakeAsyncRedis(decode_responses=True), ttl_seconds=60)
+    await backend.start()
+    yield backend
+    await backend.stop()
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def backend(request):
+    return request.getfixturevalue(f"{request.param}_backend")
+
+
+@pytest.mark.asyncio
+async def test_query_roundtrip_counts_hits(backend):
+    assert await backend.get_query("abc") is None
+
+    await backend.set_query("abc", "qui a fait un drop", {"response": "admin"})
+    first = await backend.get_query("abc")
+    second = await backend.get_query("abc")
+
+    assert first["result"] == {"response": "admin"}
+    assert first["hit_count"] == 2
+    assert second["hit_count"] == 3
+
+
+@pytest.mark.asyncio
+async def test_record_hit_and_usage(backend):
+    await backend.set_query("h1", "question un", {"response": "1"})
+    await backend.set_query("h2", "question deux", {"response": "2"})
+    await backend.record_hit("h2")
+    await backend.record_hit("h2")
+    await write_queue.flush()
+
+    usage = await backend.usage()
+
+    assert usage["entries"] == 2
+    # Deux hits enregistrés, puis celui de la lecture
+    assert (await backend.get_query("h2"))["hit_count"] == 4
+
+
+@pytest.mark.asyncio
+async def test_delete_and_clear(backend):
+    await backend.set_query("h1", "question un", {"response": "1"})
+    await backend.set_query("h2", "question deux", {"response": "2"})
+    await write_queue.flush()
+
+    assert await backend.delete_query("h1") is True
+    assert await backend.get_query("h1") is None
+
+    await backend.clear_queries()
+    assert await backend.get_query("h2") is None
+
+
+@pytest.mark.asyncio
+async def test_frequent_questions(backend):
+    for question in ["Qui a fait un DROP ?", "qui a fait un drop ?", "Qui a fait un DROP ?"]:
+        await backend.record_question("qui a fait un drop ?", question)
+    await backend.record_question("activité de user bob", "Activité de user BOB")
+    await write_queue.flush()
+
+    questions = await backend.frequent_questions(limit=5)
+
+    assert [q["normalized_question"] for q in questions] == ["qui a fait un drop ?", "activité de user bob"]
+    # Affichage : première formulation rencontrée
+    assert [q["question"] for q in questions] == ["Qui a fait un DROP ?", "Activité de user BOB"]
+    assert questions[0]["count"] == 3
+    assert sorted(questions[0]["variations"]) == ["Qui a fait un DROP ?", "qui a fait un drop ?"]
+
+
+@pytest.mark.asyncio
+async def test_redis_uses_native_ttl(redis_backend):
+    await redis_backend.set_query("h1", "question un", {"response": "1"})
+
+    ttl = await redis_backend.client.ttl(redis_backend._key("query", "h1"))
+
+    assert 0 < ttl <= 60
+
+
+@pytest.mark.asyncio
+async def test_redis_miss_leaves_no_trace(redis_backend):
+    assert await redis_backend.get_query("absent") is None
+    await redis_backend.record_hit("absent")
+
+    keys = [key async for key in redis_backend.client.scan_iter(match=redis_backend._key("*"))]
+
+    assert keys == []
+    assert (await redis_backend.usage())["entries"] == 0
+
+
+@pytest.mark.asyncio
+async def test_redis_cleanup_removes_expired_members(redis_backend):
+    for i in range(1200):
+        await redis_backend.set_query(f"h{i}", f"question {i}", {"response": i})
+    # Résultats expirés (TTL) : les membres des index sont orphelins
+    await redis_backend.client.delete(*[redis_backend._key("query", f"h{i}") for i in range(0, 1200, 2)])
+
+    assert await redis_backend.cleanup_queries(max_age_days=30) == 600
+    assert (await redis_backend.usage())["entries"] == 600
+    assert await redis_backend.get_query("h1") is not None
+
+
+def test_backend_and_executor_mode_are_validated():
+    assert Settings(cache_backend="Redis").cache_backend == "redis"
+    with pytest.raises(ValidationError):
+        Settings(cache_backend="redsi")
+    with pytest.raises(ValidationError):
+        Settings(nlp_executor_mode="proces")
@@ -0,0 +1,41 @@
+"""Tests de l'encodage des résultats du cache des requêtes"""
+import json
+import pytest
+from cache_codec import CODECS, encode_result, decode_result
+
+RESULT = {
+    "response": "L'utilisateur ADMIN a supprimé la table CLIENTS hier à 14h. " * 20,
+    "analysis": {"intent": "USER_ACTIVITY", "entities": {"actions": ["DROP"]}, "confidence": 0.8},
+    "suggestions": ["qui a fait un drop ?"],
+    "cached": False
+}
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_roundtrip(codec):
+    stored, raw_size = encode_result(RESULT, codec)
+    decoded, decoded_size = decode_result(stored)
+
+    assert decoded == RESULT
+    assert raw_size == decoded_size
+
+
+def test_compression_shrinks_rows():
+    plain, _ = encode_result(RESULT, "json")
+    compressed, _ = encode_result(RESULT, "zlib")
+
+    assert len(compressed) * 3 < len(plain)
+
+
+def test_legacy_json_text_still_decodes():
+    legacy = json.dumps(RESULT, ensure_ascii=False)
+
+    assert decode_result(legacy)[0] == RESULT
+    assert decode_result(legacy.encode("utf-8"))[0] == RESULT
+
+
+def test_unknown_format_version_is_rejected():
+    stored, _ = encode_result(RESULT, "zlib")
+
+    with pytest.raises(ValueError):
+        decode_result(stored[:2] + bytes((99,)) + stored[3:])
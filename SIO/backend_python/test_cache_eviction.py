@@ -0,0 +1,141 @@
+"""Tests du budget d'octets et des politiques d'éviction du cache des requêtes"""
+import sqlite3
+import pytest
+import pytest_asyncio
+
+from config import settings
+from database import db_manager
+from write_behind import write_queue, WriteBehindQueue
+from cache_backends import SQLiteCacheBackend
+from cache_eviction import cache_usage
+from text_normalizer import NORMALIZER_VERSION
+
+PAYLOAD = {"response": "x" * 1000}
+
+
+@pytest_asyncio.fixture
+async def backend(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "sqlite_db_path", str(tmp_path / "cache" / "test_cache.db"))
+    # Tailles prévisibles : résultats non compressés
+    monkeypatch.setattr(settings, "query_cache_codec", "json")
+    assert db_manager.connect_sqlite()
+    backend = SQLiteCacheBackend()
+    yield backend
+    await write_queue.flush()
+    await db_manager.close_connections()
+
+
+async def _fill(backend, count, prefix="h"):
+    for i in range(count):
+        await backend.set_query(f"{prefix}{i}", f"question {prefix}{i}", PAYLOAD)
+        await write_queue.flush()
+
+
+def _hashes():
+    return {row["query_hash"] for row in db_manager.fetch_sqlite_query("SELECT query_hash FROM query_cache")}
+
+
+@pytest.mark.asyncio
+async def test_usage_tracks_inserts_replacements_and_deletes(backend, monkeypatch):
+    monkeypatch.setattr(settings, "query_cache_max_bytes", 0)
+    await _fill(backend, 3)
+    await backend.set_query("h0", "question h0", {"response": "court"})
+    await backend.delete_query("h1")
+    await write_queue.flush()
+
+    total_bytes, entries = cache_usage(db_manager.sqlite_conn)
+    actual = db_manager.fetch_sqlite_query(
+        "SELECT SUM(length(CAST(result AS BLOB))) AS size, COUNT(*) AS n FROM query_cache"
+    )[0]
+
+    assert (total_bytes, entries) == (actual["size"], actual["n"]) == (total_bytes, 2)
+
+
+@pytest.mark.asyncio
+async def test_lru_evicts_least_recently_accessed(backend, monkeypatch):
+    monkeypatch.setattr(settings, "query_cache_max_bytes", 5500)
+    monkeypatch.setattr(settings, "query_cache_eviction_policy", "lru")
+    await _fill(backend, 5)
+    await backend.get_query("h0")
+    await _fill(backend, 1, prefix="new")
+
+    assert cache_usage(db_manager.sqlite_conn)[0] <= 5500
+    assert "h0" in _hashes() and "new0" in _hashes()
+    assert "h1" not in _hashes()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("policy", ["lfu", "hybrid"])
+async def test_frequency_policies_keep_hot_entries(backend, monkeypatch, policy):
+    monkeypatch.setattr(settings, "query_cache_max_bytes", 5500)
+    monkeypatch.setattr(settings, "query_cache_eviction_policy", policy)
+    await _fill(backend, 5)
+    for _ in range(3):
+        await backend.get_query("h1")
+    await write_queue.flush()
+    await _fill(backend, 1, prefix="new")
+
+    assert cache_usage(db_manager.sqlite_conn)[0] <= 5500
+    assert "h1" in _hashes()
+    assert "h0" not in _hashes()
+
+
+def test_discarded_hits_leave_the_pending_count():
+    queue = WriteBehindQueue(max_pending=100)
+    queue.enqueue_query_result("a", "question a", "{}", "2024-01-01T00:00:00")
+    for _ in range(3):
+        queue.enqueue_hit("a", "2024-01-01T00:00:01")
+        queue.enqueue_hit("b", "2024-01-01T00:00:01")
+    assert queue.pending == 7
+
+    queue.discard_query("a")
+    assert queue.pending == 3
+    # Remplacement : les hits en attente du hash sont caducs
+    queue.enqueue_query_result("b", "question b", "{}", "2024-01-01T00:00:02")
+    assert queue.pending == 1
+    queue.enqueue_hit("c", "2024-01-01T00:00:03")
+    queue.discard_all_queries()
+    assert queue.pending == 0
+
+
+def test_existing_database_is_migrated(tmp_path, monkeypatch):
+    db_path = tmp_path / "cache" / "old.db"
+    db_path.parent.mkdir()
+    conn = sqlite3.connect(db_path)
+    conn.execute("""CREATE TABLE query_cache (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, query_hash TEXT UNIQUE NOT NULL,
+        normalized_query TEXT NOT NULL, result TEXT NOT NULL, hit_count INTEGER DEFAULT 1,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP, last_accessed DATETIME DEFAULT CURRENT_TIMESTAMP)""")
+    conn.execute("INSERT INTO query_cache (query_hash, normalized_query, result) VALUES ('a', 'a', 'été')")
+    # Clés déjà à la version courante de la normalisation : le cache est conservé
+    conn.execute("CREATE TABLE cache_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+    conn.execute("INSERT INTO cache_meta VALUES ('normalizer_version', ?)", (str(NORMALIZER_VERSION),))
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(settings, "sqlite_db_path", str(db_path))
+    assert db_manager.connect_sqlite()
+    try:
+        assert cache_usage(db_manager.sqlite_conn) == (len("été".encode("utf-8")), 1)
+    finally:
+        db_manager.sqlite_pool.close()
+        db_manager.sqlite_pool = None
+        db_manager.sqlite_conn.close()
+        db_manager.sqlite_conn = None
+
+
+def test_requeued_batch_counts_only_kept_operations():
+    queue = WriteBehindQueue(max_pending=100)
+    queue.enqueue_query_result("a", "question a", "{}", "2024-01-01T00:00:00")
+    queue.enqueue_query_result("b", "question b", "{}", "2024-01-01T00:00:00")
+    batch = queue._swap()
+    queue.enqueue_hit("a", "2024-01-01T00:00:01")
+    queue.enqueue_hit("a", "2024-01-01T00:00:01")
+    old_hits = queue._swap()
+    queue._requeue(batch)
+    # Résultat plus récent de a pendant l'écriture : l'ancien et ses hits sont écartés
+    queue.enqueue_query_result("a", "question a", "{\"v\": 2}", "2024-01-01T00:00:02")
+    queue._requeue(old_hits)
+
+    assert queue.pending == 2
+    assert queue.pending_hits("a") == 0
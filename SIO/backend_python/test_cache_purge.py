@@ -0,0 +1,89 @@
+"""Tests de la purge par lots du cache SQLite"""
+from datetime import datetime, timedelta
+import pytest
+import pytest_asyncio
+
+from config import settings
+from database import db_manager
+from cache_purge import CachePurger, AUTO_VACUUM_INCREMENTAL
+
+
+@pytest_asyncio.fixture
+async def purger(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "sqlite_db_path", str(tmp_path / "cache" / "test_cache.db"))
+    assert db_manager.connect_sqlite()
+    yield CachePurger(batch_size=10, pause=0, vacuum_pages=8)
+    await db_manager.close_connections()
+
+
+async def _insert_queries(old: int, recent: int):
+    now = datetime.utcnow()
+    dates = [now - timedelta(days=60)] * old + [now] * recent
+    rows = [(f"h{i}", f"question {i}", "x" * 2000, 2000, created_at.isoformat()) for i, created_at in enumerate(dates)]
+    await db_manager.executemany_sqlite_query_async(
+        "INSERT INTO query_cache (query_hash, normalized_query, result, result_size, created_at) VALUES (?, ?, ?, ?, ?)",
+        rows
+    )
+
+
+def _count(table):
+    return db_manager.fetch_sqlite_query(f"SELECT COUNT(*) AS n FROM {table}")[0]["n"]
+
+
+@pytest.mark.asyncio
+async def test_purge_deletes_old_rows_in_batches(purger):
+    await _insert_queries(old=95, recent=5)
+
+    async with purger.session() as progress:
+        deleted = await purger.purge_table("query_cache", "created_at", datetime.utcnow() - timedelta(days=30))
+
+    assert deleted == 95
+    assert _count("query_cache") == 5
+    assert progress["batches"] == 10
+    assert purger.status()["last"]["deleted"] == {"query_cache": 95}
+    assert purger.status()["current"] is None
+
+
+@pytest.mark.asyncio
+async def test_purge_seeks_over_sparse_ids(purger):
+    old = (datetime.utcnow() - timedelta(days=60)).isoformat()
+    rows = [(i * 100000, f"h{i}", f"question {i}", "x", 1, old) for i in range(1, 26)]
+    await db_manager.executemany_sqlite_query_async(
+        "INSERT INTO query_cache (id, query_hash, normalized_query, result, result_size, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+        rows
+    )
+
+    async with purger.session() as progress:
+        deleted = await purger.purge_table("query_cache", "created_at", datetime.utcnow() - timedelta(days=30))
+
+    # Trois lots (10, 10, 5) et non une fenêtre par tranche de 10 identifiants
+    assert deleted == 25
+    assert progress["batches"] == 3
+    assert progress["position"] == 2500000
+    assert _count("query_cache") == 0
+
+
+@pytest.mark.asyncio
+async def test_incremental_vacuum_returns_free_pages(purger):
+    await _insert_queries(old=200, recent=0)
+    assert db_manager.sqlite_conn.execute("PRAGMA auto_vacuum").fetchone()[0] == AUTO_VACUUM_INCREMENTAL
+
+    async with purger.session():
+        await purger.purge_table("query_cache", "created_at", datetime.utcnow())
+        reclaimed = await purger.reclaim_space()
+
+    assert reclaimed > 0
+    assert db_manager.sqlite_conn.execute("PRAGMA freelist_count").fetchone()[0] == 0
+
+
+@pytest.mark.asyncio
+async def test_drop_table_is_reported(purger):
+    db_manager.sqlite_conn.execute("CREATE TABLE action_log_20200101 (id INTEGER PRIMARY KEY)")
+
+    async with purger.session():
+        await purger.drop_table("action_log_20200101")
+
+    assert purger.status()["last"]["dropped_tables"] == ["action_log_20200101"]
+    assert not db_manager.fetch_sqlite_query(
+        "SELECT name FROM sqlite_master WHERE name = 'action_log_20200101'"
+    )
@@ -0,0 +1,67 @@
+"""Tests des statistiques du cache (compteurs, top-k, matérialisation)"""
+import random
+import pytest
+import pytest_asyncio
+
+from config import settings
+from database import db_manager
+from cache_stats import CacheStatsRecorder, SpaceSaving
+
+
+def test_space_saving_keeps_heavy_hitters():
+    rng = random.Random(0)
+    stream = ["chaud"] * 300 + ["tiède"] * 150 + [f"rare {i}" for i in range(2000)]
+    rng.shuffle(stream)
+    top_k = SpaceSaving(capacity=20)
+    for item in stream:
+        top_k.add(item)
+
+    top = top_k.top(2)
+
+    assert len(top_k) == 20
+    assert [entry["item"] for entry in top] == ["chaud", "tiède"]
+    assert top[0]["count"] - top[0]["error"] <= 300 <= top[0]["count"]
+
+
+def test_hit_rate_counts_lookups_not_entries():
+    stats = CacheStatsRecorder()
+    stats.record_lookup("q1")
+    stats.record_lookup("q1", "backend", size=100)
+    stats.record_lookup("q1", "memory")
+    stats.record_lookup("q2")
+    stats.incr("coalesced")
+
+    snapshot = stats.snapshot()
+
+    assert snapshot["counters"]["lookups"] == 4
+    assert snapshot["counters"]["misses"] == 2
+    assert snapshot["hit_rate"] == 50.0
+    assert snapshot["effective_hit_rate"] == 75.0
+    assert snapshot["top_queries"][0] == {"normalized_query": "q1", "hit_count": 2, "error": 0}
+
+
+@pytest_asyncio.fixture
+async def sqlite(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "sqlite_db_path", str(tmp_path / "cache" / "test_cache.db"))
+    assert db_manager.connect_sqlite()
+    yield
+    await db_manager.close_connections()
+
+
+@pytest.mark.asyncio
+async def test_counters_survive_restart(sqlite):
+    before = CacheStatsRecorder()
+    before.record_lookup("q1", "memory")
+    before.record_lookup("q2")
+    await before.flush()
+    before.record_lookup("q1", "memory")
+    await before.flush()
+
+    after = CacheStatsRecorder()
+    await after.load()
+    snapshot = after.snapshot()
+
+    assert snapshot["counters"]["lookups"] == 3
+    assert snapshot["counters"]["hits"] == 2
+    assert snapshot["top_queries"][0]["normalized_query"] == "q1"
+    assert snapshot["top_queries"][0]["hit_count"] == 2
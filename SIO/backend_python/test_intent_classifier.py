@@ -0,0 +1,85 @@
+"""Tests du classifieur d'intentions sur n-grammes hachés"""
+import numpy as np
+import pytest
+
+import intent_classifier
+from intent_classifier import IntentClassifier, hashed_features, hashed_ngrams, prepare, seed_examples
+from nlp_service import NLPService
+from memory_cache import LRUCache
+
+
+@pytest.fixture(scope="module")
+def trained():
+    examples = seed_examples()
+    classifier = IntentClassifier(n_features=2 ** 14)
+    classifier.fit([text for text, _ in examples], [intent for _, intent in examples])
+    return classifier
+
+
+def test_features_match_per_text_ngrams():
+    texts = ["Connexions échouées", "", "Requêtes lentes"]
+    rows, columns, values = hashed_features(texts, 2 ** 12)
+
+    assert prepare("Connexions échouées !") == " connexions echouees "
+    # Un lot donne les mêmes traits que chaque texte isolé (aucun n-gramme à cheval)
+    for row, text in enumerate(texts):
+        _, alone_columns, alone_values = hashed_features([text], 2 ** 12)
+        assert np.array_equal(columns[rows == row], alone_columns)
+        assert np.allclose(values[rows == row], alone_values)
+    matrix = hashed_ngrams(texts, 2 ** 12)
+    assert np.allclose(matrix.multiply(matrix).sum(axis=1).ravel(), 1)
+    with pytest.raises(ValueError):
+        hashed_features(texts, 1000)
+
+
+def test_batch_prediction_matches_single_predictions(trained):
+    texts = ["Tentatives de connexion échouées hier", "Bonjour", "Requetes lentes sur le serveur"]
+
+    batch = trained.predict(texts)
+
+    assert [intent for intent, _ in batch] == [intent for intent, _ in (trained.predict([t])[0] for t in texts)]
+    assert np.allclose(trained.predict_proba(texts).sum(axis=1), 1)
+    assert trained.predict([]) == []
+
+
+def test_model_generalizes_to_variants(trained):
+    # Pluriels, accents manquants : aucune règle ne reconnaît ces formulations
+    assert trained.predict(["Attaques par force brute recentes"])[0][0] == "SECURITY_ANALYSIS"
+    assert trained.predict(["consommation memoire"])[0][0] == "PERFORMANCE_ANALYSIS"
+    assert NLPService().classify_intent_rules("consommation memoire") == ("GENERAL", 0.0)
+
+
+def test_saved_model_reloads_identically(trained, tmp_path):
+    path = str(tmp_path / "intent_model.npz")
+    trained.save(path)
+
+    reloaded = IntentClassifier(path=path)
+
+    assert reloaded.ready
+    assert reloaded.n_features == 2 ** 14
+    texts = ["Qui a fait un DROP ?", "Requêtes lentes"]
+    assert np.allclose(reloaded.predict_proba(texts), trained.predict_proba(texts), atol=1e-5)
+    assert not IntentClassifier(path=str(tmp_path / "absent.npz")).ready
+
+
+def test_service_uses_model_above_threshold(trained, monkeypatch):
+    monkeypatch.setattr(NLPService, "analysis_cache", LRUCache(max_entries=10))
+    nlp = NLPService()
+    nlp.intent_classifier = trained
+    monkeypatch.setattr(intent_classifier.settings, "intent_model_min_confidence", 0.0)
+
+    analyses = nlp.analyze_questions(["consommation memoire", "Bonjour", "consommation memoire"])
+
+    assert [a.intent for a in analyses] == ["PERFORMANCE_ANALYSIS", "GENERAL", "PERFORMANCE_ANALYSIS"]
+    assert analyses[0].confidence == pytest.approx(trained.predict(["consommation memoire"])[0][1])
+
+    # Au-dessus de toute probabilité possible : décision par les règles
+    monkeypatch.setattr(intent_classifier.settings, "intent_model_min_confidence", 1.1)
+    assert nlp.classify_intent("Requêtes lentes") == nlp.classify_intent_rules("Requêtes lentes")
+
+
+def test_service_falls_back_to_rules_without_model():
+    nlp = NLPService()
+    nlp.intent_classifier = IntentClassifier(path=None)
+
+    assert nlp.classify_intents(["Qui a fait un DROP ?"]) == [nlp.classify_intent_rules("Qui a fait un DROP ?")]
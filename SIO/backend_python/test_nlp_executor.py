@@ -0,0 +1,122 @@
+"""Tests du pool d'exécution des traitements NLP"""
+import time
+import asyncio
+import threading
+from statistics import median
+import pytest
+
+from nlp_service import NLPService
+from nlp_executor import NLPExecutor, NLPExecutorBusy
+
+
+class BlockingService:
+    """Service dont les tâches attendent un signal"""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def wait(self, value):
+        self.release.wait(5)
+        return value
+
+
+@pytest.mark.asyncio
+async def test_thread_pool_runs_service_methods():
+    executor = NLPExecutor(mode="thread", workers=2)
+    try:
+        analysis = await executor.analyze_question("Qui a fait un DROP sur la table CLIENTS ?")
+        batch = await executor.analyze_questions(["Bonjour", "Activité de user BOB"])
+    finally:
+        executor.shutdown()
+
+    assert analysis == NLPService().analyze_question("Qui a fait un DROP sur la table CLIENTS ?")
+    assert [a.original_query for a in batch] == ["Bonjour", "Activité de user BOB"]
+    assert executor.stats()["completed"] == 2
+    assert not executor.stats()["running"]
+
+
+@pytest.mark.asyncio
+async def test_tasks_beyond_max_pending_are_rejected():
+    service = BlockingService()
+    executor = NLPExecutor(mode="thread", workers=1, max_pending=2, service=service)
+    try:
+        tasks = [asyncio.create_task(executor.run("wait", i)) for i in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(NLPExecutorBusy):
+            await executor.run("wait", 3)
+
+        service.release.set()
+        assert await asyncio.gather(*tasks) == [0, 1]
+        await asyncio.sleep(0.01)
+    finally:
+        executor.shutdown()
+
+    assert executor.stats()["rejected"] == 1
+    assert executor.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_timed_out_task_keeps_its_slot_until_it_finishes():
+    service = BlockingService()
+    executor = NLPExecutor(mode="thread", workers=1, timeout=0.05, service=service)
+    try:
+        with pytest.raises(asyncio.TimeoutError):
+            await executor.run("wait", 1)
+        assert executor.pending == 1
+
+        service.release.set()
+        await asyncio.sleep(0.05)
+        assert executor.pending == 0
+        assert await executor.run("wait", 2) == 2
+    finally:
+        executor.shutdown()
+
+    assert executor.stats()["timeouts"] == 1
+
+
+@pytest.mark.asyncio
+async def test_event_loop_stays_responsive_during_batch_analysis():
+    questions = [f"Activité de l'utilisateur U{i} sur la table T_{i} pendant {i} jours" for i in range(3000)]
+    executor = NLPExecutor(mode="thread", workers=1, timeout=30)
+    gaps = []
+
+    async def heartbeat(stop: asyncio.Event):
+        last = time.perf_counter()
+        while not stop.is_set():
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(heartbeat(stop))
+    try:
+        await asyncio.gather(*(executor.analyze_questions(questions[i::4]) for i in range(4)))
+    finally:
+        stop.set()
+        await ticker
+        executor.shutdown()
+
+    # Exécuté en ligne, le lot bloquerait la boucle d'un bloc pendant toute sa durée
+    assert len(gaps) >= 5
+    assert median(gaps) < 0.025
+
+
+@pytest.mark.asyncio
+async def test_process_pool_keeps_warm_workers():
+    executor = NLPExecutor(mode="process", workers=1)
+    executor.start()
+    try:
+        first = await executor.analyze_question("Activité de user BOB hier")
+        second = await executor.analyze_question("Activité de user BOB hier")
+    finally:
+        executor.shutdown()
+
+    expected = NLPService().analyze_question("Activité de user BOB hier")
+    assert first.intent == second.intent == expected.intent
+    assert first.entities["user"] == "BOB"
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        NLPExecutor(mode="gpu")
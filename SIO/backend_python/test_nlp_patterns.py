@@ -0,0 +1,110 @@
+"""Tests du moteur de patterns compilés de l'analyse des questions"""
+import re
+import pytest
+
+from nlp_service import NLPService
+from pattern_engine import PatternGroup
+
+QUESTIONS = [
+    "Qui a fait un DROP sur la table CLIENTS ?",
+    "Quelles modifications sur la table COMMANDES hier ?",
+    "Activité de l'utilisateur ADMIN aujourd'hui",
+    "Actions de user bob pendant 3 jours depuis le poste PC42",
+    "Tentatives de connexion échouées cette semaine",
+    "Requêtes lentes et temps de réponse durant 2 heures",
+    "Je suis Hélène, quels accès ai-je ?",
+    "CREATE TABLE T_1 dans le schéma SALES avec SQL Developer",
+    "utilisateur os jdoe a exécuté un UPDATE le 12/03/2024",
+    "Problèmes de performance : requêtes lentes et charge du serveur",
+    "Violations de sécurité et permissions accordées à user SCOTT",
+    "Quand la structure de la base a-t-elle changé ?",
+    "Utilisateurs suspects au cours de la nuit",
+    "Bonjour",
+    "",
+]
+
+# Implémentation d'origine (re.search pattern par pattern), référence des résultats
+LEGACY_USER = [
+    r"utilisateur(?:\s+(?:os|db))?\s+([A-Za-z0-9_-]+)",
+    r"user\s+([A-Za-z0-9_-]+)",
+    r"(?:je suis|je m'appelle)\s+([A-Za-zÀ-ÿ-]+)"
+]
+LEGACY_OBJECT = [
+    r"(?:table|objet)\s+([A-Za-z0-9_-]+)",
+    r"(?:sur|dans)\s+([A-Za-z0-9_-]+)",
+    r"(?:CREATE|DROP|ALTER)\s+(?:TABLE\s+)?([A-Za-z0-9_-]+)"
+]
+
+
+def legacy_intent(nlp, text):
+    best_intent, best_score = "GENERAL", 0.0
+    for intent, patterns in nlp.question_patterns.items():
+        score = sum(1.0 for pattern in patterns if re.search(pattern, text.lower())) / len(patterns)
+        if score > best_score:
+            best_intent, best_score = intent, score
+    return best_intent, best_score
+
+
+def legacy_first(patterns, text):
+    for pattern in patterns:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            return match.group(1)
+    return None
+
+
+@pytest.fixture(scope="module")
+def nlp():
+    return NLPService()
+
+
+@pytest.mark.parametrize("question", QUESTIONS)
+def test_results_match_per_pattern_search(nlp, question):
+    entities = nlp.extract_entities(question)
+
+    assert nlp.classify_intent_rules(question) == legacy_intent(nlp, question)
+    assert entities.get("user") == legacy_first(LEGACY_USER, question)
+    object_name = legacy_first(LEGACY_OBJECT, question)
+    assert entities.get("object_name") == (object_name.upper() if object_name else None)
+
+
+def test_pattern_group_keeps_pattern_order():
+    group = PatternGroup([r"table\s+(\w+)", r"sur\s+(\w+)"], re.IGNORECASE, keywords=["table", "sur"])
+    text = "DROP sur CLIENTS de la table T_1"
+
+    # « sur » apparaît en premier dans le texte ; le premier pattern du groupe l'emporte
+    assert group.first(text).group(1) == "T_1"
+    assert group.count(text) == 2
+    assert group.findall("TABLE A, sur B, table C") == ["A", "C", "B"]
+
+
+def test_keywords_skip_groups_without_candidates():
+    group = PatternGroup([r"schéma\s+(\w+)"], re.IGNORECASE, keywords=["schéma"])
+
+    assert group.candidate("Objets du SCHÉMA HR")
+    assert not group.candidate("Objets de la table T_1")
+    assert group.first("Objets de la table T_1") is None
+    assert group.count("rien") == 0
+    # Sans mots-clés, les patterns sont toujours évalués
+    assert PatternGroup([r"\d+"]).count("poste 42") == 1
+
+
+def test_entities_and_timeframe(nlp):
+    analysis = nlp.analyze_question("Actions de user bob pendant 3 jours depuis le poste pc42 avec Toad")
+
+    assert analysis.entities["user"] == "bob"
+    assert analysis.entities["client_host"] == "PC42"
+    assert analysis.entities["program"] == "Toad"
+    assert analysis.entities["dates"] == ["pendant 3 jours"]
+    assert analysis.entities["timeframe"]["period"] == "last_3_jours"
+
+
+def test_analyze_questions_keeps_order_and_shares_duplicates(nlp):
+    batch = ["Qui a fait un DROP ?", "Bonjour", "Qui a fait un DROP ?"]
+
+    analyses = nlp.analyze_questions(batch)
+
+    assert [analysis.original_query for analysis in analyses] == batch
+    assert analyses[0] is analyses[2]
+    assert analyses[0].intent == nlp.analyze_question(batch[0]).intent
+    assert nlp.analyze_questions([]) == []
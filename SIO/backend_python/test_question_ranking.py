@@ -0,0 +1,107 @@
+"""Tests du classement en mémoire des questions fréquentes"""
+import pytest
+import pytest_asyncio
+
+from config import settings
+from database import db_manager
+from write_behind import write_queue
+from cache_service import QuestionStatsService
+from question_ranking import FrequentQuestions
+from autocomplete import AutocompleteIndex
+from similarity_index import SimilarityIndex
+
+
+def test_ranking_is_updated_incrementally():
+    ranking = FrequentQuestions(capacity=10)
+    for question in ["Q1", "Q2", "Q2", "q2 ?", "Q3", "Q3", "Q3", "Q3"]:
+        ranking.record(question.lower()[:2], question, "2024-01-01T10:00:00")
+
+    top = ranking.top(2)
+
+    assert [(q["normalized_question"], q["count"]) for q in top] == [("q3", 4), ("q2", 3)]
+    assert top[1]["variations"] == ["Q2", "q2 ?"]
+    assert len(ranking.top(50)) == 3
+
+
+def test_snapshot_is_immutable_for_readers():
+    ranking = FrequentQuestions(capacity=10)
+    ranking.record("q1", "Q1", "t")
+    snapshot = ranking.top(1)
+    snapshot[0]["variations"].append("modifiée")
+    ranking.record("q1", "Q1", "t")
+
+    assert ranking.top(1)[0]["variations"] == ["Q1"]
+    assert snapshot[0]["count"] == 1
+
+
+def test_new_question_replaces_least_frequent_when_full():
+    ranking = FrequentQuestions(capacity=2)
+    for normalized in ["a", "a", "a", "b", "c"]:
+        ranking.record(normalized, normalized.upper(), "t")
+
+    top = ranking.top(5)
+
+    assert [q["normalized_question"] for q in top] == ["a", "c"]
+    # Compteur hérité de la question remplacée (surestimation bornée)
+    assert top[1]["count"] == 2
+
+
+def test_questions_counted_during_load_are_kept():
+    ranking = FrequentQuestions(capacity=10)
+    ranking.begin_load()
+    ranking.record("q1", "Q1", "t2")
+    ranking.load([{"question": "Q1", "normalized_question": "q1", "count": 5, "last_asked": "t1", "variations": ["Q1"]}])
+
+    assert ranking.top(1)[0]["count"] == 6
+    assert ranking.loaded
+
+
+@pytest_asyncio.fixture
+async def sqlite_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "sqlite_db_path", str(tmp_path / "cache" / "test_cache.db"))
+    monkeypatch.setattr(settings, "cache_backend", "sqlite")
+    monkeypatch.setattr(settings, "frequent_questions_refresh_interval", 0)
+    monkeypatch.setattr(settings, "similarity_refit_interval", 0)
+    monkeypatch.setattr(QuestionStatsService, "ranking", FrequentQuestions(capacity=5))
+    monkeypatch.setattr(QuestionStatsService, "autocomplete", AutocompleteIndex())
+    monkeypatch.setattr(QuestionStatsService, "similarity", SimilarityIndex(path=str(tmp_path / "similarity.npz")))
+    assert db_manager.connect_sqlite()
+    yield
+    await QuestionStatsService.stop_question_indexes()
+    await write_queue.flush()
+    await db_manager.close_connections()
+
+
+@pytest.mark.asyncio
+async def test_service_loads_ranking_at_startup_and_serves_from_memory(sqlite_db, monkeypatch):
+    for question in ["Qui a fait un DROP ?", "qui a fait un drop", "Activité de user BOB"]:
+        await QuestionStatsService.update_question_stats(question)
+    monkeypatch.setattr(QuestionStatsService, "ranking", FrequentQuestions(capacity=5))
+
+    await QuestionStatsService.start_question_indexes()
+    await QuestionStatsService.update_question_stats("Activité de user BOB ?")
+    await QuestionStatsService.update_question_stats("activité de user bob")
+
+    frequent = await QuestionStatsService.get_frequent_questions(limit=2)
+
+    assert QuestionStatsService.ranking.loaded
+    assert [(q["question"], q["count"]) for q in frequent] == [
+        ("Activité de user BOB", 3), ("Qui a fait un DROP ?", 2)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_question_recorded_during_reload_flush_is_counted_once(sqlite_db, monkeypatch):
+    flush = write_queue.flush
+
+    async def flush_after_question():
+        # Question posée pendant le rechargement, avant l'écriture de la file
+        monkeypatch.setattr(write_queue, "flush", flush)
+        await QuestionStatsService.update_question_stats("Activité de user BOB")
+        return await flush()
+
+    monkeypatch.setattr(write_queue, "flush", flush_after_question)
+    await QuestionStatsService.load_question_indexes()
+
+    assert [q["count"] for q in await QuestionStatsService.get_frequent_questions(limit=1)] == [1]
+    assert [q["count"] for q in QuestionStatsService.autocomplete.complete("activ", limit=1)] == [1]
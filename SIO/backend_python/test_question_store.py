@@ -0,0 +1,128 @@
+"""Tests des statistiques de questions (upsert, variations bornées, migration)"""
+import json
+import sqlite3
+import pytest
+import pytest_asyncio
+
+from config import settings
+from database import db_manager
+from write_behind import write_queue
+from question_store import top_questions, all_variations
+from text_normalizer import normalize_question
+
+
+@pytest_asyncio.fixture
+async def sqlite_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "sqlite_db_path", str(tmp_path / "cache" / "test_cache.db"))
+    monkeypatch.setattr(settings, "question_variations_max", 3)
+    assert db_manager.connect_sqlite()
+    yield
+    await db_manager.close_connections()
+
+
+def _variations(normalized):
+    return db_manager.fetch_sqlite_query(
+        """SELECT v.variation, v.count FROM question_variations v
+           JOIN question_stats q ON q.id = v.question_id
+           WHERE q.normalized_question = ? ORDER BY v.count DESC, v.variation""",
+        (normalized,)
+    )
+
+
+@pytest.mark.asyncio
+async def test_counts_accumulate_across_batches(sqlite_db):
+    for _ in range(3):
+        write_queue.enqueue_question("q", "Q ?", "2024-01-01T10:00:00")
+        await write_queue.flush()
+    write_queue.enqueue_question("q", "q", "2024-01-01T11:00:00")
+    await write_queue.flush()
+
+    row = db_manager.fetch_sqlite_query("SELECT count, last_asked, variations FROM question_stats")[0]
+
+    assert (row["count"], row["last_asked"], row["variations"]) == (4, "2024-01-01T11:00:00", None)
+    assert [tuple(v) for v in _variations("q")] == [("Q ?", 3), ("q", 1)]
+
+
+@pytest.mark.asyncio
+async def test_variations_are_bounded_and_keep_frequent_phrasings(sqlite_db):
+    # Space-Saving garantit les formulations vues plus de N / max_variations fois
+    for _ in range(12):
+        write_queue.enqueue_question("q", "fréquente", "2024-01-01T10:00:00")
+    for i in range(20):
+        write_queue.enqueue_question("q", f"rare {i}", f"2024-01-01T10:{i:02d}:00")
+        await write_queue.flush()
+
+    variations = _variations("q")
+
+    assert len(variations) == 3
+    assert "fréquente" in [v["variation"] for v in variations]
+    assert (await db_manager.run_sqlite_read(lambda conn: top_questions(conn, 1)))[0]["count"] == 32
+
+
+@pytest.mark.asyncio
+async def test_json_variations_are_migrated_once(sqlite_db):
+    await db_manager.close_connections()
+    conn = sqlite3.connect(settings.sqlite_db_path)
+    conn.execute(
+        "INSERT INTO question_stats (normalized_question, count, last_asked, variations) VALUES (?, ?, ?, ?)",
+        ("q", 7, "2024-01-01T10:00:00", json.dumps(["A", "B", "C", "D"]))
+    )
+    conn.commit()
+    conn.close()
+
+    assert db_manager.connect_sqlite()
+
+    assert [v["variation"] for v in _variations("q")] == ["A", "B", "C"]
+    assert db_manager.fetch_sqlite_query("SELECT variations FROM question_stats")[0]["variations"] is None
+
+
+@pytest.mark.asyncio
+async def test_questions_are_renormalized_and_merged_once(sqlite_db):
+    await db_manager.close_connections()
+    conn = sqlite3.connect(settings.sqlite_db_path)
+    # Base écrite par l'ancienne normalisation : deux clés pour la même question
+    conn.executemany(
+        "INSERT INTO question_stats (id, normalized_question, display_question, count, last_asked) VALUES (?, ?, ?, ?, ?)",
+        [(1, "qui a fait un drop", "Qui a fait un DROP ?", 2, "2024-01-02T10:00:00"),
+         (2, "qui fait drop", "qui a fait un drop", 5, "2024-01-01T10:00:00")]
+    )
+    conn.executemany(
+        "INSERT INTO question_variations (question_id, variation, count, last_seen) VALUES (?, ?, ?, ?)",
+        [(1, "Qui a fait un DROP ?", 2, "2024-01-02T10:00:00"),
+         (2, "qui a fait un drop", 4, "2024-01-01T10:00:00"),
+         (2, "Qui a fait un DROP ?", 1, "2024-01-01T09:00:00")]
+    )
+    conn.execute("INSERT INTO query_cache (query_hash, normalized_query, result) VALUES ('h', 'qui fait drop', '{}')")
+    conn.execute("DELETE FROM cache_meta")
+    conn.commit()
+    conn.close()
+
+    assert db_manager.connect_sqlite()
+
+    rows = db_manager.fetch_sqlite_query("SELECT * FROM question_stats")
+    assert [(r["id"], r["normalized_question"], r["display_question"], r["count"], r["last_asked"]) for r in rows] == [
+        (2, normalize_question("qui a fait un drop"), "qui a fait un drop", 7, "2024-01-02T10:00:00")
+    ]
+    assert [tuple(v) for v in _variations(rows[0]["normalized_question"])] == [
+        ("qui a fait un drop", 4), ("Qui a fait un DROP ?", 3)
+    ]
+    assert db_manager.fetch_sqlite_query("SELECT COUNT(*) AS n FROM query_cache")[0]["n"] == 0
+
+    # Version enregistrée : une reconnexion ne migre plus rien
+    db_manager.execute_sqlite_query("UPDATE question_stats SET normalized_question = 'autre'")
+    await db_manager.close_connections()
+    assert db_manager.connect_sqlite()
+    assert db_manager.fetch_sqlite_query("SELECT normalized_question FROM question_stats")[0][0] == "autre"
+
+
+@pytest.mark.asyncio
+async def test_all_variations_lists_phrasings_per_question(sqlite_db):
+    for question in ["Q ?", "q", "Q ?"]:
+        write_queue.enqueue_question("q", question, "2024-01-01T10:00:00")
+    write_queue.enqueue_question("r", "R", "2024-01-01T10:00:00")
+    await write_queue.flush()
+    db_manager.execute_sqlite_query("DELETE FROM question_variations WHERE variation = 'R'")
+
+    rows = await db_manager.run_sqlite_read(all_variations)
+
+    assert sorted((n, sorted(v), c) for n, v, c in rows) == [("q", ["Q ?", "q"], 3), ("r", ["R"], 1)]
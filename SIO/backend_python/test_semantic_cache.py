@@ -0,0 +1,82 @@
+"""Tests du cache sémantique des réponses"""
+import pytest
+
+from nlp_service import NLPService
+from semantic_cache import SemanticCache
+from cache_service import CacheService
+from memory_cache import LRUCache
+
+nlp = NLPService()
+
+
+def _add(cache, question, response):
+    cache.add(question, nlp.analyze_question(question), {"response": response})
+
+
+def _lookup(cache, question):
+    return cache.lookup(question, nlp.analyze_question(question))
+
+
+def test_paraphrase_hits():
+    cache = SemanticCache(threshold=0.5)
+    _add(cache, "quels utilisateurs ont fait un DROP hier", "admin")
+
+    match = _lookup(cache, "qui a fait un DROP hier ?")
+
+    assert match is not None
+    assert match["response"] == {"response": "admin"}
+
+
+def test_different_entities_never_match():
+    cache = SemanticCache(threshold=0.1)
+    _add(cache, "qui a fait un DROP hier ?", "admin")
+
+    assert _lookup(cache, "qui a fait un CREATE hier ?") is None
+    assert _lookup(cache, "qui a fait un DROP aujourd'hui ?") is None
+    assert cache.stats()["misses"] == 2
+
+
+def test_unrelated_question_below_threshold():
+    cache = SemanticCache(threshold=0.5)
+    _add(cache, "activité de user bob", "bob")
+
+    assert _lookup(cache, "montre les connexions suspectes") is None
+
+
+def test_lru_eviction_and_invalidate():
+    cache = SemanticCache(threshold=0.5, max_entries=2)
+    _add(cache, "qui a fait un DROP hier ?", "drop")
+    _add(cache, "qui a fait un CREATE hier ?", "create")
+    _add(cache, "qui a fait un ALTER hier ?", "alter")
+
+    assert len(cache) == 2
+    assert _lookup(cache, "qui a fait un DROP hier ?") is None
+
+    cache.invalidate("Qui a fait un ALTER hier ?")
+    assert _lookup(cache, "qui a fait un ALTER hier ?") is None
+    assert len(cache) == 1
+
+
+class DeletingBackend:
+    def __init__(self):
+        self.deleted = []
+
+    async def delete_query(self, query_hash):
+        self.deleted.append(query_hash)
+        return True
+
+
+@pytest.mark.asyncio
+async def test_stale_answer_leaves_the_semantic_tier(monkeypatch):
+    cache = SemanticCache(threshold=0.5)
+    backend = DeletingBackend()
+    monkeypatch.setattr(CacheService, "semantic_tier", cache)
+    monkeypatch.setattr(CacheService, "memory_tier", LRUCache(max_entries=10))
+    monkeypatch.setattr(CacheService, "backend", backend)
+    question = "Qui a fait un DROP sur la table CLIENTS hier ?"
+    _add(cache, question, "admin")
+
+    await CacheService._invalidate_stale(question, CacheService.normalize_query(question), "h1")
+
+    assert len(cache) == 0
+    assert backend.deleted == ["h1"]
@@ -0,0 +1,42 @@
+"""Tests du registre de services et des imports du démarrage"""
+import os
+import sys
+import subprocess
+
+import services
+from services import get_nlp_service, get_openai_service
+from nlp_executor import NLPExecutor
+from text_normalizer import extract_entities
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_services_are_shared():
+    nlp = get_nlp_service()
+
+    assert get_nlp_service() is nlp
+    assert get_openai_service() is get_openai_service()
+    assert get_openai_service().nlp_service is nlp
+    assert extract_entities("Actions de user bob") == nlp.extract_entities("Actions de user bob")
+
+
+def test_thread_executor_uses_shared_service():
+    executor = NLPExecutor(mode="thread", workers=1)
+    executor.start()
+    try:
+        assert executor.service is services.get_nlp_service()
+    finally:
+        executor.shutdown()
+
+
+def test_application_import_skips_heavy_modules():
+    # Interpréteur neuf : les modules déjà chargés par les autres tests ne comptent pas
+    code = (
+        "import sys, main; "
+        "print(','.join(m for m in ('sklearn', 'scipy', 'textblob', 'nltk', 'spacy', 'openai') "
+        "if m in sys.modules))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=DIRECTORY,
+                            capture_output=True, text=True, check=True, timeout=120)
+
+    assert result.stdout.strip() == ""
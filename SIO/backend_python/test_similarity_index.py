@@ -0,0 +1,166 @@
+"""Tests de l'index persistant de similarité des questions"""
+import time
+import random
+from statistics import median
+import numpy as np
+import pytest
+import pytest_asyncio
+
+from config import settings
+from database import db_manager
+from write_behind import write_queue
+from cache_service import QuestionStatsService
+from question_ranking import FrequentQuestions
+from autocomplete import AutocompleteIndex
+from similarity_index import SimilarityIndex
+
+QUESTIONS = [
+    ("q1", "Qui a fait un DROP sur la table CLIENTS ?", 10),
+    ("q2", "Qui a créé la table FACTURES ?", 30),
+    ("q3", "Connexions échouées de l'utilisateur BOB", 5),
+    ("q4", "Activité de l'utilisateur ADMIN hier", 20),
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = SimilarityIndex(path=str(tmp_path / "similarity.npz"), merge_threshold=2)
+    index.fit(QUESTIONS)
+    return index
+
+
+def _keys(results):
+    return [result["normalized_question"] for result in results]
+
+
+def test_search_ranks_by_cosine_similarity(index):
+    results = index.search("qui a fait un drop sur clients", limit=2)
+
+    assert _keys(results)[0] == "q1"
+    assert results[0]["question"] == "Qui a fait un DROP sur la table CLIENTS ?"
+    assert results[0]["count"] == 10
+    assert 0 < results[0]["similarity"] <= 1
+    assert all(a["similarity"] >= b["similarity"] for a, b in zip(results, results[1:]))
+
+
+def test_accents_stop_words_and_exclusion(index):
+    assert _keys(index.search("activite utilisateur", limit=1)) == ["q4"]
+    # Uniquement des mots vides ou des termes inconnus
+    assert index.search("qui a fait", limit=3) == []
+    assert index.search("pourquoi", limit=3) == []
+    assert "q4" not in _keys(index.search("activité de l'utilisateur ADMIN", exclude="q4"))
+
+
+def test_added_questions_are_searchable_before_and_after_merge(index):
+    index.add("q5", "Connexions échouées de l'utilisateur ADMIN")
+    assert _keys(index.search("connexions échouées admin", limit=1)) == ["q5"]
+
+    # Deuxième ajout : seuil de fusion atteint, segment incrémental vidé
+    index.add("q6", "DROP de la table FACTURES")
+    assert not index._state.delta_rows
+    assert _keys(index.search("drop factures", limit=1)) == ["q6"]
+    assert _keys(index.search("connexions échouées admin", limit=1)) == ["q5"]
+
+    index.add("q1", "Qui a fait un DROP sur la table CLIENTS ?")
+    assert index.search("drop clients", limit=1)[0]["count"] == 11
+
+
+def test_questions_added_during_fit_are_kept(tmp_path):
+    index = SimilarityIndex()
+    index.fit(QUESTIONS)
+    index.begin_fit()
+    index.add("q9", "Sessions ouvertes par BOB")
+    index.fit(QUESTIONS)
+
+    assert _keys(index.search("sessions bob", limit=1)) == ["q9"]
+
+
+def test_needs_refit_after_many_appends(monkeypatch):
+    monkeypatch.setattr(settings, "similarity_refit_ratio", 0.2)
+    index = SimilarityIndex()
+    assert index.needs_refit
+    index.fit(QUESTIONS)
+    assert not index.needs_refit
+    for i in range(101):
+        index.add(f"n{i}", f"Activité de la table T_{i}")
+    assert index.needs_refit
+
+
+def test_save_and_load_round_trip(index):
+    index.add("q5", "Connexions échouées de l'utilisateur ADMIN")
+    expected = index.search("connexions utilisateur", limit=3)
+    assert index.save()
+
+    reloaded = SimilarityIndex(path=index.path)
+    assert reloaded.load()
+
+    assert len(reloaded) == 5
+    results = reloaded.search("connexions utilisateur", limit=3)
+    assert _keys(results) == _keys(expected)
+    assert [r["similarity"] for r in results] == pytest.approx([r["similarity"] for r in expected])
+    assert "Connexions échouées de l'utilisateur ADMIN" in [r["question"] for r in results]
+    with np.load(index.path) as saved:
+        assert saved["questions"].dtype == np.uint8
+    assert not SimilarityIndex(path=index.path + ".absent").load()
+
+
+def test_search_is_sub_millisecond_at_100k_questions():
+    rng = random.Random(0)
+    templates = [
+        "Qui a fait un {a} sur la table {t} ?", "Activité de l'utilisateur {u} hier",
+        "Quelles modifications sur {t} par {u} ?", "Connexions échouées de {u} cette semaine",
+        "Liste des {a} du schéma {s}", "Sessions ouvertes par {u} depuis le poste {p}",
+    ]
+    actions = ["DROP", "SELECT", "UPDATE", "DELETE", "CREATE", "ALTER", "GRANT", "TRUNCATE"]
+    index = SimilarityIndex()
+    index.fit([
+        (f"q{i}", rng.choice(templates).format(
+            a=rng.choice(actions), t=f"T_{rng.randint(1, 20000)}", u=f"USER{rng.randint(1, 2000)}",
+            s=f"S_{rng.randint(1, 300)}", p=f"PC{rng.randint(1, 3000)}"
+        ), 1)
+        for i in range(100000)
+    ])
+    timings = []
+    for question in ["qui a fait un DROP sur T_42", "connexions échouées de USER17", "modifications de T_7"] * 100:
+        start = time.perf_counter()
+        index.search(question)
+        timings.append(time.perf_counter() - start)
+
+    assert median(timings) < 0.001
+
+
+@pytest_asyncio.fixture
+async def sqlite_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "sqlite_db_path", str(tmp_path / "cache" / "test_cache.db"))
+    monkeypatch.setattr(settings, "cache_backend", "sqlite")
+    monkeypatch.setattr(settings, "frequent_questions_refresh_interval", 0)
+    monkeypatch.setattr(settings, "similarity_refit_interval", 0)
+    monkeypatch.setattr(QuestionStatsService, "ranking", FrequentQuestions())
+    monkeypatch.setattr(QuestionStatsService, "autocomplete", AutocompleteIndex())
+    monkeypatch.setattr(QuestionStatsService, "similarity", SimilarityIndex(path=str(tmp_path / "similarity.npz")))
+    assert db_manager.connect_sqlite()
+    yield tmp_path
+    await QuestionStatsService.stop_question_indexes()
+    await write_queue.flush()
+    await db_manager.close_connections()
+
+
+@pytest.mark.asyncio
+async def test_service_fits_at_startup_and_saves_at_shutdown(sqlite_db):
+    for question in ["Qui a fait un DROP sur CLIENTS ?", "Activité de user BOB"]:
+        await QuestionStatsService.update_question_stats(question)
+
+    await QuestionStatsService.start_question_indexes()
+    # Aucun index sauvegardé : ajustement en arrière-plan, le démarrage n'attend pas
+    fit = QuestionStatsService._fit_task
+    assert fit is not None and not fit.done()
+    await QuestionStatsService.update_question_stats("Connexions échouées de user BOB")
+    await fit
+
+    similarity = QuestionStatsService.similarity
+    assert len(similarity) == 3
+    assert similarity.search("drop clients", limit=1)[0]["question"] == "Qui a fait un DROP sur CLIENTS ?"
+
+    await QuestionStatsService.stop_question_indexes()
+    reloaded = SimilarityIndex(path=similarity.path)
+    assert reloaded.load() and len(reloaded) == 3
@@ -0,0 +1,56 @@
+"""Tests du regroupement des calculs concurrents identiques"""
+import asyncio
+import pytest
+from single_flight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_computation():
+    flight = SingleFlight()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "réponse"
+
+    results = await asyncio.gather(*[flight.do("k", compute) for _ in range(30)])
+
+    assert calls == 1
+    assert [r for r, _ in results] == ["réponse"] * 30
+    assert [shared for _, shared in results].count(False) == 1
+    assert flight.stats()["coalesced"] == 29
+    assert flight.stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_leader_failure_propagates_to_followers():
+    flight = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.05)
+        raise ValueError("mongo indisponible")
+
+    results = await asyncio.gather(*[flight.do("k", compute) for _ in range(3)], return_exceptions=True)
+
+    assert all(isinstance(r, ValueError) for r in results)
+    # La clé est libérée : un nouvel appel relance le calcul
+    assert (await flight.do("k", lambda: asyncio.sleep(0, result="ok")))[0] == "ok"
+
+
+@pytest.mark.asyncio
+async def test_follower_timeout_does_not_cancel_leader():
+    flight = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.1)
+        return "lent"
+
+    leader = asyncio.create_task(flight.do("k", compute))
+    await asyncio.sleep(0)
+    with pytest.raises(asyncio.TimeoutError):
+        await flight.do("k", compute, timeout=0.01)
+
+    assert await leader == ("lent", False)
+    assert flight.stats()["timeouts"] == 1
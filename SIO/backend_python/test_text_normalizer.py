@@ -0,0 +1,77 @@
+"""Tests de la normalisation canonique des questions"""
+import pytest
+import pytest_asyncio
+
+from config import settings
+from database import db_manager
+from write_behind import write_queue
+from cache_service import CacheService, QuestionStatsService
+from text_normalizer import normalize_question, fold
+from replay_normalizer import replay
+
+
+@pytest.mark.parametrize("first, second", [
+    ("Activité de l'utilisateur ADMIN aujourd'hui ?", "activite   de l’utilisateur admin aujourd'hui"),
+    ("Qui a fait un DROP et un CREATE sur la table Clients ?", "qui a fait create, drop sur table CLIENTS"),
+    ("Quelles sont les tentatives de connexion échouées ?", "quelles tentatives de connexion echouees"),
+    ("ｑｕｉ a fait un DROP ?", "Qui a fait un drop"),
+])
+def test_equivalent_questions_share_a_key(first, second):
+    assert normalize_question(first) == normalize_question(second)
+
+
+@pytest.mark.parametrize("first, second", [
+    ("Activité de l'utilisateur ADMIN aujourd'hui", "Activité de l'utilisateur BOB aujourd'hui"),
+    ("Activité de l'utilisateur ADMIN aujourd'hui", "Activité de l'utilisateur ADMIN hier"),
+    ("Qui a fait un DROP sur la table CLIENTS", "Qui n'a pas fait de DROP sur la table CLIENTS"),
+])
+def test_different_entities_or_meaning_keep_distinct_keys(first, second):
+    assert normalize_question(first) != normalize_question(second)
+
+
+def test_entities_become_placeholders_with_sorted_signature():
+    key = normalize_question("Qui a fait un DROP et un CREATE sur la table Clients ?")
+
+    assert key == "qui fait <action> <action> sur table <object> [actions=create,drop;object_name=clients]"
+    assert fold("Élève À l’école") == "eleve a l'ecole"
+
+
+def test_stop_word_only_question_is_not_empty():
+    assert normalize_question("Bonjour !") == "bonjour"
+
+
+def test_replay_measures_hit_rate_gain():
+    rows = [
+        (["Qui a fait un DROP ?"], 3),
+        (["qui a fait un drop"], 2),
+        (["Qui a fait un drop?", "qui a  fait un DROP ?"], 4),
+    ]
+
+    report = replay(rows)
+
+    assert report["questions"] == 9
+    assert report["canonical_keys"] == 1
+    assert report["canonical_hit_rate"] > report["legacy_hit_rate"]
+
+
+@pytest_asyncio.fixture
+async def sqlite_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "sqlite_db_path", str(tmp_path / "cache" / "test_cache.db"))
+    monkeypatch.setattr(settings, "cache_backend", "sqlite")
+    assert db_manager.connect_sqlite()
+    yield
+    await db_manager.close_connections()
+
+
+@pytest.mark.asyncio
+async def test_question_stats_merge_variants_and_display_first_phrasing(sqlite_db):
+    await QuestionStatsService.update_question_stats("Qui a fait un DROP sur la table CLIENTS ?")
+    await QuestionStatsService.update_question_stats("qui a fait un drop sur table clients")
+    await write_queue.flush()
+
+    frequent = await QuestionStatsService.get_frequent_questions()
+
+    assert len(frequent) == 1
+    assert frequent[0]["count"] == 2
+    assert frequent[0]["question"] == "Qui a fait un DROP sur la table CLIENTS ?"
+    assert frequent[0]["normalized_question"] == CacheService.normalize_query("qui a fait un drop sur table clients")
@@ -0,0 +1,62 @@
+"""N-grammes de caractères hachés, calculés en NumPy
+
+Représentation commune du classifieur d'intentions et du cache sémantique :
+les n-grammes de caractères des textes (déjà préparés par l'appelant) sont
+hachés dans un espace de taille fixe, sans vocabulaire, et normalisés L2.
+Le calcul ne dépend que de NumPy : ni scikit-learn ni SciPy ne sont
+importés au démarrage de l'application.
+"""
+from typing import Sequence, Tuple
+import numpy as np
+
+# Constantes de hachage (64 bits) : base du hachage polynomial, graine par longueur de n-gramme,
+# dispersion finale (hachage multiplicatif, bits de poids fort)
+_BASE = np.uint64(1000003)
+_SEEDS = [np.uint64((0x9E3779B97F4A7C15 * n) % 2 ** 64) for n in range(16)]
+_MIX = np.uint64(0xBF58476D1CE4E5B9)
+
+
+def char_ngrams(texts: Sequence[str], n_features: int, ngram_range: Tuple[int, int] = (2, 4),
+                sublinear: bool = True) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(lignes, colonnes, valeurs) des n-grammes de caractères hachés, normalisés L2
+
+    Tous les textes du lot sont concaténés en un tableau de points de code ;
+    le hachage de chaque longueur de n-gramme est calculé d'un bloc sur ce
+    tableau, les n-grammes qui chevauchent deux textes étant écartés. Les
+    comptes sont amortis (log1p) si sublinear. Les triplets sont triés par
+    ligne puis par colonne, sans doublon.
+    """
+    bits = n_features.bit_length() - 1
+    if n_features != 1 << bits:
+        raise ValueError(f"n_features doit être une puissance de 2: {n_features}")
+    lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+    codes = np.frombuffer("".join(texts).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    documents = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)
+    shift = np.uint64(64 - bits)
+
+    keys = []
+    low, high = ngram_range
+    rolling = codes
+    for n in range(1, high + 1):
+        if n > 1:
+            # Hachage polynomial des n-grammes à partir de celui des (n-1)-grammes (débordement modulo 2**64)
+            rolling = rolling[:-1] * _BASE + codes[n - 1:]
+        if n < low or not len(rolling):
+            continue
+        valid = documents[:len(rolling)] == documents[n - 1:]
+        hashed = ((rolling[valid] ^ _SEEDS[n]) * _MIX) >> shift
+        # Clé unique (texte, trait) : texte * n_features + trait
+        keys.append(documents[:len(rolling)][valid] * n_features + hashed.astype(np.int64))
+
+    keys, counts = np.unique(np.concatenate(keys) if keys else np.empty(0, dtype=np.int64), return_counts=True)
+    rows, columns = np.divmod(keys, n_features)
+    values = (np.log1p(counts) if sublinear else counts).astype(np.float32)
+    norms = np.sqrt(np.bincount(rows, weights=values * values, minlength=len(texts)))
+    values /= norms[rows]
+    return rows, columns, values
+
+
+def cosine(a: Tuple[np.ndarray, np.ndarray], b: Tuple[np.ndarray, np.ndarray]) -> float:
+    """Similarité cosinus de deux vecteurs normalisés (colonnes triées, valeurs)"""
+    _, in_a, in_b = np.intersect1d(a[0], b[0], assume_unique=True, return_indices=True)
+    return float(np.dot(a[1][in_a], b[1][in_b]))
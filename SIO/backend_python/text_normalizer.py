@@ -0,0 +1,111 @@
+"""Forme canonique des questions pour les clés du cache et les statistiques
+
+Deux formulations qui ne diffèrent que par la casse, les accents, la
+ponctuation, les élisions, les mots vides ou l'ordre des entités citées
+partagent la même forme canonique :
+
+    "Qui a fait un DROP et un CREATE sur la table Clients ?"
+    "qui a fait create, drop sur table CLIENTS"
+    -> "qui fait <action> <action> sur table <object> [actions=create,drop;object_name=clients]"
+
+Les entités (NLPService.extract_entities) sont remplacées par des marqueurs
+dans le texte et reportées, triées, dans une signature : deux questions sur
+des entités différentes gardent des formes distinctes.
+"""
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+from services import get_nlp_service
+
+# Version de la normalisation (les clés produites par une autre version ne coïncident pas)
+NORMALIZER_VERSION = 2
+
+# Entité extraite -> marqueur dans le texte canonique
+PLACEHOLDERS = {
+    "user": "user",
+    "object_name": "object",
+    "schema": "schema",
+    "dates": "date",
+    "actions": "action",
+    "program": "program",
+    "client_host": "host",
+}
+
+# Mots sans incidence sur la réponse (articles, auxiliaires, formules de politesse).
+# Les négations, interrogatifs et prépositions restent : ils changent le sens.
+STOP_WORDS = frozenset({
+    "le", "la", "les", "un", "une", "des", "du", "de", "au", "aux",
+    "et", "a", "est", "sont", "ete", "avoir", "etre", "y",
+    "je", "tu", "il", "elle", "on", "nous", "vous", "ils", "elles", "me", "moi",
+    "svp", "stp", "merci", "bonjour", "please", "donc", "alors", "voici",
+})
+
+_APOSTROPHES = re.compile(r"[‘’ʼ`´]")
+_ELISION = re.compile(r"\b(?:l|d|j|qu|n|s|c|m|t|jusqu|lorsqu|puisqu)'(?=\w)")
+_PUNCTUATION = re.compile(r"[^\w\s<>]|_")
+_SPACES = re.compile(r"\s+")
+
+
+def fold(text: str) -> str:
+    """NFKC, minuscules, apostrophes typographiques unifiées, accents retirés"""
+    text = unicodedata.normalize("NFKC", text)
+    text = _APOSTROPHES.sub("'", text).lower()
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def extract_entities(text: str) -> Dict[str, Any]:
+    """Entités de la question, extraites par le service NLP partagé"""
+    return get_nlp_service().extract_entities(text)
+
+
+def _entity_values(entities: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """(valeur repliée, marqueur), les valeurs longues d'abord"""
+    values = []
+    for key, marker in PLACEHOLDERS.items():
+        value = entities.get(key)
+        if value is None:
+            continue
+        for item in value if isinstance(value, list) else [value]:
+            folded = fold(str(item)).strip()
+            if folded:
+                values.append((folded, marker))
+    return sorted(set(values), key=lambda pair: len(pair[0]), reverse=True)
+
+
+def entity_signature(entities: Dict[str, Any]) -> str:
+    """Entités triées, indépendantes de leur ordre et de leur casse dans la question"""
+    parts = []
+    for key in sorted(entities):
+        value = entities[key]
+        if key not in PLACEHOLDERS or value in (None, "", []):
+            continue
+        items = value if isinstance(value, list) else [value]
+        parts.append(f"{key}=" + ",".join(sorted({fold(str(item)).strip() for item in items})))
+    return ";".join(parts)
+
+
+@lru_cache(maxsize=4096)
+def _normalize(question: str) -> str:
+    text = unicodedata.normalize("NFKC", _APOSTROPHES.sub("'", question))
+    entities = extract_entities(text)
+    folded = fold(text)
+
+    # Marqueurs à la place des entités (avant les élisions : « aujourd'hui » reste entier)
+    for value, marker in _entity_values(entities):
+        pattern = r"(?<!\w)" + r"\s+".join(re.escape(word) for word in value.split()) + r"(?!\w)"
+        folded = re.sub(pattern, f" <{marker}> ", folded)
+
+    folded = _ELISION.sub("", folded)
+    folded = _PUNCTUATION.sub(" ", folded)
+    tokens = [token for token in _SPACES.split(folded) if token]
+    # Une question faite uniquement de mots vides (« bonjour ») garde ses mots
+    template = " ".join([token for token in tokens if token not in STOP_WORDS] or tokens)
+    signature = entity_signature(entities)
+    return f"{template} [{signature}]" if signature else template
+
+
+def normalize_question(question: str) -> str:
+    """Forme canonique d'une question (clé du cache et des statistiques)"""
+    return _normalize(question.strip())
@@ -0,0 +1,292 @@
+"""File d'écritures différées (write-behind) pour le cache SQLite"""
+import asyncio
+import sqlite3
+from typing import Optional, Dict, List, Any, Union
+from loguru import logger
+from config import settings
+from database import db_manager
+from cache_eviction import evict_query_cache
+from cache_codec import stored_size
+from cache_stats import cache_stats
+from action_telemetry import write_actions
+from question_store import upsert_questions
+
+
+class WriteBehindQueue:
+    """File d'écritures SQLite fusionnées et validées en une seule transaction
+
+    Les mutations du cache (résultats, compteurs de hits, actions, statistiques
+    de questions) sont accumulées en mémoire puis écrites par lots, sur
+    déclenchement temporel ou lorsque le nombre d'opérations en attente
+    dépasse un seuil.
+    """
+
+    def __init__(self, flush_interval: float = 1.0, max_pending: int = 500):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._query_results: Dict[str, tuple] = {}
+        self._hit_deltas: Dict[str, List[Any]] = {}
+        self._actions: List[tuple] = []
+        self._question_updates: Dict[str, Dict[str, Any]] = {}
+        self._pending = 0
+        self._flush_lock = asyncio.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.flush_count = 0
+        self.flushed_operations = 0
+        self.evicted_entries = 0
+        self.evicted_bytes = 0
+
+    @property
+    def pending(self) -> int:
+        """Nombre d'opérations en attente d'écriture"""
+        return self._pending
+
+    def _mark_pending(self):
+        self._pending += 1
+        if self._pending >= self.max_pending and self._wakeup:
+            self._wakeup.set()
+
+    # ------------------------------------------------------------------
+    # Mise en file des mutations
+    # ------------------------------------------------------------------
+
+    def enqueue_query_result(self, query_hash: str, normalized_query: str, result: Union[str, bytes], timestamp: str):
+        """Mettre en file l'insertion (ou le remplacement) d'un résultat de requête encodé"""
+        if query_hash in self._query_results:
+            # Résultat en attente remplacé : une seule écriture pour le hash
+            self._pending -= 1
+        self._query_results[query_hash] = (
+            query_hash, normalized_query, result, stored_size(result), timestamp, timestamp
+        )
+        # Le remplacement remet le compteur à 1 : les hits en attente sont caducs
+        self._drop_hits(query_hash)
+        self._mark_pending()
+
+    def enqueue_hit(self, query_hash: str, accessed_at: str):
+        """Mettre en file un hit de cache (les deltas sont cumulés par hash)"""
+        delta = self._hit_deltas.get(query_hash)
+        if delta:
+            delta[0] += 1
+            delta[1] = accessed_at
+        else:
+            self._hit_deltas[query_hash] = [1, accessed_at]
+        self._mark_pending()
+
+    def enqueue_action(self, action_type: str, user: Optional[str], metadata_json: str, timestamp: str):
+        """Mettre en file l'enregistrement d'une action"""
+        self._actions.append((action_type, user, timestamp, metadata_json))
+        self._mark_pending()
+
+    def enqueue_question(self, normalized: str, question: str, asked_at: str):
+        """Mettre en file la mise à jour des statistiques d'une question"""
+        update = self._question_updates.get(normalized)
+        if update:
+            update["count"] += 1
+            update["last_asked"] = asked_at
+            update["variations"][question] = update["variations"].get(question, 0) + 1
+        else:
+            self._question_updates[normalized] = {
+                "count": 1,
+                "last_asked": asked_at,
+                # formulation -> occurrences, dans l'ordre d'apparition
+                "variations": {question: 1}
+            }
+        self._mark_pending()
+
+    def _drop_hits(self, query_hash: str):
+        """Retirer les hits en attente d'un hash (et leurs opérations du compte en attente)"""
+        delta = self._hit_deltas.pop(query_hash, None)
+        if delta:
+            self._pending -= delta[0]
+
+    def discard_query(self, query_hash: str):
+        """Abandonner les écritures en attente d'un résultat invalidé"""
+        if self._query_results.pop(query_hash, None) is not None:
+            self._pending -= 1
+        self._drop_hits(query_hash)
+
+    def discard_all_queries(self):
+        """Abandonner toutes les écritures de résultats en attente"""
+        self._pending -= len(self._query_results) + sum(delta[0] for delta in self._hit_deltas.values())
+        self._query_results.clear()
+        self._hit_deltas.clear()
+
+    def pending_query_result(self, query_hash: str) -> Optional[Union[str, bytes]]:
+        """Résultat en attente d'écriture pour un hash (lecture de ses propres écritures)"""
+        pending = self._query_results.get(query_hash)
+        return pending[2] if pending else None
+
+    def pending_hits(self, query_hash: str) -> int:
+        """Nombre de hits en attente d'écriture pour un hash"""
+        delta = self._hit_deltas.get(query_hash)
+        return delta[0] if delta else 0
+
+    # ------------------------------------------------------------------
+    # Écriture groupée
+    # ------------------------------------------------------------------
+
+    def _swap(self) -> Dict[str, Any]:
+        batch = {
+            "query_results": self._query_results,
+            "hit_deltas": self._hit_deltas,
+            "actions": self._actions,
+            "question_updates": self._question_updates,
+            "pending": self._pending
+        }
+        self._query_results = {}
+        self._hit_deltas = {}
+        self._actions = []
+        self._question_updates = {}
+        self._pending = 0
+        return batch
+
+    def _requeue(self, batch: Dict[str, Any]):
+        """Réintégrer un lot dont l'écriture a échoué (les nouvelles mutations priment)"""
+        # Opérations écartées au profit d'un résultat plus récent : hors du compte en attente
+        pending = batch["pending"]
+        for query_hash, row in batch["query_results"].items():
+            if query_hash in self._query_results:
+                pending -= 1
+            else:
+                self._query_results[query_hash] = row
+        for query_hash, (count, accessed_at) in batch["hit_deltas"].items():
+            if query_hash in self._query_results and query_hash not in batch["query_results"]:
+                pending -= count
+                continue
+            delta = self._hit_deltas.setdefault(query_hash, [0, accessed_at])
+            delta[0] += count
+        self._actions = batch["actions"] + self._actions
+        for normalized, update in batch["question_updates"].items():
+            current = self._question_updates.get(normalized)
+            if current:
+                current["count"] += update["count"]
+                variations = dict(update["variations"])
+                for question, count in current["variations"].items():
+                    variations[question] = variations.get(question, 0) + count
+                current["variations"] = variations
+            else:
+                self._question_updates[normalized] = update
+        self._pending += pending
+
+    @staticmethod
+    def _write_batch(conn: sqlite3.Connection, batch: Dict[str, Any]) -> Dict[str, int]:
+        eviction = {"evicted": 0, "freed_bytes": 0}
+
+        if batch["query_results"]:
+            # Upsert plutôt que INSERT OR REPLACE : la suppression implicite
+            # du REPLACE ne déclenche pas les triggers de taille du cache
+            conn.executemany(
+                """INSERT INTO query_cache
+                   (query_hash, normalized_query, result, result_size, hit_count, created_at, last_accessed)
+                   VALUES (?, ?, ?, ?, 1, ?, ?)
+                   ON CONFLICT(query_hash) DO UPDATE SET
+                       normalized_query = excluded.normalized_query,
+                       result = excluded.result,
+                       result_size = excluded.result_size,
+                       hit_count = 1,
+                       created_at = excluded.created_at,
+                       last_accessed = excluded.last_accessed""",
+                list(batch["query_results"].values())
+            )
+
+        if batch["hit_deltas"]:
+            conn.executemany(
+                "UPDATE query_cache SET hit_count = hit_count + ?, last_accessed = ? WHERE query_hash = ?",
+                [(count, accessed_at, query_hash) for query_hash, (count, accessed_at) in batch["hit_deltas"].items()]
+            )
+
+        if batch["query_results"]:
+            # Budget disque appliqué à chaque insertion, dans la même transaction
+            # (après les hits du lot, pour que la politique en tienne compte)
+            eviction = evict_query_cache(
+                conn, settings.query_cache_max_bytes, settings.query_cache_eviction_policy
+            )
+
+        if batch["actions"]:
+            # Partitions journalières et agrégats minute/heure dans la même transaction
+            write_actions(conn, batch["actions"])
+
+        if batch["question_updates"]:
+            upsert_questions(conn, batch["question_updates"], settings.question_variations_max)
+
+        return eviction
+
+    async def flush(self) -> int:
+        """Écrire toutes les mutations en attente dans une seule transaction"""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+
+            batch = self._swap()
+            try:
+                eviction = await db_manager.run_sqlite_transaction(lambda conn: self._write_batch(conn, batch))
+            except Exception as e:
+                logger.error(f"Erreur lors de l'écriture différée du cache: {e}")
+                self._requeue(batch)
+                return 0
+
+            self.flush_count += 1
+            self.flushed_operations += batch["pending"]
+            if eviction["evicted"]:
+                self.evicted_entries += eviction["evicted"]
+                self.evicted_bytes += eviction["freed_bytes"]
+                cache_stats.record_eviction(eviction["evicted"], eviction["freed_bytes"])
+                logger.info(
+                    f"Cache des requêtes: {eviction['evicted']} entrées évincées "
+                    f"({eviction['freed_bytes']} octets, politique {settings.query_cache_eviction_policy})"
+                )
+            return batch["pending"]
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            if self._stopping:
+                break
+            self._wakeup.clear()
+            await self.flush()
+
+    async def start(self):
+        """Démarrer la tâche d'écriture périodique"""
+        if self._task:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            f"File d'écriture différée démarrée (intervalle {self.flush_interval}s, seuil {self.max_pending})"
+        )
+
+    async def stop(self):
+        """Arrêter la tâche périodique et écrire les mutations restantes"""
+        if self._task:
+            # Arrêt coopératif : une écriture en cours n'est jamais interrompue
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        self._wakeup = None
+
+        flushed = await self.flush()
+        logger.info(f"File d'écriture différée arrêtée ({flushed} opérations écrites)")
+
+    def stats(self) -> Dict[str, Any]:
+        """Statistiques de la file d'écriture"""
+        return {
+            "pending": self._pending,
+            "flush_count": self.flush_count,
+            "flushed_operations": self.flushed_operations,
+            "evicted_entries": self.evicted_entries,
+            "evicted_bytes": self.evicted_bytes
+        }
+
+
+# Instance globale de la file d'écriture différée
+write_queue = WriteBehindQueue(
+    flush_interval=settings.write_behind_flush_interval,
+    max_pending=settings.write_behind_max_pending
+)